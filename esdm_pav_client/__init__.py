@@ -1,3 +1,36 @@
-from .experiment import Experiment
-from .workflow import Workflow
-from .task import Task
+# the classes are imported at first use, so that importing a module of the
+# package (e.g. the daemon client of the command line) stays cheap
+_exports = {
+    "Experiment": ".experiment",
+    "Workflow": ".workflow",
+    "Task": ".task",
+    "StatusCache": ".cache",
+    "Resilience": ".resilience",
+    "RetryPolicy": ".resilience",
+    "SubmissionScheduler": ".scheduler",
+    "EndpointPool": ".routing",
+    "Partitioner": ".partition",
+    "WorkflowGroup": ".partition",
+    "CostModel": ".cost",
+    "LocalExecutor": ".local",
+    "ConnectionPool": ".connections",
+    "WorkflowBatch": ".batch",
+    "HistoryStore": ".history",
+    "MemoStore": ".memo",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    import importlib
+
+    if name not in _exports:
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+    value = getattr(importlib.import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
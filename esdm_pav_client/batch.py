@@ -0,0 +1,527 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BatchEntry:
+    """
+    Submission of a PAV document in a WorkflowBatch
+
+    Attributes
+    ----------
+    document : str
+        path of the PAV document
+    args : list
+        arguments substituted in the workflow
+    workflow : <class 'esdm_pav_client.workflow.Workflow'>
+        submitted workflow, None if the submission failed
+    status : str
+        last known workflow status, or FAILED if the document could not be
+        loaded, validated or submitted
+    error : str
+        reason of the failure, or of the last failed status update of a
+        running workflow, None if none
+    experiment : <class 'esdm_pav_client.experiment.Experiment'>
+        experiment already loaded from the document, None if the document is
+        still to be loaded
+    """
+
+    def __init__(self, document, args=(), experiment=None):
+        self.document = document
+        self.args = list(args)
+        self.experiment = experiment
+        self.workflow = None
+        self.status = "PENDING"
+        self.error = None
+
+    @property
+    def workflow_id(self):
+        return self.workflow.workflow_id if self.workflow is not None else None
+
+    def __repr__(self):
+        return "<BatchEntry: {0} {1}>".format(self.document, self.status)
+
+
+class WorkflowBatch:
+    """
+    Loads, validates and submits many PAV documents concurrently from a
+    single process, over a shared pool of runtime connections
+
+    Construction::
+    b1 = WorkflowBatch(["exp1.json", ("exp2.json", ["2000|2001"])], concurrency=16)
+
+    Parameters
+    ----------
+    documents : list
+        paths of the PAV documents, or (path, args) tuples to substitute args
+        in the workflow
+    concurrency : int, optional
+        maximum number of documents submitted at the same time
+    endpoints : <class 'esdm_pav_client.routing.EndpointPool'>, optional
+        pool of runtimes the submissions are balanced across
+    connections : <class 'esdm_pav_client.connections.ConnectionPool'>, optional
+        pool of clients used by the workflows, a new one if None
+    rate : float, optional
+        maximum number of submissions per second, unlimited if None
+    history : <class 'esdm_pav_client.history.HistoryStore'>, optional
+        local history where the submissions and their statuses are recorded
+    catalogue : <class 'esdm_pav_client.catalogue.OperatorCatalogue'>, optional
+        catalogue the operators and arguments of the tasks are checked
+        against before submitting, not checked if None
+
+    Raises
+    ------
+    AttributeError
+        If concurrency is not a positive int or rate is not positive
+
+    Example
+    -------
+    b1 = WorkflowBatch.from_directory("docs/", concurrency=16)
+    b1.submit(server="127.0.0.1", port="11732")
+    b1.monitor(frequency=10)
+    print(b1.table())
+    """
+
+    def __init__(
+        self,
+        documents,
+        concurrency=8,
+        endpoints=None,
+        connections=None,
+        rate=None,
+        history=None,
+        catalogue=None,
+    ):
+        try:
+            from connections import ConnectionPool
+        except ImportError:
+            from .connections import ConnectionPool
+
+        if not isinstance(concurrency, int) or concurrency < 1:
+            raise AttributeError("concurrency must be a positive int")
+        if rate is not None and (not isinstance(rate, (int, float)) or rate <= 0):
+            raise AttributeError("rate must be a positive number")
+        self.entries = []
+        for document in documents:
+            if isinstance(document, (tuple, list)):
+                self.entries.append(BatchEntry(document[0], document[1]))
+            else:
+                self.entries.append(BatchEntry(document))
+        self.concurrency = concurrency
+        self.endpoints = endpoints
+        self.connections = (
+            connections if connections is not None else ConnectionPool(max_idle=concurrency)
+        )
+        self.rate = rate
+        self.history = history
+        self.catalogue = catalogue
+        self._next_submission = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, directory, pattern="*.json", **kwargs):
+        """
+        Create a batch of the PAV documents of a directory
+
+        Parameters
+        ----------
+        directory : str
+            directory of the PAV documents
+        pattern : str, optional
+            glob pattern of the document names
+        kwargs : dict
+            arguments of WorkflowBatch
+
+        Returns
+        -------
+        batch : <class 'esdm_pav_client.batch.WorkflowBatch'>
+            Returns the batch of the documents, sorted by name
+
+        Raises
+        ------
+        AttributeError
+            If directory is not a directory
+        """
+        import glob
+        import os
+
+        if not os.path.isdir(directory):
+            raise AttributeError("{0} is not a directory".format(directory))
+        return cls(sorted(glob.glob(os.path.join(directory, pattern))), **kwargs)
+
+    @classmethod
+    def from_manifest(cls, filename, **kwargs):
+        """
+        Create a batch from a manifest file, either a JSON list of
+        {"document": path, "args": [...]} objects or a text file with one
+        "path [arg1 arg2 ...]" line per document; relative paths are relative
+        to the manifest directory and lines starting with # are ignored
+
+        Parameters
+        ----------
+        filename : str
+            path of the manifest
+        kwargs : dict
+            arguments of WorkflowBatch
+
+        Returns
+        -------
+        batch : <class 'esdm_pav_client.batch.WorkflowBatch'>
+            Returns the batch of the documents
+
+        Raises
+        ------
+        AttributeError
+            If the manifest is not valid
+        """
+        import json
+        import os
+        import shlex
+
+        base = os.path.dirname(os.path.abspath(filename))
+        with open(filename, "r") as f:
+            content = f.read()
+        documents = []
+        if content.lstrip().startswith("["):
+            try:
+                for item in json.loads(content):
+                    documents.append((item["document"], [str(a) for a in item.get("args", [])]))
+            except (ValueError, KeyError, TypeError) as e:
+                raise AttributeError("invalid manifest {0}".format(filename)) from e
+        else:
+            for line in content.splitlines():
+                if not line.strip() or line.lstrip().startswith("#"):
+                    continue
+                fields = shlex.split(line)
+                documents.append((fields[0], fields[1:]))
+        return cls([(os.path.join(base, d), args) for d, args in documents], **kwargs)
+
+    @classmethod
+    def from_sweep(cls, document, rows, product=False, **kwargs):
+        """
+        Create a batch submitting the same PAV document once per set of
+        arguments; the document is loaded and validated once
+
+        Parameters
+        ----------
+        document : str
+            path of the PAV document
+        rows : list of list
+            sets of arguments, or with product the candidate values of each
+            argument: the i-th value of every row is a value of $i+1 and
+            empty values are ignored
+        product : bool, optional
+            True to submit the Cartesian product of the candidate values
+        kwargs : dict
+            arguments of WorkflowBatch
+
+        Returns
+        -------
+        batch : <class 'esdm_pav_client.batch.WorkflowBatch'>
+            Returns the batch of the submissions
+
+        Raises
+        ------
+        AttributeError
+            If the document is not valid, or if some sets of arguments do not
+            fill all the $N placeholders of the document
+        """
+        import itertools
+
+        try:
+            from experiment import Experiment
+        except ImportError:
+            from .experiment import Experiment
+
+        experiment = Experiment.load(document)
+        cls.validate(experiment, kwargs.get("catalogue"))
+        rows = [[str(v) for v in row] for row in rows]
+        if product:
+            columns = itertools.zip_longest(*rows, fillvalue="")
+            rows = [list(r) for r in itertools.product(*[[v for v in c if v] for c in columns])]
+        required = cls.required_args(experiment)
+        missing = [
+            n + 1
+            for n, row in enumerate(rows)
+            if any(i > len(row) or not row[i - 1] for i in required)
+        ]
+        if missing:
+            raise AttributeError(
+                "arguments {0} required, missing in the sets {1}".format(
+                    ", ".join("$" + str(i) for i in required),
+                    ", ".join(str(n) for n in missing[:10])
+                    + (" and {0} more".format(len(missing) - 10) if len(missing) > 10 else ""),
+                )
+            )
+        batch = cls([(document, row) for row in rows], **kwargs)
+        for entry in batch.entries:
+            entry.experiment = experiment
+        return batch
+
+    @staticmethod
+    def read_sweep(filename):
+        """
+        Read the sets of arguments of a sweep from a CSV file, one set per
+        row; empty lines and lines starting with # are ignored
+
+        Returns
+        -------
+        rows : list of list
+            Returns the rows of the file
+        """
+        import csv
+
+        with open(filename, "r", newline="") as f:
+            return [
+                [v.strip() for v in row]
+                for row in csv.reader(f)
+                if row and any(v.strip() for v in row) and not row[0].lstrip().startswith("#")
+            ]
+
+    @staticmethod
+    def required_args(experiment):
+        """
+        Return the sorted positions N of the $N placeholders used by the
+        experiment
+        """
+        import json
+        import re
+
+        try:
+            from workflow import Workflow
+        except ImportError:
+            from .workflow import Workflow
+
+        document = json.dumps(Workflow._to_json(experiment))
+        return sorted(set(int(n) for n in re.findall(r"\$(\d+)", document) if int(n) > 0))
+
+    @staticmethod
+    def validate(experiment, catalogue=None):
+        """
+        Check the structure of an experiment without contacting the runtime:
+        unique task names, known dependencies and no cycle, and with a
+        catalogue the operators and arguments of the tasks
+
+        Raises
+        ------
+        AttributeError
+            If the experiment is not valid
+        """
+        names = [t.name for t in experiment.tasks]
+        if len(set(names)) != len(names):
+            raise AttributeError("duplicate task names")
+        graph = experiment.graph
+        if graph.dangling:
+            raise AttributeError(
+                "unknown dependency {0} of task {1}".format(
+                    graph.dangling[0][1], graph.names[graph.dangling[0][0]]
+                )
+            )
+        graph.topological_order()
+        if catalogue is not None:
+            report = catalogue.validate(experiment)
+            if not report.valid:
+                raise AttributeError(str(report))
+
+    def submit(self, server="127.0.0.1", port="11732"):
+        """
+        Load, validate and submit all the documents; a failure is recorded in
+        the entry of the document and does not stop the other submissions
+
+        Parameters
+        ----------
+        server : str, optional
+            ESDM-PAV runtime DNS/IP address, if no pool of runtimes is used
+        port : str, optional
+            ESDM-PAV runtime port, if no pool of runtimes is used
+
+        Returns
+        -------
+        entries : list of <class 'esdm_pav_client.batch.BatchEntry'>
+            Returns the entries of the batch
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(lambda e: self._run(e, server, port), self.entries))
+        return self.entries
+
+    def status(self):
+        """
+        Update the status of the submitted workflows still running
+
+        Returns
+        -------
+        running : int
+            Returns the number of workflows still running
+        """
+        import re
+
+        try:
+            from workflow import Workflow
+        except ImportError:
+            from .workflow import Workflow
+
+        running = [
+            e
+            for e in self.entries
+            if e.workflow is not None and re.match(Workflow.running_statuses, e.status)
+        ]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(self._update, running))
+        return len([e for e in running if re.match(Workflow.running_statuses, str(e.status))])
+
+    def notify(self, task, inputs=None, action="continue", batch_size=100):
+        """
+        Send an input event to a waiting task of each workflow still running
+        (e.g. to release the wait tasks once new data is available), in
+        batches over the pool of clients of the batch
+
+        Parameters
+        ----------
+        task : str
+            name of the waiting task
+        inputs : dict, optional
+            key -> value inputs set in the workflows
+        action : str, optional
+            "continue" to release the task, "abort" to stop it
+        batch_size : int, optional
+            maximum number of events sent on a client in a row
+
+        Returns
+        -------
+        events : list of <class 'esdm_pav_client.events.InputEvent'>
+            Returns the events, in the order of the entries, with their
+            acknowledgement or the reason of their failure
+        """
+        import re
+
+        try:
+            from events import EventQueue
+            from workflow import Workflow
+        except ImportError:
+            from .events import EventQueue
+            from .workflow import Workflow
+
+        queue = EventQueue(
+            connections=self.connections, concurrency=self.concurrency, batch_size=batch_size
+        )
+        for e in self.entries:
+            if e.workflow is not None and re.match(Workflow.running_statuses, str(e.status)):
+                e.workflow.notify(task, inputs, action, queue=queue)
+        return queue.flush()
+
+    def monitor(self, frequency=10):
+        """
+        Wait until all the submitted workflows have ended
+
+        Parameters
+        ----------
+        frequency : int
+            The frequency in seconds of the status updates
+
+        Returns
+        -------
+        entries : list of <class 'esdm_pav_client.batch.BatchEntry'>
+            Returns the entries of the batch
+        """
+        import time
+
+        while self.status():
+            time.sleep(frequency)
+        return self.entries
+
+    @property
+    def failed(self):
+        """
+        Entries whose document could not be submitted or whose workflow failed
+        """
+        return [e for e in self.entries if e.status == "FAILED" or "ERROR" in e.status]
+
+    def table(self):
+        """
+        Return the results of the batch as a text table with the document,
+        workflow id, status and error of each entry
+        """
+        rows = [["DOCUMENT", "WORKFLOW ID", "STATUS", "ERROR"]]
+        for e in self.entries:
+            rows.append(
+                [
+                    " ".join([e.document] + e.args),
+                    str(e.workflow_id or "-"),
+                    e.status,
+                    e.error or "",
+                ]
+            )
+        widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+        return "\n".join("  ".join(c.ljust(w) for c, w in zip(r, widths)).rstrip() for r in rows)
+
+    def _load(self, entry):
+        try:
+            from experiment import Experiment
+        except ImportError:
+            from .experiment import Experiment
+
+        if entry.experiment is not None:
+            return entry.experiment
+        experiment = Experiment.load(entry.document)
+        self.validate(experiment, self.catalogue)
+        return experiment
+
+    def _throttle(self):
+        import time
+
+        if self.rate is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_submission - now
+            self._next_submission = max(now, self._next_submission) + 1.0 / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+    def _workflow(self, experiment):
+        try:
+            from workflow import Workflow
+        except ImportError:
+            from .workflow import Workflow
+
+        return Workflow(
+            experiment,
+            endpoints=self.endpoints,
+            connections=self.connections,
+            history=self.history,
+        )
+
+    def _run(self, entry, server, port):
+        try:
+            workflow = self._workflow(self._load(entry))
+            self._throttle()
+            self._submit(workflow, entry.args, server, port)
+        except Exception as e:
+            entry.status = "FAILED"
+            entry.error = str(e) or e.__class__.__name__
+            return entry
+        entry.workflow = workflow
+        entry.status = "OPH_STATUS_RUNNING"
+        return entry
+
+    def _update(self, entry):
+        # a failed update or an unknown status keeps the last known status,
+        # so that the workflow is polled again
+        try:
+            status = self._status(entry.workflow)
+        except Exception as e:
+            entry.error = str(e) or e.__class__.__name__
+            return entry
+        if status is None:
+            entry.error = "unknown status"
+        else:
+            entry.status = str(status)
+            entry.error = None
+        return entry
+
+    @staticmethod
+    def _submit(workflow, args, server, port):
+        return workflow.submit(*args, server=server, port=port)
+
+    @staticmethod
+    def _status(workflow):
+        return workflow.status()
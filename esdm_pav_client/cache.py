@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class StatusCache:
+    """
+    Shared, size-bounded cache of parsed oph_resume responses
+
+    Entries expire after ``ttl`` seconds and the least recently used entries
+    are evicted once ``max_entries`` is reached. Concurrent requests for the
+    same key are coalesced: only the first caller queries the runtime, the
+    others wait for its result. Cached responses are shared between callers
+    and must not be modified.
+
+    Construction::
+    cache = StatusCache(max_entries=256, ttl=2)
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        maximum number of responses kept in the cache
+    ttl : int or float, optional
+        time to live of a cached response, in seconds
+
+    Raises
+    ------
+    AttributeError
+        If one of the parameters has the wrong type or value
+    """
+
+    def __init__(self, max_entries=256, ttl=2):
+        if not isinstance(max_entries, int) or max_entries < 1:
+            raise AttributeError("max_entries must be a positive int")
+        if not isinstance(ttl, (int, float)) or ttl < 0:
+            raise AttributeError("ttl must be a non-negative number")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(endpoint, workflow_id, level=None, username=None, project=None):
+        """
+        Build the cache key of a status query
+
+        The key includes the user and the project of the caller, so that a
+        cache shared by several users (e.g. in the client daemon) never serves
+        a response to a user the runtime did not answer.
+
+        Parameters
+        ----------
+        endpoint : str
+            ESDM-PAV runtime address, as "server:port"
+        workflow_id : int or str
+            id of the workflow
+        level : any, optional
+            query level (e.g. the oph_resume level and document type)
+        username : str, optional
+            name of the user querying the runtime
+        project : str, optional
+            project of the user querying the runtime
+
+        Returns
+        -------
+        key : tuple
+            Returns the (endpoint, workflow id, username, project, level) key
+        """
+        return (str(endpoint), str(workflow_id), username, project, level)
+
+    def get(self, key, loader):
+        """
+        Return the cached response for key, calling loader on a miss
+
+        Parameters
+        ----------
+        key : tuple
+            cache key, see StatusCache.key
+        loader : callable
+            function without arguments that queries the runtime and returns
+            the parsed response
+
+        Returns
+        -------
+        response : any
+            Returns the cached or freshly loaded response
+
+        Example
+        -------
+        response = cache.get(StatusCache.key("127.0.0.1:11732", 10),
+                             lambda: json.loads(query_runtime()))
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            call = self._in_flight.get(key)
+            owner = call is None
+            if owner:
+                call = _InFlight()
+                self._in_flight[key] = call
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = loader()
+        except BaseException as e:
+            call.error = e
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl, call.value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return call.value
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.event.set()
+
+    def invalidate(self, endpoint=None, workflow_id=None):
+        """
+        Drop the cached responses matching endpoint and/or workflow_id, or
+        all of them if no filter is given
+
+        Parameters
+        ----------
+        endpoint : str, optional
+            ESDM-PAV runtime address, as "server:port"
+        workflow_id : int or str, optional
+            id of the workflow
+        """
+        with self._lock:
+            for k in list(self._entries):
+                if endpoint is not None and k[0] != str(endpoint):
+                    continue
+                if workflow_id is not None and k[1] != str(workflow_id):
+                    continue
+                del self._entries[k]
+
+    def clear(self):
+        """
+        Drop all the cached responses and reset the statistics
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.coalesced = 0
+
+    @property
+    def hit_rate(self):
+        """
+        Fraction of the requests served without querying the runtime
+        """
+        total = self.hits + self.misses + self.coalesced
+        return (self.hits + self.coalesced) / total if total else 0.0
+
+    def stats(self):
+        """
+        Return the cache statistics
+
+        Returns
+        -------
+        stats : dict
+            Returns the number of hits, misses, coalesced requests, cached
+            entries and the hit rate
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+                "hit_rate": self.hit_rate,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+shared_status_cache = StatusCache()
@@ -0,0 +1,506 @@
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    from dag import control_operator, task_arguments
+    from dependencies import edges
+except ImportError:
+    from .dag import control_operator, task_arguments
+    from .dependencies import edges
+
+# arguments set by the runtime or accepted by every operator, never reported
+# as unknown
+runtime_arguments = [
+    "sessionid",
+    "workflowid",
+    "markerid",
+    "taskindex",
+    "lighttaskindex",
+    "username",
+    "userrole",
+    "userid",
+    "parentid",
+    "exec_mode",
+    "ncores",
+    "nthreads",
+    "nhost",
+    "host_partition",
+    "cwd",
+    "cdd",
+    "objkey_filter",
+    "save",
+]
+
+# values replaced at runtime ($N arguments, @{key} loop keys, &N outputs),
+# checked on execution only
+_dynamic = re.compile(r"[$@&]")
+
+_parsers = {"int": int, "real": float, "double": float, "float": float}
+
+
+def _grid(response, objkey):
+    # (rowkeys, rowvalues) of the grid objkey of a runtime response
+    for res in response.get("response", []):
+        if res.get("objkey") == objkey and res.get("objcontent"):
+            content = res["objcontent"][0]
+            return [str(k).strip().lower() for k in content.get("rowkeys", [])], content.get(
+                "rowvalues", []
+            )
+    return None, None
+
+
+def _column(rowkeys, *names):
+    for name in names:
+        if name in rowkeys:
+            return rowkeys.index(name)
+    return None
+
+
+def parse_operators(response):
+    """
+    Return the operator names of an oph_operators_list response
+    """
+    rowkeys, rowvalues = _grid(response, "operators_list")
+    if rowkeys is None:
+        return []
+    i = _column(rowkeys, "operator name", "operator", "name") or 0
+    return [str(row[i]).strip().lower() for row in rowvalues if row]
+
+
+def parse_arguments(response):
+    """
+    Return the argument schemas of an oph_man response (man_args grid), None
+    if the response has no list of arguments
+
+    Each schema is a dict with the name, type, mandatory flag, default value,
+    minimum and maximum values and allowed values of the argument.
+    """
+    rowkeys, rowvalues = _grid(response, "man_args")
+    if rowkeys is None:
+        return None
+    columns = {
+        "name": _column(rowkeys, "name", "argument"),
+        "type": _column(rowkeys, "type"),
+        "mandatory": _column(rowkeys, "mandatory"),
+        "default": _column(rowkeys, "default", "default value"),
+        "min": _column(rowkeys, "minvalue", "min value", "min"),
+        "max": _column(rowkeys, "maxvalue", "max value", "max"),
+        "values": _column(rowkeys, "values", "allowed values"),
+    }
+    if columns["name"] is None:
+        return None
+
+    def _value(row, key):
+        i = columns[key]
+        if i is None or i >= len(row) or row[i] in (None, "", "-"):
+            return None
+        return str(row[i]).strip()
+
+    arguments = []
+    for row in rowvalues:
+        values = _value(row, "values")
+        arguments.append(
+            {
+                "name": _value(row, "name"),
+                "type": (_value(row, "type") or "string").lower(),
+                "mandatory": (_value(row, "mandatory") or "no").lower() in ["yes", "true", "1"],
+                "default": _value(row, "default"),
+                "min": _value(row, "min"),
+                "max": _value(row, "max"),
+                "values": values.split("|") if values else None,
+            }
+        )
+    return [a for a in arguments if a["name"]]
+
+
+class OperatorValidator:
+    """
+    Checks of the arguments of an operator, compiled once from its argument
+    schemas (see parse_arguments)
+
+    Parameters
+    ----------
+    operator : str
+        operator name
+    arguments : list of dict, optional
+        argument schemas, only the name of the operator is checked if None
+    """
+
+    def __init__(self, operator, arguments=None):
+        self.operator = operator
+        self.known = None
+        self.mandatory = ()
+        self.checks = []
+        if arguments is None:
+            return
+        self.known = frozenset([a["name"] for a in arguments] + runtime_arguments)
+        self.mandatory = tuple(
+            a["name"] for a in arguments if a.get("mandatory") and a.get("default") is None
+        )
+        for a in arguments:
+            parse = _parsers.get(a.get("type"))
+            bounds = []
+            for key in ["min", "max"]:
+                try:
+                    bounds.append(parse(a[key]) if parse and a.get(key) is not None else None)
+                except ValueError:
+                    bounds.append(None)
+            values = frozenset(v.lower() for v in a["values"]) if a.get("values") else None
+            if parse or values or bounds != [None, None]:
+                self.checks.append((a["name"], a.get("type"), parse, bounds[0], bounds[1], values))
+
+    def check(self, arguments, provided=()):
+        """
+        Return the errors of the arguments of a task
+
+        Parameters
+        ----------
+        arguments : dict
+            arguments of the task
+        provided : set, optional
+            arguments set by the dependencies of the task or by the
+            experiment
+
+        Returns
+        -------
+        errors : list of str
+            Returns the description of each error
+        """
+        if self.known is None:
+            return []
+        errors = [
+            "unknown argument {0}".format(name) for name in arguments if name not in self.known
+        ]
+        errors += [
+            "missing argument {0}".format(name)
+            for name in self.mandatory
+            if name not in arguments and name not in provided
+        ]
+        for name, kind, parse, minimum, maximum, values in self.checks:
+            value = arguments.get(name)
+            if not value or _dynamic.search(value):
+                continue
+            pieces = [value] if values and value.lower() in values else value.split("|")
+            for piece in pieces:
+                if values and piece.lower() not in values:
+                    errors.append("invalid value {0} of argument {1}".format(piece, name))
+                    break
+                if parse is None:
+                    continue
+                try:
+                    number = parse(piece)
+                except ValueError:
+                    errors.append("argument {0} should be {1}".format(name, kind))
+                    break
+                if (minimum is not None and number < minimum) or (
+                    maximum is not None and number > maximum
+                ):
+                    errors.append("argument {0} out of range: {1}".format(name, piece))
+                    break
+        return errors
+
+
+class OperatorCatalogue:
+    """
+    Operators of an ESDM-PAV runtime and the schemas of their arguments, kept
+    in a versioned cache file so that the ophidia tasks of the experiments are
+    validated locally, without calling the runtime
+
+    The catalogue is read from the cache file at the first use and fetched
+    from the runtime (oph_operators_list, then oph_man for each operator)
+    when the file is missing, written by another format version or for
+    another runtime, or older than max_age; a stale catalogue is still used
+    if the runtime cannot be reached. A validator is compiled once per
+    operator.
+
+    Construction::
+    c1 = OperatorCatalogue(server="127.0.0.1", port="11732")
+
+    Parameters
+    ----------
+    server : str, optional
+        ESDM-PAV runtime DNS/IP address
+    port : str, optional
+        ESDM-PAV runtime port
+    path : str, optional
+        path of the cache file, the ESDM_PAV_CLIENT_CATALOGUE environment
+        variable or ~/.esdm_pav_client/operators-<server>-<port>.json if None
+    max_age : str or float, optional
+        maximum age of the cached catalogue, in seconds or as a relative
+        duration ("7d"), unlimited if None
+    username : str, optional
+        runtime user, the default of Workflow if None
+    password : str, optional
+        password of the user, the default of Workflow if None
+    project : str, optional
+        runtime project
+    connections : <class 'esdm_pav_client.connections.ConnectionPool'>, optional
+        pool the client fetching the catalogue is leased from, a new session
+        if None
+
+    Example
+    -------
+    c1 = OperatorCatalogue(max_age="7d")
+    report = c1.validate(e1)
+    if not report.valid:
+        print(report)
+    """
+
+    version = 1
+    # seconds between two attempts to refresh a stale catalogue
+    retry_interval = 60
+
+    def __init__(
+        self,
+        server="127.0.0.1",
+        port="11732",
+        path=None,
+        max_age="7d",
+        username=None,
+        password=None,
+        project=None,
+        connections=None,
+    ):
+        if path is None:
+            path = os.environ.get("ESDM_PAV_CLIENT_CATALOGUE") or os.path.join(
+                os.path.expanduser("~"),
+                ".esdm_pav_client",
+                "operators-{0}-{1}.json".format(re.sub(r"[^\w.]", "_", str(server)), port),
+            )
+        self.server = str(server)
+        self.port = str(port)
+        self.path = path
+        self.max_age = max_age
+        self.username = username
+        self.password = password
+        self.project = project
+        self.connections = connections
+        self.fetched = None
+        self._operators = None
+        self._validators = {}
+        self._failed = float("-inf")
+        self._lock = threading.RLock()
+
+    def _endpoint(self):
+        return "{0}:{1}".format(self.server, self.port)
+
+    @property
+    def operators(self):
+        """
+        Operator name -> argument schemas (None if unknown) dict, loaded or
+        fetched at the first access
+        """
+        with self._lock:
+            if self._operators is None or self.expired():
+                if self._operators is None:
+                    self.load()
+                stale = self._operators is not None and self.expired()
+                if self._operators is None or (
+                    stale and time.monotonic() - self._failed >= self.retry_interval
+                ):
+                    try:
+                        self.refresh()
+                    except Exception:
+                        self._failed = time.monotonic()
+                        if self._operators is None:
+                            raise
+            return self._operators
+
+    def expired(self, now=None):
+        """
+        Return True if the catalogue is missing or older than max_age
+        """
+        try:
+            from history import parse_since
+        except ImportError:
+            from .history import parse_since
+
+        if self.fetched is None:
+            return True
+        if self.max_age is None:
+            return False
+        return self.fetched < parse_since(self.max_age, now)
+
+    def load(self):
+        """
+        Read the cache file, ignored if missing, unreadable, of another
+        format version or of another runtime
+
+        Returns
+        -------
+        loaded : bool
+            Returns True if the catalogue was read
+        """
+        try:
+            with open(self.path, "r") as fp:
+                data = json.load(fp)
+        except (IOError, ValueError):
+            return False
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != self.version
+            or data.get("runtime") != self._endpoint()
+        ):
+            return False
+        with self._lock:
+            self._set(data["operators"], data["fetched"])
+        return True
+
+    def update(self, operators, now=None):
+        """
+        Replace the catalogue and write the cache file
+
+        Parameters
+        ----------
+        operators : dict
+            operator name -> argument schemas (see parse_arguments), None if
+            only the name of the operator is known
+        now : float, optional
+            time of the catalogue, the current time if None
+        """
+        fetched = time.time() if now is None else now
+        data = {
+            "version": self.version,
+            "runtime": self._endpoint(),
+            "fetched": fetched,
+            "operators": operators,
+        }
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary = "{0}.{1}.tmp".format(self.path, os.getpid())
+        with open(temporary, "w") as fp:
+            json.dump(data, fp)
+        # atomic, for the other processes reading the cache
+        os.replace(temporary, self.path)
+        with self._lock:
+            self._set(operators, fetched)
+
+    def _set(self, operators, fetched):
+        self._operators = {str(k).lower(): v for k, v in operators.items()}
+        self.fetched = fetched
+        self._validators = {}
+
+    def refresh(self):
+        """
+        Fetch the catalogue from the runtime and write the cache file
+
+        Raises
+        ------
+        RuntimeCallError
+            If the runtime cannot be reached or rejects a request
+        """
+        try:
+            from workflow import Workflow
+            from connections import connect
+        except ImportError:
+            from .workflow import Workflow
+            from .connections import connect
+
+        username = self.username if self.username is not None else Workflow.username
+        password = self.password if self.password is not None else Workflow.password
+        if self.connections is not None:
+            with self.connections.connection(
+                username, password, self.server, self.port, self.project
+            ) as lease:
+                operators = self._fetch(lease.client)
+        else:
+            operators = self._fetch(
+                connect(username, password, self.server, self.port, self.project)
+            )
+        self.update(operators)
+
+    def _fetch(self, client):
+        try:
+            from resilience import RuntimeCallError
+        except ImportError:
+            from .resilience import RuntimeCallError
+
+        def _submit(query):
+            client.submit(query)
+            if client.last_return_value != 0 or not client.last_response:
+                raise RuntimeCallError(
+                    "{0} failed on the runtime {1}".format(query.split()[0], self._endpoint()),
+                    transient=not client.last_response,
+                )
+            return json.loads(client.last_response)
+
+        operators = {}
+        for name in parse_operators(_submit("oph_operators_list")):
+            operators[name] = parse_arguments(_submit("oph_man function={0};".format(name)))
+        return operators
+
+    def validator(self, operator):
+        """
+        Return the compiled validator of an operator, None if the operator is
+        not in the catalogue
+        """
+        operator = str(operator).lower()
+        validator = self._validators.get(operator)
+        if validator is None:
+            operators = self.operators
+            with self._lock:
+                if operator not in operators:
+                    return None
+                validator = self._validators.setdefault(
+                    operator, OperatorValidator(operator, operators[operator])
+                )
+        return validator
+
+    def check_task(self, task, provided=()):
+        """
+        Return the errors of the operator and of the arguments of a task;
+        only the ophidia tasks that are not flow control tasks are checked
+
+        Parameters
+        ----------
+        task : <class 'esdm_pav_client.task.Task'>
+            task to be checked
+        provided : set, optional
+            arguments set by the experiment, in addition to the arguments set
+            by the dependencies of the task
+
+        Returns
+        -------
+        errors : list of str
+            Returns the description of each error
+        """
+        if task.type != "ophidia" or control_operator(task) is not None:
+            return []
+        validator = self.validator(task.operator)
+        if validator is None:
+            return ["unknown operator {0}".format(task.operator)]
+        provided = set(provided)
+        provided.update(a for _, a in edges(task.dependencies) if a)
+        return validator.check(task_arguments(task), provided)
+
+    def validate(self, experiment, report=None):
+        """
+        Check the operator and the arguments of each task of an experiment
+
+        Parameters
+        ----------
+        experiment : <class 'esdm_pav_client.experiment.Experiment'>
+            experiment to be checked
+        report : <class 'esdm_pav_client.validation.ValidationReport'>, optional
+            report the errors are added to, a new one if None
+
+        Returns
+        -------
+        report : <class 'esdm_pav_client.validation.ValidationReport'>
+            Returns the report listing all the errors
+        """
+        try:
+            from validation import ValidationReport
+        except ImportError:
+            from .validation import ValidationReport
+
+        if report is None:
+            report = ValidationReport()
+        provided = set(k for k in experiment.attributes if experiment.__dict__.get(k) is not None)
+        for task in experiment.tasks:
+            for error in self.check_task(task, provided):
+                report.errors.append("task {0}: {1}".format(task.name, error))
+        return report
@@ -0,0 +1,186 @@
+try:
+    from optimizer import pure_operators
+except ImportError:
+    from .optimizer import pure_operators
+
+
+# operators creating a new cube, besides the pure ones
+cube_operators = pure_operators + [
+    "oph_concatesdm",
+    "oph_concatesdm2",
+    "oph_concatnc",
+    "oph_concatnc2",
+    "oph_importesdm",
+    "oph_importesdm2",
+    "oph_importfits",
+    "oph_importnc",
+    "oph_importnc2",
+    "oph_importncs",
+    "oph_randcube",
+    "oph_randcube2",
+]
+
+export_operators = ["oph_exportesdm", "oph_exportesdm2", "oph_exportnc", "oph_exportnc2"]
+
+# dependency arguments through which a cube is passed to the next task
+cube_arguments = ["cube", "cubes"]
+
+
+class CleanupReport:
+    """
+    Changes made by Experiment.cleanup
+
+    Attributes
+    ----------
+    released : list of str
+        names of the tasks whose output cube is now deleted on exit
+    exempted : dict
+        task name -> reason, for the intermediate cubes left untouched
+    peak_before : int
+        estimated peak number of live cubes before the cleanup
+    peak_after : int
+        estimated peak number of live cubes after the cleanup
+    """
+
+    def __init__(self):
+        self.released = []
+        self.exempted = {}
+        self.peak_before = 0
+        self.peak_after = 0
+
+    def __str__(self):
+        return "{0} intermediate cubes released, peak live cubes {1} -> {2}".format(
+            len(self.released), self.peak_before, self.peak_after
+        )
+
+    def __repr__(self):
+        return "<CleanupReport: {0}>".format(str(self))
+
+
+def _multiplicity(graph, args):
+    # number of instances of each task, given the iterations of the loops
+    # enclosing it; loops with unknown values count as one iteration
+    try:
+        from dag import control_operator, substitute_args, task_arguments
+    except ImportError:
+        from .dag import control_operator, substitute_args, task_arguments
+
+    multiplicity = [1] * len(graph)
+    for opener, block in graph.blocks().items():
+        if control_operator(graph.tasks[opener]) != "for":
+            continue
+        values = substitute_args(task_arguments(graph.tasks[opener]).get("values", ""), args)
+        if "$" in values or "@{" in values or not values:
+            continue
+        for i in block["body"]:
+            if i != block["end"]:
+                multiplicity[i] *= len(values.split("|"))
+    return multiplicity
+
+
+def peak_live_cubes(tasks, args=()):
+    """
+    Estimate the peak number of cubes alive at the same time
+
+    The tasks are assumed to run level by level, a level grouping the tasks
+    whose dependencies are all in the previous levels. A cube is alive from
+    the level of the task creating it until the end of the workflow, or
+    until the level of its last consumer if it is deleted on exit.
+
+    Parameters
+    ----------
+    tasks : list of <class 'esdm_pav_client.task.Task'>
+        tasks of the experiment
+    args : list, optional
+        list of arguments to be substituted in the loop values
+
+    Returns
+    -------
+    peak : int
+        Returns the estimated peak number of live cubes
+    """
+    try:
+        from dag import GraphView
+    except ImportError:
+        from .dag import GraphView
+
+    graph = GraphView(tasks)
+    level = [0] * len(graph)
+    for v in graph.topological_order():
+        level[v] = max([level[u] + 1 for u in graph.predecessors[v]] + [0])
+    last = max(level + [0])
+    multiplicity = _multiplicity(graph, args)
+    live = [0] * (last + 1)
+    for i, task in enumerate(tasks):
+        consumers = [v for v in graph.successors[i] if graph.argument(i, v) in cube_arguments]
+        if task.type != "ophidia" or (task.operator not in cube_operators and not consumers):
+            continue
+        end = last
+        if task.__dict__.get("on_exit") == "oph_delete":
+            end = max([level[v] for v in consumers] + [level[i]])
+        for lv in range(level[i], end + 1):
+            live[lv] += multiplicity[i]
+    return max(live + [0])
+
+
+def release_intermediate_cubes(experiment, keep=None, args=()):
+    """
+    Set on_exit=oph_delete on the tasks creating intermediate cubes, i.e.
+    cubes only used as input of other Ophidia tasks
+
+    The cubes are exempted when they are exported, passed to a flow control
+    task (e.g. gathered by an endfor), used by non-Ophidia tasks, listed in
+    keep, or when the task already defines on_exit.
+
+    Parameters
+    ----------
+    experiment : <class 'esdm_pav_client.experiment.Experiment'>
+        experiment to be changed
+    keep : list of str, optional
+        names of the tasks whose output cube must be kept
+    args : list, optional
+        list of arguments to be substituted in the loop values
+
+    Returns
+    -------
+    report : <class 'esdm_pav_client.cleanup.CleanupReport'>
+        Returns the report of the changes
+    """
+    try:
+        from dag import control_operator
+    except ImportError:
+        from .dag import control_operator
+
+    keep = set(keep or [])
+    report = CleanupReport()
+    report.peak_before = peak_live_cubes(experiment.tasks, args)
+    graph = experiment.graph
+    for i, task in enumerate(experiment.tasks):
+        if task.type != "ophidia":
+            continue
+        consumers = [v for v in graph.successors[i] if graph.argument(i, v) in cube_arguments]
+        if not consumers:
+            continue
+        reason = None
+        if task.name in keep:
+            reason = "kept"
+        elif "on_exit" in task.__dict__ and task.on_exit is not None:
+            reason = "on_exit already set"
+        else:
+            for v in consumers:
+                consumer = experiment.tasks[v]
+                if consumer.operator in export_operators:
+                    reason = "exported"
+                elif control_operator(consumer) is not None or consumer.type == "control":
+                    reason = "passed to flow control task"
+                elif consumer.type != "ophidia":
+                    reason = "used by non-Ophidia task"
+                if reason is not None:
+                    break
+        if reason is not None:
+            report.exempted[task.name] = reason
+            continue
+        task.on_exit = "oph_delete"
+        report.released.append(task.name)
+    report.peak_after = peak_live_cubes(experiment.tasks, args)
+    return report
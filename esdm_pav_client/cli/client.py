@@ -7,6 +7,18 @@ sys.path.insert(0, os.path.dirname(previous_dir))
 sys.path.insert(0, "..")
 from esdm_pav_client import Workflow
 from esdm_pav_client import Experiment
+from esdm_pav_client.routing import EndpointPool
+from esdm_pav_client.batch import WorkflowBatch
+from esdm_pav_client.connections import ConnectionPool
+from esdm_pav_client import daemon as client_daemon
+from esdm_pav_client.history import HistoryStore, default_history
+from esdm_pav_client.memo import MemoStore, default_memo
+from esdm_pav_client.expand import ExpansionLimitError
+from esdm_pav_client.catalogue import OperatorCatalogue
+from esdm_pav_client.cli.launcher import main
+
+# clients shared by the commands, kept warm across commands by the daemon
+connections = ConnectionPool()
 
 
 def verbose_check_display(verbose, text):
@@ -20,10 +32,39 @@ def print_help():
     ctx.exit()
 
 
-@click.command(
+def load_endpoints(endpoints):
+    if not endpoints:
+        return None
+    if endpoints.startswith("="):
+        endpoints = endpoints[1:]
+    return EndpointPool.load(endpoints)
+
+
+class DefaultCommandGroup(click.Group):
+    """Group of commands running the default command when the first argument
+    is not the name of a command, so that the options of the default command
+    can be given without naming it"""
+
+    def __init__(self, *args, default_command=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        if not args or args[0] not in self.commands:
+            args = [self.default_command] + list(args)
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup, default_command="submit")
+def run():
+    """Command Line Interface to run ESDM-PAV experiments"""
+
+
+@run.command(
+    "submit",
     context_settings=dict(
         ignore_unknown_options=True,
-    )
+    ),
 )
 @click.option("-v", "--verbose", is_flag=True, help="Will print verbose messages")
 @click.option(
@@ -40,6 +81,14 @@ def print_help():
     default="11732",
     metavar="<port number>",
 )
+@click.option(
+    "-E",
+    "--endpoints",
+    help="File listing the ESDM-PAV Runtimes to balance the submissions across "
+    "(JSON document or one 'address:port [weight]' line per runtime), in place of -S/-P",
+    type=str,
+    metavar="<endpoints file>",
+)
 @click.option(
     "-m",
     "--monitor",
@@ -80,10 +129,85 @@ def print_help():
     type=str,
     metavar="<checkpoint name>",
 )
+@click.option(
+    "--sweep",
+    help="Submit the experiment workflow once per row of the CSV file, each row being a set "
+    "of arguments",
+    type=str,
+    metavar="<CSV file>",
+)
+@click.option(
+    "--product",
+    is_flag=True,
+    help="Submit the Cartesian product of the sweep values: the i-th column lists the values "
+    "of the i-th argument",
+)
+@click.option(
+    "-n",
+    "--concurrency",
+    help="Maximum number of sweep instances submitted at the same time",
+    default=8,
+    type=int,
+    metavar="<number>",
+)
+@click.option(
+    "--rate",
+    help="Maximum number of sweep instances submitted per second",
+    type=float,
+    metavar="<submissions per second>",
+)
+@click.option(
+    "--deduplicate",
+    is_flag=True,
+    help="Do not submit the experiment workflow if the same PAV document was already submitted "
+    "with the same arguments and is not failed: the existing workflow id is used instead",
+)
+@click.option(
+    "--memoize",
+    is_flag=True,
+    help="Replace the tasks whose output was already exported by a completed experiment "
+    "workflow with the import of that output, and record the outputs exported by this "
+    "workflow for later reuse (see the memo command)",
+)
+@click.option(
+    "--max-instances",
+    help="Do not submit the experiment workflow if its loops expand into more task instances",
+    type=int,
+    metavar="<number>",
+)
+@click.option(
+    "--max-size",
+    help="Do not submit the experiment workflow if its loops expand into a larger runtime "
+    "document",
+    type=int,
+    metavar="<bytes>",
+)
 @click.argument("workflow_args", nargs=-1, type=click.UNPROCESSED)
-def run(verbose, server, port, monitor, sync_mode, cancel, workflow, workflow_args, id, checkpoint):
+def submit(
+    verbose,
+    server,
+    port,
+    endpoints,
+    monitor,
+    sync_mode,
+    cancel,
+    workflow,
+    workflow_args,
+    id,
+    checkpoint,
+    sweep,
+    product,
+    concurrency,
+    rate,
+    deduplicate,
+    memoize,
+    max_instances,
+    max_size,
+):
     """Command Line Interface to run an ESDM-PAV experiment\n
-    Example: esdm-pav-client -w experiment.json 1 2"""
+    Example: esdm-pav-client -w experiment.json 1 2\n
+    Sweep example: esdm-pav-client -w experiment.json --sweep args.csv -n 16\n
+    See also: esdm-pav-client batch --help"""
 
     def modify_args(workflow, server, port):
         if workflow.startswith("="):
@@ -103,22 +227,71 @@ def run(verbose, server, port, monitor, sync_mode, cancel, workflow, workflow_ar
                 args.append(c)
         return args
 
-    if workflow:
+    pool = load_endpoints(endpoints)
+
+    if workflow and sweep:
+        workflow, server, port = modify_args(workflow, server, port)
+        if sweep.startswith("="):
+            sweep = sweep[1:]
+        verbose_check_display(verbose, "Reading the PAV experiment document and the sweep")
+        try:
+            b1 = WorkflowBatch.from_sweep(
+                workflow,
+                WorkflowBatch.read_sweep(sweep),
+                product=product,
+                concurrency=concurrency,
+                endpoints=pool,
+                connections=connections,
+                rate=rate,
+                history=default_history(),
+            )
+        except AttributeError as e:
+            verbose_check_display(True, str(e))
+            sys.exit(1)
+        verbose_check_display(
+            verbose, "Submitting {0} experiment workflows".format(str(len(b1.entries)))
+        )
+        b1.submit(server=server, port=port)
+        if monitor:
+            verbose_check_display(verbose, "Monitoring the experiment workflows")
+            b1.monitor(frequency=5)
+        click.echo(b1.table())
+        if b1.failed:
+            sys.exit(1)
+        return 0
+    elif workflow:
         workflow, server, port = modify_args(workflow, server, port)
         args = extract_other_args(workflow_args)
         verbose_check_display(verbose, "Reading the PAV experiment document")
         e1 = Experiment.load(workflow)
-        w1 = Workflow(e1)
+        w1 = Workflow(
+            e1,
+            endpoints=pool,
+            connections=connections,
+            history=default_history(),
+            memo=default_memo() if memoize else None,
+        )
+        w1.max_instances = max_instances
+        w1.max_document_size = max_size
         if not sync_mode:
             e1.exec_mode = "sync"
             verbose_check_display(
                 verbose,
                 "Submitting the experiment workflow in synchronous mode",
             )
-            w1.submit(server=server, port=port, *args)
+            try:
+                w1.submit(server=server, port=port, deduplicate=deduplicate, memoize=memoize, *args)
+            except ExpansionLimitError as e:
+                verbose_check_display(True, str(e))
+                sys.exit(1)
+            if memoize and not w1.deduplicated:
+                verbose_check_display(verbose, str(w1.memoization_report))
             verbose_check_display(
                 True,
-                "Submitted! Workflow id = {0}".format((str(w1.workflow_id))),
+                "{0} Workflow id = {1}".format(
+                    "Already submitted!" if w1.deduplicated else "Submitted!",
+                    str(w1.workflow_id),
+                ),
             )
             if monitor:
                 w1.monitor(frequency=5, iterative=True, visual_mode=True)
@@ -127,10 +300,19 @@ def run(verbose, server, port, monitor, sync_mode, cancel, workflow, workflow_ar
                 verbose,
                 "Submitting the experiment workflow in asynchronous mode",
             )
-            w1.submit(server=server, port=port, *args)
+            try:
+                w1.submit(server=server, port=port, deduplicate=deduplicate, memoize=memoize, *args)
+            except ExpansionLimitError as e:
+                verbose_check_display(True, str(e))
+                sys.exit(1)
+            if memoize and not w1.deduplicated:
+                verbose_check_display(verbose, str(w1.memoization_report))
             verbose_check_display(
                 True,
-                "Submitted! Workflow id = {0}".format((str(w1.workflow_id))),
+                "{0} Workflow id = {1}".format(
+                    "Already submitted!" if w1.deduplicated else "Submitted!",
+                    str(w1.workflow_id),
+                ),
             )
             w1.monitor(frequency=5, iterative=True, visual_mode=True)
         return 0
@@ -147,7 +329,7 @@ def run(verbose, server, port, monitor, sync_mode, cancel, workflow, workflow_ar
                 verbose,
                 "Will cancel the experiment workflow execution: {0}".format(str(id)),
             )
-            w1 = Workflow(id)
+            w1 = Workflow(id, endpoints=pool, connections=connections, history=default_history())
             w1.cancel()
             return 0
     elif monitor:
@@ -163,7 +345,7 @@ def run(verbose, server, port, monitor, sync_mode, cancel, workflow, workflow_ar
                 verbose,
                 "Will monitor the experiment workflow execution: {0}".format(str(id)),
             )
-            w1 = Workflow(id)
+            w1 = Workflow(id, endpoints=pool, connections=connections, history=default_history())
             w1.monitor(frequency=5, iterative=True, visual_mode=True)
             return 0
     elif checkpoint:
@@ -174,7 +356,7 @@ def run(verbose, server, port, monitor, sync_mode, cancel, workflow, workflow_ar
                 "Id of the experiment workflow to be restarted from checkpoint is required",
             )
             return 1
-        w1 = Workflow(id)
+        w1 = Workflow(id, endpoints=pool, connections=connections, history=default_history())
         if not sync_mode:
             e1.exec_mode = "sync"
             verbose_check_display(
@@ -204,5 +386,317 @@ def run(verbose, server, port, monitor, sync_mode, cancel, workflow, workflow_ar
         print_help()
 
 
+@run.command("batch")
+@click.option("-v", "--verbose", is_flag=True, help="Will print verbose messages")
+@click.option(
+    "-S",
+    "--server",
+    help="ESDM-PAV Runtime address (used in case of remote submission)",
+    default="127.0.0.1",
+    metavar="<IP address>",
+)
+@click.option(
+    "-P",
+    "--port",
+    help="ESDM-PAV Runtime port (used in case of remote submission)",
+    default="11732",
+    metavar="<port number>",
+)
+@click.option(
+    "-E",
+    "--endpoints",
+    help="File listing the ESDM-PAV Runtimes to balance the submissions across "
+    "(JSON document or one 'address:port [weight]' line per runtime), in place of -S/-P",
+    type=str,
+    metavar="<endpoints file>",
+)
+@click.option(
+    "-d",
+    "--dir",
+    "directory",
+    help="Directory of the PAV documents (JSON files) to be submitted",
+    type=str,
+    metavar="<directory>",
+)
+@click.option(
+    "-f",
+    "--manifest",
+    help="Manifest of the PAV documents to be submitted: one 'document [args]' line per "
+    "experiment, or a JSON list of {'document': ..., 'args': [...]} objects",
+    type=str,
+    metavar="<manifest file>",
+)
+@click.option(
+    "-n",
+    "--concurrency",
+    help="Maximum number of documents submitted at the same time",
+    default=8,
+    type=int,
+    metavar="<number>",
+)
+@click.option(
+    "-m",
+    "--monitor",
+    is_flag=True,
+    help="Wait until all the experiment workflows have ended",
+)
+@click.option(
+    "-F",
+    "--frequency",
+    help="Frequency of the status updates in seconds, when monitoring",
+    default=10,
+    type=int,
+    metavar="<seconds>",
+)
+@click.option(
+    "-C",
+    "--check-operators",
+    is_flag=True,
+    help="Check the operators and arguments of the tasks before submitting, against the "
+    "catalogue of the -S/-P runtime cached in ~/.esdm_pav_client",
+)
+def batch(
+    verbose,
+    server,
+    port,
+    endpoints,
+    directory,
+    manifest,
+    concurrency,
+    monitor,
+    frequency,
+    check_operators,
+):
+    """Submit many PAV documents concurrently from a directory or a manifest\n
+    Example: esdm-pav-client batch --dir docs/ --concurrency 16"""
+
+    if bool(directory) == bool(manifest):
+        verbose_check_display(True, "Either a directory or a manifest is required")
+        return 1
+    kwargs = dict(
+        concurrency=concurrency,
+        endpoints=load_endpoints(endpoints),
+        connections=connections,
+        history=default_history(),
+    )
+    if check_operators:
+        kwargs["catalogue"] = OperatorCatalogue(server, port, connections=connections)
+    if directory:
+        b1 = WorkflowBatch.from_directory(directory, **kwargs)
+    else:
+        b1 = WorkflowBatch.from_manifest(manifest, **kwargs)
+    verbose_check_display(
+        verbose, "Submitting {0} experiment workflows".format(str(len(b1.entries)))
+    )
+    b1.submit(server=server, port=port)
+    if monitor:
+        verbose_check_display(verbose, "Monitoring the experiment workflows")
+        b1.monitor(frequency=frequency)
+    click.echo(b1.table())
+    if b1.failed:
+        sys.exit(1)
+    return 0
+
+
+@run.command("history")
+@click.option("--failed", is_flag=True, help="Only the experiment workflows ended with an error")
+@click.option("--status", help="Only the experiment workflows with this status", metavar="<status>")
+@click.option(
+    "--since",
+    help="Only the experiment workflows submitted since a duration ago (e.g. 30m, 12h, 2d, 1w) "
+    "or a date (e.g. 2023-02-23)",
+    metavar="<duration or date>",
+)
+@click.option("--name", help="Only the experiments whose name contains this text", metavar="<name>")
+@click.option(
+    "-n",
+    "--limit",
+    help="Maximum number of experiment workflows listed",
+    default=50,
+    type=int,
+    metavar="<number>",
+)
+@click.option(
+    "-i",
+    "--id",
+    help="List the tasks of an experiment workflow with their status and duration",
+    type=str,
+    metavar="<id>",
+)
+@click.option("--json", "as_json", is_flag=True, help="Print the history as JSON")
+@click.option(
+    "--db",
+    help="Path of the history database, by default ESDM_PAV_CLIENT_HISTORY or "
+    "~/.esdm_pav_client/history.sqlite",
+    metavar="<path>",
+)
+def history(failed, status, since, name, limit, id, as_json, db):
+    """List the submitted experiment workflows from the local history, without
+    contacting the runtime\n
+    Example: esdm-pav-client history --failed --since 2d"""
+    import json
+    import time
+
+    def _table(rows):
+        widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+        return "\n".join("  ".join(c.ljust(w) for c, w in zip(r, widths)).rstrip() for r in rows)
+
+    def _duration(seconds):
+        return "-" if seconds is None else "{0:.0f}s".format(seconds)
+
+    store = HistoryStore(db) if db else default_history()
+    if id:
+        tasks = store.tasks(id)
+        if as_json:
+            click.echo(json.dumps(tasks, indent=4))
+            return 0
+        rows = [["TASK NAME", "STATUS", "DURATION"]]
+        rows += [[t["name"], t["status"], _duration(t["duration"])] for t in tasks]
+        click.echo(_table(rows))
+        return 0
+    try:
+        submissions = store.query(failed=failed, status=status, since=since, name=name, limit=limit)
+    except AttributeError as e:
+        verbose_check_display(True, str(e))
+        sys.exit(1)
+    if as_json:
+        click.echo(json.dumps(submissions, indent=4))
+        return 0
+    rows = [["WORKFLOW ID", "RUNTIME", "EXPERIMENT", "ARGS", "SUBMITTED", "STATUS", "DURATION"]]
+    for s in submissions:
+        rows.append(
+            [
+                s["workflow_id"],
+                s["endpoint"],
+                str(s["experiment_name"] or "-"),
+                " ".join(s["args"]),
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(s["submitted"])),
+                s["status"],
+                _duration(s["duration"]),
+            ]
+        )
+    click.echo(_table(rows))
+    return 0
+
+
+@run.command("memo")
+@click.option(
+    "--invalidate",
+    help="Forget an exported output, given the output (e.g. esdm://dataset), the hash of the "
+    "exported cube or the id of the experiment workflow that exported it",
+    metavar="<output, hash or id>",
+)
+@click.option(
+    "--before",
+    help="Forget the outputs exported before a duration ago (e.g. 30d) or a date",
+    metavar="<duration or date>",
+)
+@click.option("--clear", is_flag=True, help="Forget all the exported outputs")
+@click.option(
+    "--db",
+    help="Path of the memo database, by default ESDM_PAV_CLIENT_MEMO or "
+    "~/.esdm_pav_client/memo.sqlite",
+    metavar="<path>",
+)
+def memo(invalidate, before, clear, db):
+    """List the outputs exported by completed experiment workflows that the
+    --memoize option can reuse, or forget some of them\n
+    Example: esdm-pav-client memo --invalidate esdm://tos_mean"""
+    store = MemoStore(db) if db else default_memo()
+    if clear:
+        store.clear()
+        return 0
+    if invalidate or before:
+        try:
+            deleted = 0
+            if invalidate:
+                deleted += store.invalidate(
+                    digest=invalidate, output=invalidate, workflow_id=invalidate
+                )
+            if before:
+                deleted += store.invalidate(before=before)
+        except AttributeError as e:
+            verbose_check_display(True, str(e))
+            sys.exit(1)
+        verbose_check_display(True, "{0} outputs forgotten".format(deleted))
+        return 0
+    store.evict()
+    rows = [["HASH", "OUTPUT", "WORKFLOW ID", "RUNTIME", "HITS"]]
+    for entry in store.entries():
+        rows.append(
+            [
+                entry["hash"],
+                entry["output"],
+                str(entry["workflow_id"] or "-"),
+                str(entry["endpoint"] or "-"),
+                str(entry["hits"]),
+            ]
+        )
+    widths = [max(len(r[i]) for r in rows) for i in range(len(rows[0]))]
+    for r in rows:
+        click.echo("  ".join(c.ljust(w) for c, w in zip(r, widths)).rstrip())
+    return 0
+
+
+@run.group("daemon")
+def daemon():
+    """Manage the client daemon, which runs the commands of the CLI in a
+    long-lived process reusing the runtime sessions\n
+    Example: esdm-pav-client daemon start"""
+
+
+@daemon.command("start")
+@click.option("--socket", "socket_path", help="Path of the Unix socket", metavar="<path>")
+@click.option(
+    "--idle-timeout",
+    help="Seconds without commands after which the daemon exits",
+    type=float,
+    metavar="<seconds>",
+)
+@click.option("--foreground", is_flag=True, help="Run the daemon in the current process")
+def daemon_start(socket_path, idle_timeout, foreground):
+    """Start the client daemon"""
+    status = client_daemon.ping(socket_path)
+    if status is not None:
+        click.echo("Daemon already running, pid = {0}".format(status["pid"]))
+        return 0
+    if foreground:
+        client_daemon.ClientDaemon(socket_path, idle_timeout=idle_timeout).serve_forever()
+        return 0
+    status = client_daemon.spawn(socket_path, idle_timeout=idle_timeout)
+    if status is None:
+        click.echo("Daemon failed to start")
+        sys.exit(1)
+    click.echo("Daemon started, pid = {0}".format(status["pid"]))
+    return 0
+
+
+@daemon.command("stop")
+@click.option("--socket", "socket_path", help="Path of the Unix socket", metavar="<path>")
+def daemon_stop(socket_path):
+    """Stop the client daemon"""
+    if not client_daemon.stop(socket_path):
+        click.echo("Daemon not running")
+        sys.exit(1)
+    click.echo("Daemon stopped")
+    return 0
+
+
+@daemon.command("status")
+@click.option("--socket", "socket_path", help="Path of the Unix socket", metavar="<path>")
+def daemon_status(socket_path):
+    """Show the status of the client daemon"""
+    status = client_daemon.ping(socket_path)
+    if status is None:
+        click.echo("Daemon not running")
+        sys.exit(1)
+    click.echo(
+        "Daemon running, pid = {0}, uptime = {1:.0f}s, requests = {2}".format(
+            status["pid"], status["uptime"], status["requests"]
+        )
+    )
+    return 0
+
+
 if __name__ == "__main__":
-    run()
+    main()
@@ -0,0 +1,23 @@
+import os
+import sys
+
+
+def main():
+    """Entry point of the CLI: forwards the command to the client daemon when
+    it is running, unless ESDM_PAV_CLIENT_NO_DAEMON is set; only the daemon
+    client is imported until the command has to run in this process"""
+    if not os.environ.get("ESDM_PAV_CLIENT_NO_DAEMON"):
+        from esdm_pav_client import daemon
+
+        response = daemon.forward(sys.argv[1:])
+        if response is not None:
+            sys.stdout.write(response["output"])
+            sys.stderr.write(response["error"])
+            sys.exit(response["exit_code"])
+    from esdm_pav_client.cli.client import run
+
+    run(prog_name="esdm-pav-client")
+
+
+if __name__ == "__main__":
+    main()
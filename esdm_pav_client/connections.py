@@ -0,0 +1,183 @@
+import threading
+from collections import deque
+
+
+def connect(username, password, server, port, project=None):
+    """
+    Open a session of the PyOphidia client on an ESDM-PAV runtime
+
+    Returns
+    -------
+    client : <class 'PyOphidia.client.Client'>
+        Returns the connected client
+
+    Raises
+    ------
+    RuntimeCallError
+        If the runtime cannot be reached (transient, not delivered)
+    """
+    from PyOphidia import client
+
+    try:
+        from resilience import RuntimeCallError
+    except ImportError:
+        from .resilience import RuntimeCallError
+
+    try:
+        pyophidia_client = client.Client(
+            username=username,
+            password=password,
+            server=server,
+            port=port,
+            project=project,
+            api_mode=False,
+        )
+    except Exception as e:
+        raise RuntimeCallError(
+            "failed to connect to the runtime", transient=True, delivered=False
+        ) from e
+    if pyophidia_client.last_return_value != 0:
+        raise RuntimeCallError("failed to connect to the runtime", transient=True, delivered=False)
+    pyophidia_client.resume_session()
+    return pyophidia_client
+
+
+class Lease:
+    """
+    Exclusive use of a pooled client, returned to the pool at the end of the
+    with block unless discarded
+    """
+
+    def __init__(self, pool, key, client):
+        self.pool = pool
+        self.key = key
+        self.client = client
+        self.discarded = False
+
+    def discard(self):
+        """
+        Close the client instead of returning it to the pool, e.g. after a
+        failed call
+        """
+        self.discarded = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.pool.release(self, discard=self.discarded or exc_type is not None)
+        return False
+
+
+class ConnectionPool:
+    """
+    Pool of connected PyOphidia clients, reused by the workflows submitted
+    from the same process instead of opening a session per workflow
+
+    A client is used by one call at a time. Up to max_idle clients per runtime
+    and user are kept once released; acquire blocks when max_active clients
+    of a runtime are in use.
+
+    Construction::
+    c1 = ConnectionPool(max_idle=8)
+
+    Parameters
+    ----------
+    max_idle : int, optional
+        maximum number of idle clients kept per runtime and user
+    max_active : int, optional
+        maximum number of clients of a runtime and user in use at the same
+        time, unlimited if None
+
+    Raises
+    ------
+    AttributeError
+        If max_idle or max_active is not a positive int
+
+    Example
+    -------
+    c1 = ConnectionPool()
+    w1 = Workflow(e1, connections=c1)
+    w1.submit("2")
+    """
+
+    def __init__(self, max_idle=8, max_active=None):
+        if not isinstance(max_idle, int) or max_idle < 1:
+            raise AttributeError("max_idle must be a positive int")
+        if max_active is not None and (not isinstance(max_active, int) or max_active < 1):
+            raise AttributeError("max_active must be a positive int")
+        self.max_idle = max_idle
+        self.max_active = max_active
+        self.opened = 0
+        self.reused = 0
+        self._idle = {}
+        self._active = {}
+        self._condition = threading.Condition()
+
+    @staticmethod
+    def key(username, server, port, project=None):
+        return (username, str(server), str(port), project)
+
+    def connection(self, username, password, server, port, project=None):
+        """
+        Lease a client of the runtime, to be used in a with statement
+
+        Returns
+        -------
+        lease : <class 'esdm_pav_client.connections.Lease'>
+            Returns the lease, whose client attribute is the client
+
+        Raises
+        ------
+        RuntimeCallError
+            If a new client cannot connect to the runtime
+        """
+        key = self.key(username, server, port, project)
+        with self._condition:
+            while self.max_active is not None and self._active.get(key, 0) >= self.max_active:
+                self._condition.wait()
+            self._active[key] = self._active.get(key, 0) + 1
+            idle = self._idle.get(key)
+            client = idle.pop() if idle else None
+            if client is not None:
+                self.reused += 1
+        if client is None:
+            try:
+                client = self._connect(username, password, server, port, project)
+            except Exception:
+                with self._condition:
+                    self._active[key] -= 1
+                    self._condition.notify_all()
+                raise
+            with self._condition:
+                self.opened += 1
+        return Lease(self, key, client)
+
+    def release(self, lease, discard=False):
+        """
+        Return the client of a lease to the pool, or close it if discard is
+        True
+        """
+        with self._condition:
+            self._active[lease.key] -= 1
+            idle = self._idle.setdefault(lease.key, deque())
+            if not discard and len(idle) < self.max_idle:
+                idle.append(lease.client)
+            self._condition.notify_all()
+
+    def clear(self):
+        """
+        Close all the idle clients
+        """
+        with self._condition:
+            self._idle.clear()
+
+    def idle(self):
+        """
+        Return the number of idle clients
+        """
+        with self._condition:
+            return sum(len(v) for v in self._idle.values())
+
+    def _connect(self, username, password, server, port, project):
+        return connect(username, password, server, port, project)
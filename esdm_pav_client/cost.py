@@ -0,0 +1,335 @@
+import json
+import math
+
+
+class CostProfile:
+    """
+    Execution time model of an operator
+
+    The time of a task is serial + parallel / p + fragment * ceil(nfrag / p),
+    where p is the parallelism of the task: ncores * nthreads, bounded by the
+    number of fragments nfrag when it is known.
+
+    Parameters
+    ----------
+    serial : float, optional
+        seconds not reduced by parallelism
+    parallel : float, optional
+        seconds of work divided among the cores and threads
+    fragment : float, optional
+        seconds of overhead per fragment processed by a core or thread
+    """
+
+    def __init__(self, serial=1.0, parallel=0.0, fragment=0.0):
+        self.serial = float(serial)
+        self.parallel = float(parallel)
+        self.fragment = float(fragment)
+
+    def time(self, ncores=1, nthreads=1, nfrag=None):
+        """
+        Return the estimated execution time in seconds
+        """
+        p = max(1, ncores * nthreads)
+        if nfrag:
+            p = min(p, nfrag)
+        return self.serial + self.parallel / p + self.fragment * math.ceil((nfrag or 1) / p)
+
+    def to_dict(self):
+        return {"serial": self.serial, "parallel": self.parallel, "fragment": self.fragment}
+
+
+class Estimate:
+    """
+    Result of CostModel.estimate
+
+    Attributes
+    ----------
+    makespan : float
+        estimated execution time of the experiment in seconds
+    critical_path : list of str
+        names of the tasks on the longest path
+    peak_concurrency : int
+        peak number of task instances running at the same time
+    peak_cores : int
+        peak number of cores (ncores * nthreads) used at the same time
+    work : float
+        total execution time of all the task instances in seconds
+    """
+
+    def __init__(self, makespan, critical_path, peak_concurrency, peak_cores, work):
+        self.makespan = makespan
+        self.critical_path = critical_path
+        self.peak_concurrency = peak_concurrency
+        self.peak_cores = peak_cores
+        self.work = work
+
+    def __repr__(self):
+        return "<Estimate: makespan {0:.1f}s, peak concurrency {1}, critical path {2}>".format(
+            self.makespan, self.peak_concurrency, " -> ".join(self.critical_path)
+        )
+
+
+class CostModel:
+    """
+    Static cost model and makespan estimator of ESDM-PAV experiments
+
+    Each operator has a CostProfile, either given or fitted from measured
+    runtimes with record. Loops are accounted for with their values: the
+    iterations of a parallel loop (parallel=yes) run at the same time, those
+    of a sequential loop one after the other. Loops whose values are not
+    known count as a single iteration.
+
+    Construction::
+    m1 = CostModel(profiles={"oph_reduce": {"serial": 2, "parallel": 60}})
+
+    Parameters
+    ----------
+    profiles : dict, optional
+        operator -> CostProfile, dict of CostProfile arguments or seconds
+    default : <class 'esdm_pav_client.cost.CostProfile'>, optional
+        profile of the operators without a profile
+
+    Example
+    -------
+    m1 = CostModel()
+    m1.record("oph_reduce", 32.5, ncores=1)
+    m1.record("oph_reduce", 9.1, ncores=4)
+    estimate = m1.estimate(e1, "2000|2001")
+    settings = m1.suggest(e1, "2000|2001", deadline=600)
+    """
+
+    def __init__(self, profiles=None, default=None):
+        self.profiles = {}
+        self.default = default if default is not None else CostProfile()
+        self._samples = {}
+        for operator, profile in (profiles or {}).items():
+            if isinstance(profile, (int, float)):
+                profile = CostProfile(serial=profile)
+            elif isinstance(profile, dict):
+                profile = CostProfile(**profile)
+            self.profiles[operator] = profile
+
+    def record(self, operator, seconds, ncores=1, nthreads=1, nfrag=None):
+        """
+        Record a measured runtime of an operator and fit its profile again
+
+        Parameters
+        ----------
+        operator : str
+            operator name
+        seconds : float
+            measured execution time
+        ncores : int, optional
+            number of cores used
+        nthreads : int, optional
+            number of threads used
+        nfrag : int, optional
+            number of fragments of the input cube
+        """
+        p = max(1, ncores * nthreads)
+        if nfrag:
+            p = min(p, nfrag)
+        samples = self._samples.setdefault(operator, [])
+        samples.append((1.0 / p, float(seconds)))
+        self.profiles[operator] = self._fit(samples)
+
+    @staticmethod
+    def _fit(samples):
+        # least squares fit of seconds = serial + parallel * (1 / p)
+        n = len(samples)
+        mean_x = sum(x for x, _ in samples) / n
+        mean_y = sum(y for _, y in samples) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in samples)
+        if var_x == 0:
+            return CostProfile(serial=mean_y)
+        parallel = sum((x - mean_x) * (y - mean_y) for x, y in samples) / var_x
+        parallel = max(0.0, parallel)
+        serial = max(0.0, mean_y - parallel * mean_x)
+        return CostProfile(serial=serial, parallel=parallel)
+
+    def profile(self, operator):
+        return self.profiles.get(operator, self.default)
+
+    def save(self, filename):
+        """
+        Save the operator profiles as a JSON document
+        """
+        with open(filename, "w") as fp:
+            json.dump({k: p.to_dict() for k, p in self.profiles.items()}, fp, indent=4)
+
+    @staticmethod
+    def load(filename):
+        """
+        Load the operator profiles from a JSON document saved by save
+        """
+        with open(filename, "r") as f:
+            return CostModel(profiles=json.loads(f.read()))
+
+    def _task_times(self, experiment, graph, overrides):
+        try:
+            from dag import control_operator, task_arguments
+        except ImportError:
+            from .dag import control_operator, task_arguments
+
+        overrides = overrides or {}
+        times = [0.0] * len(graph)
+        cores = [1] * len(graph)
+        nfrags = [None] * len(graph)
+
+        def _int(value, default):
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return default
+
+        for i in graph.topological_order():
+            task = graph.tasks[i]
+            arguments = task_arguments(task)
+            nfrag = _int(overrides.get("nfrag", arguments.get("nfrag")), None)
+            if nfrag is None:
+                # the fragmentation follows the cubes along the dependencies
+                inherited = [nfrags[j] for j in graph.predecessors[i] if nfrags[j]]
+                nfrag = max(inherited) if inherited else None
+            nfrags[i] = nfrag
+            if control_operator(task) is not None or task.type == "control":
+                continue
+            ncores = _int(
+                overrides.get("ncores", arguments.get("ncores", experiment.__dict__.get("ncores"))),
+                1,
+            )
+            nthreads = _int(
+                overrides.get(
+                    "nthreads", arguments.get("nthreads", experiment.__dict__.get("nthreads"))
+                ),
+                1,
+            )
+            times[i] = self.profile(task.operator).time(ncores, nthreads, nfrag)
+            cores[i] = ncores * nthreads
+        return times, cores
+
+    def estimate(self, experiment, *args, overrides=None):
+        """
+        Estimate the execution of an experiment
+
+        Parameters
+        ----------
+        experiment : <class 'esdm_pav_client.experiment.Experiment'>
+            experiment to be estimated
+        args : list
+            list of arguments to be substituted in the loop values
+        overrides : dict, optional
+            ncores, nthreads and/or nfrag values replacing those of all the
+            tasks
+
+        Returns
+        -------
+        estimate : <class 'esdm_pav_client.cost.Estimate'>
+            Returns the makespan, critical path, peak concurrency and total
+            work
+        """
+        try:
+            from dag import control_operator, substitute_args, task_arguments
+        except ImportError:
+            from .dag import control_operator, substitute_args, task_arguments
+
+        graph = experiment.graph
+        times, cores = self._task_times(experiment, graph, overrides)
+        # repeat: serial iterations stretching the duration of a task;
+        # width: parallel iterations running at the same time
+        repeat = [1] * len(graph)
+        width = [1] * len(graph)
+        for opener, block in graph.blocks().items():
+            arguments = task_arguments(graph.tasks[opener])
+            if control_operator(graph.tasks[opener]) != "for":
+                continue
+            values = substitute_args(arguments.get("values", ""), args)
+            if not values or "$" in values or "@{" in values:
+                continue
+            n = len(values.split("|"))
+            parallel = arguments.get("parallel", "no").lower() == "yes"
+            for i in block["body"]:
+                if i == block["end"]:
+                    continue
+                if parallel:
+                    width[i] *= n
+                else:
+                    repeat[i] *= n
+
+        start = [0.0] * len(graph)
+        finish = [0.0] * len(graph)
+        previous = [None] * len(graph)
+        for i in graph.topological_order():
+            if graph.predecessors[i]:
+                previous[i] = max(graph.predecessors[i], key=lambda j: finish[j])
+                start[i] = finish[previous[i]]
+            finish[i] = start[i] + times[i] * repeat[i]
+        if not len(graph):
+            return Estimate(0.0, [], 0, 0, 0.0)
+        last = max(range(len(graph)), key=lambda i: finish[i])
+        path = [last]
+        while previous[path[-1]] is not None:
+            path.append(previous[path[-1]])
+        critical_path = [graph.names[i] for i in reversed(path)]
+
+        events = []
+        for i in range(len(graph)):
+            if times[i] > 0:
+                events.append((start[i], 1, width[i], width[i] * cores[i]))
+                events.append((finish[i], 0, -width[i], -width[i] * cores[i]))
+        running = running_cores = peak = peak_cores = 0
+        for _, _, n, c in sorted(events):
+            running += n
+            running_cores += c
+            peak = max(peak, running)
+            peak_cores = max(peak_cores, running_cores)
+        work = sum(times[i] * repeat[i] * width[i] for i in range(len(graph)))
+        return Estimate(finish[last], critical_path, peak, peak_cores, work)
+
+    def suggest(self, experiment, *args, deadline, max_cores=64, max_threads=16):
+        """
+        Suggest the ncores, nthreads and nfrag settings that meet a deadline
+        with the fewest cores and threads
+
+        Parameters
+        ----------
+        experiment : <class 'esdm_pav_client.experiment.Experiment'>
+            experiment to be estimated
+        args : list
+            list of arguments to be substituted in the loop values
+        deadline : float
+            maximum makespan in seconds
+        max_cores : int, optional
+            maximum ncores to be considered
+        max_threads : int, optional
+            maximum nthreads to be considered
+
+        Returns
+        -------
+        settings : dict
+            Returns ncores, nthreads, nfrag, the estimated makespan and
+            whether the deadline is met; if no setting meets the deadline,
+            the fastest one is returned
+        """
+        candidates = []
+        ncores = 1
+        while ncores <= max_cores:
+            nthreads = 1
+            while nthreads <= max_threads:
+                for factor in [1, 2, 4]:
+                    settings = {
+                        "ncores": ncores,
+                        "nthreads": nthreads,
+                        "nfrag": ncores * nthreads * factor,
+                    }
+                    estimate = self.estimate(experiment, *args, overrides=settings)
+                    candidates.append((settings, estimate.makespan))
+                nthreads *= 2
+            ncores *= 2
+        met = [c for c in candidates if c[1] <= deadline]
+        if met:
+            settings, makespan = min(
+                met, key=lambda c: (c[0]["ncores"] * c[0]["nthreads"], c[1], c[0]["nfrag"])
+            )
+        else:
+            settings, makespan = min(candidates, key=lambda c: c[1])
+        return dict(settings, makespan=makespan, deadline_met=bool(met))
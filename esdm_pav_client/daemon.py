@@ -0,0 +1,471 @@
+import io
+import json
+import os
+import threading
+import time
+
+
+def default_socket_path():
+    """
+    Return the path of the daemon socket: the ESDM_PAV_CLIENT_SOCKET
+    environment variable, or a per-user path in the temporary directory
+    """
+    import tempfile
+
+    path = os.environ.get("ESDM_PAV_CLIENT_SOCKET")
+    if path:
+        return path
+    uid = os.getuid() if hasattr(os, "getuid") else os.environ.get("USERNAME", "user")
+    return os.path.join(tempfile.gettempdir(), "esdm-pav-client-{0}.sock".format(uid))
+
+
+# options of the CLI taking a value (short ones by letter), and those whose
+# value is a local path, resolved by the caller as the daemon runs in /
+_short_values = "SPEiwpndfF"
+_value_options = [
+    "--server",
+    "--port",
+    "--endpoints",
+    "--id",
+    "--workflow",
+    "--checkpoint",
+    "--sweep",
+    "--concurrency",
+    "--rate",
+    "--max-instances",
+    "--max-size",
+    "--dir",
+    "--manifest",
+    "--frequency",
+    "--status",
+    "--since",
+    "--name",
+    "--limit",
+    "--db",
+    "--invalidate",
+    "--before",
+]
+_path_options = [
+    "-w",
+    "--workflow",
+    "-E",
+    "--endpoints",
+    "--sweep",
+    "-d",
+    "--dir",
+    "-f",
+    "--manifest",
+    "--db",
+]
+
+# environment variables changing the behaviour of the commands
+_environment_variables = [
+    "ESDM_PAV_CLIENT_HISTORY",
+    "ESDM_PAV_CLIENT_MEMO",
+    "ESDM_PAV_CLIENT_CATALOGUE",
+]
+
+
+def _path(value):
+    if value.startswith("="):
+        return "=" + _path(value[1:])
+    if not value:
+        return value
+    return os.path.abspath(os.path.expanduser(value))
+
+
+def _scan(argv):
+    # return the options given in a command line (clusters of short options
+    # split) and the command line with the path values made absolute, also in
+    # the -w=file, -wfile and --workflow=file forms
+    options = set()
+    arguments = []
+    pending = None
+    for n, a in enumerate(argv):
+        if pending is not None:
+            arguments.append(_path(a) if pending in _path_options else a)
+            pending = None
+            continue
+        if a == "--":
+            return options, arguments + list(argv[n:])
+        if a.startswith("--"):
+            option, equal, value = a.partition("=")
+            options.add(option)
+            if equal and option in _path_options:
+                a = option + "=" + _path(value)
+            elif not equal and option in _value_options:
+                pending = option
+        elif a.startswith("-") and len(a) > 1:
+            for i, c in enumerate(a[1:], 2):
+                options.add("-" + c)
+                if c in _short_values:
+                    if i == len(a):
+                        pending = "-" + c
+                    elif "-" + c in _path_options:
+                        a = a[:i] + _path(a[i:])
+                    break
+        arguments.append(a)
+    return options, arguments
+
+
+def local_only(argv):
+    """
+    Return True if the command line must run in the calling process: daemon
+    management commands and commands displaying the graph of a workflow
+    (-m/--monitor outside of the batch command, and -s/--sync_mode outside
+    of a sweep, which monitor the workflow visually), which is rendered on
+    the caller display
+    """
+    if argv[:1] == ["daemon"]:
+        return True
+    if argv[:1] in [["batch"], ["history"], ["memo"]]:
+        return False
+    options = _scan(argv)[0]
+    if options & {"-m", "--monitor"}:
+        return True
+    return bool(options & {"-s", "--sync_mode"}) and "--sweep" not in options
+
+
+def environment():
+    """
+    Return the environment the commands depend on: the home directory and the
+    ESDM_PAV_CLIENT_* paths, made absolute. A command is only run by a daemon
+    with the same environment
+    """
+    values = {"HOME": os.path.expanduser("~")}
+    for name in _environment_variables:
+        value = os.environ.get(name)
+        if value:
+            values[name] = value if value == ":memory:" else _path(value)
+    return values
+
+
+def _send(request, socket_path, timeout=None):
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(socket_path)
+        s.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        s.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return json.loads(b"".join(chunks).decode("utf-8"))
+
+
+def forward(argv, socket_path=None):
+    """
+    Run a command line of the client on the daemon, if it is running
+
+    Parameters
+    ----------
+    argv : list of str
+        arguments of the command line, without the program name
+    socket_path : str, optional
+        path of the daemon socket, default_socket_path() if None
+
+    Returns
+    -------
+    response : dict
+        Returns a dict with the output, error and exit_code of the command,
+        or None if the daemon is not running, runs with another environment
+        (see environment) or the command must run locally
+    """
+    if local_only(argv):
+        return None
+    import stat
+
+    socket_path = socket_path or default_socket_path()
+    try:
+        info = os.stat(socket_path)
+    except OSError:
+        return None
+    # the socket path is predictable: the command line, which may hold
+    # credentials, is only sent to a daemon of the same user
+    if not stat.S_ISSOCK(info.st_mode):
+        return None
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        return None
+    try:
+        response = _send({"argv": _scan(argv)[1], "environment": environment()}, socket_path)
+    except (OSError, ValueError):
+        return None
+    return None if response.get("local") else response
+
+
+def ping(socket_path=None, timeout=1):
+    """
+    Return the status of the daemon (pid, uptime, requests served), or None
+    if it is not running
+    """
+    try:
+        return _send({"command": "ping"}, socket_path or default_socket_path(), timeout)
+    except (OSError, ValueError):
+        return None
+
+
+def stop(socket_path=None, timeout=5):
+    """
+    Ask the daemon to exit
+
+    Returns
+    -------
+    stopped : bool
+        Returns False if the daemon was not running
+    """
+    try:
+        _send({"command": "shutdown"}, socket_path or default_socket_path(), timeout)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def spawn(socket_path=None, idle_timeout=None, wait=5):
+    """
+    Start the daemon in a detached process and wait until it answers
+
+    Returns
+    -------
+    status : dict
+        Returns the status of the daemon, None if it did not start in time
+    """
+    import subprocess
+    import sys
+
+    socket_path = socket_path or default_socket_path()
+    command = [sys.executable, "-m", "esdm_pav_client.daemon", "--socket", socket_path]
+    if idle_timeout:
+        command += ["--idle-timeout", str(idle_timeout)]
+    subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+        cwd="/",
+        env=dict(os.environ, **environment()),
+    )
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        status = ping(socket_path)
+        if status is not None:
+            return status
+        time.sleep(0.05)
+    return None
+
+
+class _ThreadStream(io.TextIOBase):
+    # stream writing to the buffer of the current thread, if any, so that
+    # concurrent commands capture their own output
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    @property
+    def encoding(self):
+        return "utf-8"
+
+    @property
+    def errors(self):
+        return "strict"
+
+    def _target(self):
+        return getattr(self.local, "buffer", None) or self.default
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def isatty(self):
+        return False
+
+
+def _install_streams():
+    import sys
+
+    for name in ["stdout", "stderr"]:
+        if not isinstance(getattr(sys, name), _ThreadStream):
+            setattr(sys, name, _ThreadStream(getattr(sys, name)))
+
+
+class ClientDaemon:
+    """
+    Long-lived local process running the commands of the client on behalf of
+    the CLI, over a Unix socket
+
+    The commands run in the daemon process, so that the imports, the pool of
+    runtime connections and the cache of the status responses are shared by
+    all the commands instead of being set up again by each invocation. The
+    CLI forwards its commands to the daemon when the socket exists, unless
+    the ESDM_PAV_CLIENT_NO_DAEMON environment variable is set.
+
+    The socket is only accessible by the user running the daemon.
+
+    Construction::
+    d1 = ClientDaemon(socket_path="/tmp/esdm-pav-client.sock")
+
+    Parameters
+    ----------
+    socket_path : str, optional
+        path of the Unix socket, default_socket_path() if None
+    idle_timeout : float, optional
+        seconds without requests after which the daemon exits, never if None
+
+    Example
+    -------
+    esdm-pav-client daemon start
+    esdm-pav-client -w experiment.json 1 2
+    esdm-pav-client daemon stop
+    """
+
+    def __init__(self, socket_path=None, idle_timeout=None):
+        self.socket_path = socket_path or default_socket_path()
+        self.idle_timeout = idle_timeout
+        self.started = None
+        self.requests = 0
+        self.last_request = time.monotonic()
+        self.environment = environment()
+        self._server = None
+        self._lock = threading.Lock()
+
+    def handle(self, request):
+        """
+        Serve a request: {"argv": [...], "environment": {...}} runs a
+        command line of the client, unless the environment of the caller is
+        not the one of the daemon ({"local": True} is returned, the caller
+        runs the command itself), {"command": "ping"} returns the daemon
+        status and {"command": "shutdown"} stops the daemon
+
+        Returns
+        -------
+        response : dict
+            Returns the response to be sent to the caller
+        """
+        with self._lock:
+            self.requests += 1
+            self.last_request = time.monotonic()
+        command = request.get("command")
+        if command == "ping":
+            return {
+                "pid": os.getpid(),
+                "uptime": time.time() - self.started if self.started else 0,
+                "requests": self.requests,
+                "socket": self.socket_path,
+            }
+        if command == "shutdown":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"stopping": True}
+        if request.get("environment", self.environment) != self.environment:
+            return {"local": True}
+        return self._run(request.get("argv", []))
+
+    def _run(self, argv):
+        import sys
+        import traceback
+
+        import click
+
+        try:
+            from cli.client import run
+        except ImportError:
+            from .cli.client import run
+
+        _install_streams()
+        output = io.StringIO()
+        error = io.StringIO()
+        sys.stdout.local.buffer = output
+        sys.stderr.local.buffer = error
+        exit_code = 0
+        try:
+            run.main(args=list(argv), prog_name="esdm-pav-client", standalone_mode=False)
+        except click.exceptions.Exit as e:
+            exit_code = e.exit_code
+        except click.ClickException as e:
+            e.show(file=error)
+            exit_code = e.exit_code
+        except click.exceptions.Abort:
+            error.write("Aborted!\n")
+            exit_code = 1
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            traceback.print_exc(file=error)
+            exit_code = 1
+        finally:
+            sys.stdout.local.buffer = None
+            sys.stderr.local.buffer = None
+        return {"output": output.getvalue(), "error": error.getvalue(), "exit_code": exit_code}
+
+    def serve_forever(self):
+        """
+        Serve the requests until shutdown is called or the idle timeout
+        expires
+
+        Raises
+        ------
+        AttributeError
+            If another daemon is already serving the socket
+        """
+        import socketserver
+
+        daemon = self
+
+        class _Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = json.loads(self.rfile.readline().decode("utf-8"))
+                    response = daemon.handle(request)
+                except ValueError as e:
+                    response = {"output": "", "error": str(e) + "\n", "exit_code": 1}
+                self.wfile.write(json.dumps(response).encode("utf-8"))
+
+        if os.path.exists(self.socket_path):
+            if ping(self.socket_path) is not None:
+                raise AttributeError("a daemon is already serving {0}".format(self.socket_path))
+            os.remove(self.socket_path)
+        _install_streams()
+        umask = os.umask(0o177)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, _Handler)
+        finally:
+            os.umask(umask)
+        self._server.daemon_threads = True
+        self.started = time.time()
+        if self.idle_timeout:
+            threading.Thread(target=self._watch_idle, daemon=True).start()
+        try:
+            self._server.serve_forever(poll_interval=0.1)
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def shutdown(self):
+        """
+        Stop serving the requests
+        """
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _watch_idle(self):
+        while self._server is not None:
+            time.sleep(min(1.0, self.idle_timeout))
+            if time.monotonic() - self.last_request > self.idle_timeout:
+                self.shutdown()
+                return
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ESDM-PAV client daemon")
+    parser.add_argument("--socket", default=None, help="path of the Unix socket")
+    parser.add_argument("--idle-timeout", type=float, default=None, help="idle seconds before exit")
+    options = parser.parse_args()
+    ClientDaemon(socket_path=options.socket, idle_timeout=options.idle_timeout).serve_forever()
@@ -0,0 +1,376 @@
+import re
+
+try:
+    from dependencies import edges
+except ImportError:
+    from .dependencies import edges
+
+
+def control_operator(task):
+    """
+    Return the flow control operator of the task (for, endfor, if, elseif,
+    else or endif), or None if the task is not a flow control task
+    """
+    operator = str(task.operator).lower()
+    if operator.startswith("oph_"):
+        operator = operator[4:]
+    if operator in ["for", "endfor", "if", "elseif", "else", "endif"]:
+        return operator
+    return None
+
+
+def task_arguments(task):
+    """
+    Return the arguments of the task as a dict
+    """
+    arguments = {}
+    for a in task.arguments:
+        k, _, v = a.partition("=")
+        arguments[k] = v
+    return arguments
+
+
+def substitute_args(value, args):
+    """
+    Replace the $N placeholders of value with the positional submission
+    arguments; placeholders without an argument are left untouched
+    """
+
+    def _replace(match):
+        i = int(match.group(1))
+        return str(args[i - 1]) if 0 < i <= len(args) else match.group(0)
+
+    return re.sub(r"\$(\d+)", _replace, value)
+
+
+class GraphView:
+    """
+    Dependency graph of a list of tasks
+
+    Tasks are identified by their position in the list. Predecessors and
+    successors are lists of task positions; the argument carried by each
+    edge is available through argument(predecessor, successor). The
+    topological order, the levels and the blocks are computed once, at the
+    first call; Experiment.graph caches the view of an experiment.
+
+    Parameters
+    ----------
+    tasks : list of <class 'esdm_pav_client.task.Task'>
+        tasks of the experiment
+
+    Example
+    -------
+    g = GraphView(e1.tasks)
+    for i in g.topological_order():
+        print(g.names[i], [g.names[j] for j in g.successors[i]])
+    """
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.names = [t.name for t in tasks]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.predecessors = [[] for _ in tasks]
+        self.successors = [[] for _ in tasks]
+        self.dangling = []
+        self._arguments = {}
+        for i, t in enumerate(tasks):
+            for name, argument in edges(t.dependencies):
+                j = self.index.get(name)
+                if j is None:
+                    self.dangling.append((i, name))
+                    continue
+                self.predecessors[i].append(j)
+                self.successors[j].append(i)
+                self._arguments[(j, i)] = argument
+        self._order = None
+        self._levels = None
+        self._blocks = None
+        self._enclosing = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def argument(self, predecessor, successor):
+        """
+        Return the argument set with the output of predecessor in successor,
+        or None for a pure ordering dependency
+        """
+        return self._arguments.get((predecessor, successor))
+
+    def topological_order(self):
+        """
+        Return the task positions in topological order, ties broken by the
+        position in the experiment
+
+        Raises
+        ------
+        AttributeError
+            If the dependencies contain a cycle
+        """
+        import heapq
+
+        if self._order is None:
+            indegree = [len(p) for p in self.predecessors]
+            ready = [i for i, n in enumerate(indegree) if n == 0]
+            heapq.heapify(ready)
+            order = []
+            while ready:
+                i = heapq.heappop(ready)
+                order.append(i)
+                for j in self.successors[i]:
+                    indegree[j] -= 1
+                    if indegree[j] == 0:
+                        heapq.heappush(ready, j)
+            if len(order) != len(self.names):
+                raise AttributeError("dependencies contain a cycle")
+            self._order = order
+        return self._order
+
+    def levels(self):
+        """
+        Return the level of each task: 0 for the tasks without dependencies,
+        one more than the highest level of their predecessors for the others
+
+        Raises
+        ------
+        AttributeError
+            If the dependencies contain a cycle
+        """
+        if self._levels is None:
+            levels = [0] * len(self.names)
+            for i in self.topological_order():
+                for j in self.predecessors[i]:
+                    levels[i] = max(levels[i], levels[j] + 1)
+            self._levels = levels
+        return self._levels
+
+    def components(self):
+        """
+        Return the weakly connected components of the graph, as sorted lists
+        of task positions
+        """
+        component = [None] * len(self.names)
+        components = []
+        for start in range(len(self.names)):
+            if component[start] is not None:
+                continue
+            component[start] = len(components)
+            members = [start]
+            stack = [start]
+            while stack:
+                i = stack.pop()
+                for j in self.predecessors[i] + self.successors[i]:
+                    if component[j] is None:
+                        component[j] = component[start]
+                        members.append(j)
+                        stack.append(j)
+            components.append(sorted(members))
+        return components
+
+    def descendants(self, i):
+        """
+        Return the set of the positions of the tasks depending, directly or
+        not, on task i
+        """
+        seen = set()
+        stack = [i]
+        while stack:
+            for j in self.successors[stack.pop()]:
+                if j not in seen:
+                    seen.add(j)
+                    stack.append(j)
+        return seen
+
+    def ancestors(self, i):
+        """
+        Return the set of the positions of the tasks task i depends on,
+        directly or not
+        """
+        seen = set()
+        stack = [i]
+        while stack:
+            for j in self.predecessors[stack.pop()]:
+                if j not in seen:
+                    seen.add(j)
+                    stack.append(j)
+        return seen
+
+    def blocks(self):
+        """
+        Match the for/endfor and if/endif flow control tasks
+
+        Returns
+        -------
+        blocks : dict
+            Returns a dict opener position -> {"end": closer position,
+            "parent": position of the enclosing opener or None, "body": sorted
+            positions of the tasks inside the block, closer included}
+        """
+        if self._blocks is not None:
+            return self._blocks
+        inside = [()] * len(self.names)
+        leaving = [()] * len(self.names)
+        blocks = {}
+        for i in self.topological_order():
+            stacks = [leaving[j] for j in self.predecessors[i]]
+            stack = max(stacks, key=len) if stacks else ()
+            operator = control_operator(self.tasks[i])
+            inside[i] = stack
+            if operator in ["for", "if"]:
+                blocks[i] = {"end": None, "parent": stack[-1] if stack else None, "body": []}
+                leaving[i] = stack + (i,)
+            elif operator in ["endfor", "endif"] and stack:
+                blocks[stack[-1]]["end"] = i
+                leaving[i] = stack[:-1]
+            else:
+                leaving[i] = stack
+        for i, stack in enumerate(inside):
+            for opener in stack:
+                blocks[opener]["body"].append(i)
+        self._blocks = blocks
+        self._enclosing = [stack[-1] if stack else None for stack in inside]
+        return blocks
+
+    def enclosing_block(self, i):
+        """
+        Return the position of the opener of the innermost block containing
+        task i, or None if the task is not inside a block
+        """
+        self.blocks()
+        return self._enclosing[i]
+
+
+def unroll(tasks, args=()):
+    """
+    Expand the for loops of a list of tasks into the task instances to be
+    executed
+
+    The tasks of a loop body are repeated for each of the loop values, with
+    the @{key} placeholders replaced by the value and the $N placeholders by
+    the positional arguments. The iterations of a sequential loop (parallel
+    other than yes) depend on the previous iteration. The instances of a
+    loop body are named after their task, followed by the iteration numbers
+    of the enclosing loops, e.g. "Reduce (2)" or "Reduce (2,1)".
+
+    Parameters
+    ----------
+    tasks : list of <class 'esdm_pav_client.task.Task'>
+        tasks of the experiment
+    args : list, optional
+        list of arguments to be substituted in the workflow
+
+    Returns
+    -------
+    instances : list of dict
+        Returns the instances in a topological order, as dicts with the keys
+        "name", "position" (of the task in tasks), "arguments" (dict of the
+        substituted arguments), "keys" (loop key -> value) and "dependencies"
+        (list of (instance position, argument) pairs)
+
+    Raises
+    ------
+    AttributeError
+        If the dependencies contain a cycle or if the values of a loop are
+        not known
+    """
+    return list(iter_unroll(tasks, args))
+
+
+def iter_unroll(tasks, args=(), unknown=None):
+    """
+    Lazy version of unroll: yield the task instances one by one, keeping
+    only the positions of the instances needed by the next ones
+
+    Parameters
+    ----------
+    tasks : list of <class 'esdm_pav_client.task.Task'>
+        tasks of the experiment
+    args : list, optional
+        list of arguments to be substituted in the workflow
+    unknown : list, optional
+        if given, the loops whose values are not known are appended to it (as
+        the position of their instance) and their body is expanded once,
+        instead of raising AttributeError
+
+    Returns
+    -------
+    instances : generator of dict
+        Returns the instances, see unroll
+    """
+    graph = GraphView(tasks)
+    blocks = graph.blocks()
+    children = {}
+    for i in graph.topological_order():
+        parent = graph.enclosing_block(i)
+        if parent is not None and blocks[parent]["end"] == i:
+            continue
+        children.setdefault(parent, []).append(i)
+    count = [0]
+
+    def _substitute(value, keys):
+        value = substitute_args(value, args)
+        for k, v in keys.items():
+            value = value.replace("@{" + k + "}", v)
+        return value
+
+    def _add(i, context, keys, path, after=()):
+        dependencies = [
+            (instance, graph.argument(j, i))
+            for j in graph.predecessors[i]
+            for instance in context[j]
+        ]
+        context[i] = [count[0]]
+        count[0] += 1
+        return {
+            "name": graph.names[i] + (" ({0})".format(",".join(path)) if path else ""),
+            "position": i,
+            "arguments": {k: _substitute(v, keys) for k, v in task_arguments(tasks[i]).items()},
+            "keys": dict(keys),
+            "dependencies": dependencies + list(after),
+        }
+
+    def _expand(opener, context, keys, path, after):
+        for i in children.get(opener, []):
+            chained = after if opener in graph.predecessors[i] else ()
+            instance = _add(i, context, keys, path, chained)
+            if i not in blocks:
+                yield instance
+                continue
+            block = blocks[i]
+            iterations = [(keys, path)]
+            parallel = True
+            if control_operator(tasks[i]) == "for":
+                arguments = instance["arguments"]
+                values = arguments.get("values", "")
+                parallel = arguments.get("parallel", "no").lower() == "yes"
+                if not values or re.search(r"\$\d|@\{", values):
+                    if unknown is None:
+                        raise AttributeError(
+                            "values of loop {0} are not known".format(graph.names[i])
+                        )
+                    unknown.append(context[i][0])
+                    values = "@{" + arguments.get("key", "") + "}"
+                iterations = (
+                    (dict(keys, **{arguments.get("key", ""): v}), path + [str(n + 1)])
+                    for n, v in enumerate(values.split("|"))
+                )
+            yield instance
+            merged = {}
+            previous = []
+            for iteration_keys, iteration_path in iterations:
+                iteration = dict(context)
+                yield from _expand(i, iteration, iteration_keys, iteration_path, previous)
+                for j in block["body"]:
+                    merged.setdefault(j, []).extend(iteration.get(j, []))
+                if not parallel and block["end"] is not None:
+                    previous = [
+                        (instance, None)
+                        for j in graph.predecessors[block["end"]]
+                        if j != i
+                        for instance in iteration.get(j, [])
+                    ]
+            context.update(merged)
+            if block["end"] is not None:
+                yield _add(block["end"], context, keys, path)
+
+    return _expand(None, {}, {}, [], ())
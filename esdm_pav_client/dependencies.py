@@ -0,0 +1,159 @@
+import sys
+from collections.abc import MutableSequence
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class DependencyList(MutableSequence):
+    """
+    Dependencies of a task, in the runtime format ({"task": name} or
+    {"task": name, "argument": argument} dicts) but stored compactly: a list
+    of task names and a list of arguments, both interned, so that thousands
+    of dependencies of a gather or merge task share the same strings instead
+    of being one dict each
+
+    Indexing or iterating returns new dicts: changing them does not change
+    the dependency, assign it back instead. Dependencies with other keys are
+    kept as they are, as dicts.
+
+    Parameters
+    ----------
+    dependencies : iterable of dict, optional
+        initial dependencies
+
+    Example
+    -------
+    d1 = DependencyList([{"task": "Import", "argument": "cube"}])
+    d1.extend_names(["Reduce 1", "Reduce 2"], "cubes")
+    for task, argument in d1.edges():
+        print(task, argument)
+    """
+
+    def __init__(self, dependencies=()):
+        self._tasks = []
+        self._arguments = []
+        self.extend(dependencies)
+
+    @staticmethod
+    def _pack(dependency):
+        if not isinstance(dependency, dict) or "task" not in dependency:
+            raise AttributeError("dependency must be a dict with a task key")
+        if len(dependency) == 1:
+            return _intern(dependency["task"]), None
+        if len(dependency) == 2 and "argument" in dependency:
+            return _intern(dependency["task"]), _intern(dependency["argument"])
+        return dict(dependency), None
+
+    @staticmethod
+    def _unpack(task, argument):
+        if type(task) is dict:
+            return task
+        if argument is None:
+            return {"task": task}
+        return {"argument": argument, "task": task}
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._unpack(t, a) for t, a in zip(self._tasks[index], self._arguments[index])]
+        return self._unpack(self._tasks[index], self._arguments[index])
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            packed = [self._pack(d) for d in value]
+            self._tasks[index] = [t for t, _ in packed]
+            self._arguments[index] = [a for _, a in packed]
+            return
+        self._tasks[index], self._arguments[index] = self._pack(value)
+
+    def __delitem__(self, index):
+        del self._tasks[index]
+        del self._arguments[index]
+
+    def insert(self, index, value):
+        task, argument = self._pack(value)
+        self._tasks.insert(index, task)
+        self._arguments.insert(index, argument)
+
+    def append(self, value):
+        task, argument = self._pack(value)
+        self._tasks.append(task)
+        self._arguments.append(argument)
+
+    def extend(self, values):
+        if isinstance(values, DependencyList):
+            self._tasks.extend(values._tasks)
+            self._arguments.extend(values._arguments)
+            return
+        # the append of each value, inlined for the documents with thousands
+        # of dependencies
+        tasks = self._tasks
+        arguments = self._arguments
+        intern = sys.intern
+        for value in values:
+            if type(value) is dict and "task" in value and type(value["task"]) is str:
+                if len(value) == 1:
+                    tasks.append(intern(value["task"]))
+                    arguments.append(None)
+                    continue
+                argument = value.get("argument")
+                if len(value) == 2 and type(argument) is str:
+                    tasks.append(intern(value["task"]))
+                    arguments.append(intern(argument))
+                    continue
+            task, argument = self._pack(value)
+            tasks.append(task)
+            arguments.append(argument)
+
+    def extend_names(self, names, argument=None):
+        """
+        Add a dependency on each of the tasks named in names, all with the
+        same argument, without building a dict for each of them
+
+        Parameters
+        ----------
+        names : iterable of str
+            names of the tasks
+        argument : str, optional
+            argument set with the output of the tasks, none if None or empty
+        """
+        names = [_intern(n) for n in names]
+        self._tasks.extend(names)
+        self._arguments.extend([_intern(argument) if argument else None] * len(names))
+
+    def edges(self):
+        """
+        Yield the (task name, argument) pair of each dependency, the argument
+        being None for a pure ordering dependency
+        """
+        for task, argument in zip(self._tasks, self._arguments):
+            if type(task) is dict:
+                yield task["task"], task.get("argument")
+            else:
+                yield task, argument
+
+    def clear(self):
+        self._tasks = []
+        self._arguments = []
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, tuple, DependencyList)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def edges(dependencies):
+    """
+    Yield the (task name, argument) pair of each dependency of a task,
+    whether stored in a DependencyList or in a list of dicts
+    """
+    if isinstance(dependencies, DependencyList):
+        return dependencies.edges()
+    return ((d["task"], d.get("argument")) for d in dependencies)
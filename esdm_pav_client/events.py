@@ -0,0 +1,251 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+_actions = ["continue", "abort"]
+
+
+class InputEvent:
+    """
+    Input sent with oph_input to a task of a running workflow waiting for it,
+    e.g. a wait task released by the arrival of new data
+
+    Attributes
+    ----------
+    workflow : <class 'esdm_pav_client.workflow.Workflow'>
+        workflow of the waiting task
+    task : str
+        name of the waiting task
+    action : str
+        "continue" to release the task, "abort" to stop it
+    inputs : dict
+        key -> value inputs set in the workflow, none if empty
+    acknowledged : bool
+        True once the runtime accepted the event
+    response : str
+        response of the runtime to the event, None if not delivered
+    error : str
+        reason of the failure of the delivery, None if none
+    """
+
+    def __init__(self, workflow, task, action="continue", inputs=None):
+        if workflow.workflow_id is None:
+            raise AttributeError("notify requires workflow_id")
+        if action not in _actions:
+            raise AttributeError("action must be continue or abort")
+        inputs = {str(k): str(v) for k, v in (inputs or {}).items()}
+        for text in [str(task)] + list(inputs) + list(inputs.values()):
+            if ";" in text or "|" in text:
+                raise AttributeError("invalid input {0}".format(text))
+        self.workflow = workflow
+        self.task = str(task)
+        self.action = action
+        self.inputs = inputs
+        self.acknowledged = False
+        self.response = None
+        self.error = None
+        # the runtime must not receive an event twice if its response is lost
+        self.idempotency_key = "oph_input:{0}".format(uuid.uuid4().hex)
+
+    def query(self):
+        """
+        Return the oph_input query of the event
+        """
+        query = "oph_input id={0};taskname={1};action={2};".format(
+            self.workflow.workflow_id, self.task, self.action
+        )
+        if self.inputs:
+            query += "key={0};value={1};".format(
+                "|".join(self.inputs.keys()), "|".join(self.inputs.values())
+            )
+        return query
+
+    def __repr__(self):
+        return "<InputEvent: {0} {1} {2}>".format(
+            self.workflow.workflow_id,
+            self.task,
+            "acknowledged" if self.acknowledged else (self.error or "pending"),
+        )
+
+
+class EventQueue:
+    """
+    Queue of input events for the waiting tasks of many workflows, delivered
+    in batches: the events of the same runtime and user are sent one after
+    the other on a leased client, several batches at the same time, instead
+    of opening a session per event
+
+    Events can be queued from several threads; each one records its
+    acknowledgement or the reason of its failure once delivered.
+
+    Construction::
+    q1 = EventQueue(concurrency=8, batch_size=100)
+
+    Parameters
+    ----------
+    connections : <class 'esdm_pav_client.connections.ConnectionPool'>, optional
+        pool of clients the events are sent on, a new one if None
+    concurrency : int, optional
+        maximum number of batches delivered at the same time
+    batch_size : int, optional
+        maximum number of events of a batch
+    resilience : <class 'esdm_pav_client.resilience.Resilience'>, optional
+        retry and circuit breaker settings, shared by all the workflows by
+        default
+
+    Raises
+    ------
+    AttributeError
+        If concurrency or batch_size is not a positive int
+
+    Example
+    -------
+    q1 = EventQueue()
+    for w in workflows:
+        q1.put(w, "Check ESDM data")
+    events = q1.flush()
+    print([e for e in events if not e.acknowledged])
+    """
+
+    def __init__(self, connections=None, concurrency=8, batch_size=100, resilience=None):
+        try:
+            from connections import ConnectionPool
+            from resilience import shared_resilience
+        except ImportError:
+            from .connections import ConnectionPool
+            from .resilience import shared_resilience
+
+        if not isinstance(concurrency, int) or concurrency < 1:
+            raise AttributeError("concurrency must be a positive int")
+        if not isinstance(batch_size, int) or batch_size < 1:
+            raise AttributeError("batch_size must be a positive int")
+        self.connections = (
+            connections if connections is not None else ConnectionPool(max_idle=concurrency)
+        )
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.resilience = resilience if resilience is not None else shared_resilience
+        self._events = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._events)
+
+    def put(self, workflow, task, inputs=None, action="continue"):
+        """
+        Queue an event for a waiting task of a running workflow
+
+        Parameters
+        ----------
+        workflow : <class 'esdm_pav_client.workflow.Workflow'>
+            running workflow
+        task : str
+            name of the waiting task
+        inputs : dict, optional
+            key -> value inputs set in the workflow
+        action : str, optional
+            "continue" to release the task, "abort" to stop it
+
+        Returns
+        -------
+        event : <class 'esdm_pav_client.events.InputEvent'>
+            Returns the queued event
+
+        Raises
+        ------
+        AttributeError
+            If the workflow was not submitted or the event is not valid
+        """
+        event = InputEvent(workflow, task, action, inputs)
+        with self._lock:
+            self._events.append(event)
+        return event
+
+    def flush(self):
+        """
+        Deliver the queued events; a failure is recorded in the event and
+        does not stop the delivery of the others
+
+        Returns
+        -------
+        events : list of <class 'esdm_pav_client.events.InputEvent'>
+            Returns the delivered events, in the order they were queued
+        """
+        with self._lock:
+            events, self._events = self._events, []
+        groups = {}
+        for event in events:
+            w = event.workflow
+            key = (w.username, w.password, str(w.server), str(w.port), w.project)
+            groups.setdefault(key, []).append(event)
+        batches = [
+            (key, group[start : start + self.batch_size])
+            for key, group in groups.items()
+            for start in range(0, len(group), self.batch_size)
+        ]
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(lambda b: self._deliver(*b), batches))
+        return events
+
+    def _deliver(self, key, events):
+        try:
+            from resilience import classify_error
+        except ImportError:
+            from .resilience import classify_error
+
+        username, password, server, port, project = key
+        endpoint = "{0}:{1}".format(server, port)
+        lease = None
+
+        def _attempt(event):
+            nonlocal lease
+            if lease is None:
+                lease = self.connections.connection(username, password, server, port, project)
+            try:
+                return send(lease.client, event.query(), endpoint)
+            except Exception as e:
+                # a client whose call was answered, even with an error, is kept
+                if classify_error(e)[0]:
+                    self.connections.release(lease, discard=True)
+                    lease = None
+                raise
+
+        try:
+            for event in events:
+                try:
+                    event.response = self.resilience.call(
+                        endpoint,
+                        "oph_input",
+                        lambda: _attempt(event),
+                        idempotency_key=event.idempotency_key,
+                    )
+                    event.acknowledged = True
+                except Exception as e:
+                    event.error = str(e) or e.__class__.__name__
+        finally:
+            if lease is not None:
+                self.connections.release(lease)
+
+
+def send(client, query, endpoint):
+    """
+    Submit a query with a PyOphidia client and return its response
+
+    Raises
+    ------
+    RuntimeCallError
+        If the runtime did not answer or rejected the query
+    """
+    try:
+        from resilience import RuntimeCallError
+    except ImportError:
+        from .resilience import RuntimeCallError
+
+    client.submit(query)
+    if client.last_return_value != 0 or not client.last_response:
+        raise RuntimeCallError(
+            "{0} failed on the runtime {1}".format(query.split()[0], endpoint),
+            transient=not client.last_response,
+        )
+    return client.last_response
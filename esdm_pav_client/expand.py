@@ -0,0 +1,153 @@
+import json
+from array import array
+
+try:
+    from dag import control_operator, iter_unroll
+except ImportError:
+    from .dag import control_operator, iter_unroll
+
+
+class ExpansionReport:
+    """
+    Size of an experiment once its loops are expanded, see
+    Experiment.expand
+
+    Attributes
+    ----------
+    instances : int
+        number of task instances
+    loops : dict
+        loop task name -> number of iterations, over all the instances of
+        the loop
+    unknown : list of str
+        names of the loops whose values are only known at runtime; their
+        body is counted once
+    document_size : int
+        estimated size in bytes of the runtime document with the loops
+        expanded
+    complete : bool
+        False if the expansion was stopped at a limit
+    """
+
+    def __init__(self):
+        self.instances = 0
+        self.loops = {}
+        self.unknown = []
+        self.document_size = 0
+        self.complete = True
+
+    def __str__(self):
+        lines = [
+            "{0}{1} task instances, {2}{3} bytes".format(
+                "" if self.complete else "at least ",
+                self.instances,
+                "" if self.complete else "at least ",
+                self.document_size,
+            )
+        ]
+        for name, iterations in self.loops.items():
+            lines.append(
+                "loop {0}: {1}".format(
+                    name, "unknown values" if name in self.unknown else iterations
+                )
+            )
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return "<ExpansionReport: {0} task instances>".format(self.instances)
+
+
+class ExpansionLimitError(AttributeError):
+    """
+    Raised when the expansion of an experiment exceeds a limit; the report
+    attribute tells the size reached when the expansion was stopped
+    """
+
+    def __init__(self, report, limit):
+        super().__init__("the expanded experiment exceeds {0}:\n{1}".format(limit, str(report)))
+        self.report = report
+
+
+class Expansion:
+    """
+    Lazy expansion of the loops of an experiment, see Experiment.expand
+
+    Iterating over it yields the task instances (see
+    esdm_pav_client.dag.unroll) one by one, without building the list.
+    """
+
+    def __init__(self, experiment, args=()):
+        self.experiment = experiment
+        self.args = list(args)
+
+    def __iter__(self):
+        return iter_unroll(self.experiment.tasks, self.args)
+
+    def report(self, max_instances=None, max_size=None):
+        """
+        Count the task instances and estimate the size of the runtime document
+        with the loops expanded; the loops whose values are only known at
+        runtime are reported in unknown and their body is counted once
+
+        The size is the length of the PAV document with one task per instance,
+        named and with the arguments and dependencies substituted as by the
+        runtime.
+
+        Parameters
+        ----------
+        max_instances : int, optional
+            maximum number of task instances
+        max_size : int, optional
+            maximum size of the runtime document, in bytes
+
+        Returns
+        -------
+        report : <class 'esdm_pav_client.expand.ExpansionReport'>
+            Returns the report of the whole expansion
+
+        Raises
+        ------
+        ExpansionLimitError
+            As soon as one of the limits is exceeded, without expanding the
+            rest of the experiment
+        """
+        document = self.experiment.wokrflow_to_json()
+        static = [
+            {k: v for k, v in t.items() if k not in ["name", "arguments", "dependencies"]}
+            for t in document.pop("tasks", [])
+        ]
+        document["tasks"] = []
+        report = ExpansionReport()
+        report.document_size = len(json.dumps(document))
+        unknown = []
+        name_sizes = array("L")
+        tasks = self.experiment.tasks
+        for instance in iter_unroll(tasks, self.args, unknown):
+            i = instance["position"]
+            entry = dict(static[i])
+            entry["name"] = instance["name"]
+            entry["arguments"] = ["{0}={1}".format(k, v) for k, v in instance["arguments"].items()]
+            entry["dependencies"] = []
+            size = len(json.dumps(entry))
+            # {"task": "<name>"} or {"task": "<name>", "argument": "<argument>"}
+            for n, (j, argument) in enumerate(instance["dependencies"]):
+                size += (2 if n else 0) + 12 + name_sizes[j]
+                if argument is not None:
+                    size += 16 + len(json.dumps(argument)) - 2
+            name_sizes.append(len(json.dumps(instance["name"])) - 2)
+            report.document_size += size + (2 if report.instances else 0)
+            report.instances += 1
+            if control_operator(tasks[i]) == "for":
+                iterations = len(instance["arguments"].get("values", "").split("|"))
+                if unknown and unknown[-1] == report.instances - 1:
+                    iterations = 1
+                    if tasks[i].name not in report.unknown:
+                        report.unknown.append(tasks[i].name)
+                report.loops[tasks[i].name] = report.loops.get(tasks[i].name, 0) + iterations
+            if max_instances is not None and report.instances > max_instances:
+                report.complete = False
+                raise ExpansionLimitError(report, "{0} task instances".format(max_instances))
+            if max_size is not None and report.document_size > max_size:
+                report.complete = False
+                raise ExpansionLimitError(report, "{0} bytes".format(max_size))
+        return report
@@ -41,21 +41,24 @@ class Experiment:
         "ncores",
         "host_partition",
     ]
-    active_attributes = ["name", "author", "abstract"]
+    active_attributes = ("name", "author", "abstract")
     task_attributes = ["run", "on_error", "on_exit", "type"]
-    task_name_counter = 1
-    subexperiment_names = []
 
     def __init__(self, name, author=None, abstract=None, **kwargs):
         for k in kwargs.keys():
             if k not in self.attributes:
                 raise AttributeError("Unknown experiment argument: {0}".format(k))
-            self.active_attributes.append(k)
+        # per-instance, so that long-running services creating many
+        # experiments do not grow any state of the class
+        self._active_attributes = list(self.active_attributes) + list(kwargs.keys())
+        self.task_name_counter = 1
         self.name = name
         self.author = author
         self.abstract = abstract
         self.exec_mode = "sync"
         self.tasks = []
+        self._graph = None
+        self._bulk = None
         self.__dict__.update(kwargs)
 
     @staticmethod
@@ -85,12 +88,56 @@ class Experiment:
         new_experiment = {
             k: dict(self.__dict__)[k]
             for k in dict(self.__dict__).keys()
-            if k not in non_experiment_fields
+            if k not in non_experiment_fields and not k.startswith("_")
         }
         if "tasks" in new_experiment.keys():
-            new_experiment["tasks"] = [t.__dict__ for t in new_experiment["tasks"]]
+            new_experiment["tasks"] = [
+                {
+                    k: list(v) if k == "dependencies" else v
+                    for k, v in t.__dict__.items()
+                    if not k.startswith("_")
+                }
+                for t in new_experiment["tasks"]
+            ]
         return new_experiment
 
+    @property
+    def graph(self):
+        """
+        Dependency graph of the tasks, built at the first access and cached
+        until the experiment or its tasks are changed through their methods
+
+        Call invalidate after changing the list of tasks or the dependencies
+        of a task directly.
+
+        Returns
+        -------
+        graph : <class 'esdm_pav_client.dag.GraphView'>
+            Returns the graph, whose task ids are the positions in tasks
+
+        Example
+        -------
+        g = e1.graph
+        for i in g.topological_order():
+            print(g.names[i], g.levels()[i], [g.names[j] for j in g.successors[i]])
+        """
+        try:
+            from dag import GraphView
+        except ImportError:
+            from .dag import GraphView
+
+        graph = self.__dict__.get("_graph")
+        if graph is None or graph.tasks is not self.tasks or len(graph) != len(self.tasks):
+            graph = GraphView(self.tasks)
+            self._graph = graph
+        return graph
+
+    def invalidate(self):
+        """
+        Drop the cached graph of the experiment, see graph
+        """
+        self._graph = None
+
     def __repr__(self):
         return self.workflow_to_json()
 
@@ -98,7 +145,7 @@ class Experiment:
         """
         Reverse the initialization of the object
         """
-        for k in self.active_attributes:
+        for k in self._active_attributes:
             self.__delattr__(k)
 
     def addTask(self, task):
@@ -114,7 +161,8 @@ class Experiment:
         ------
         AttributeError
             If the task name is already in the experiment or if a dependency is
-            not fulfilled
+            not fulfilled (checked at the end of the bulk build instead, in
+            bulk mode)
 
         Example
         -------
@@ -122,16 +170,99 @@ class Experiment:
                     arguments={'operation': 'avg'})
         e1.addTask(t1)
         """
+        bulk = self.__dict__.get("_bulk")
+        if bulk is not None:
+            with bulk.lock:
+                if "name" not in task.__dict__.keys() or task.name is None:
+                    task.name = self.name + "_{0}".format(self.task_name_counter)
+                self.task_name_counter += 1
+                self.tasks.append(task)
+            task._experiment = self
+            return
         if "name" not in task.__dict__.keys() or task.name is None:
             task.name = self.name + "_{0}".format(self.task_name_counter)
         if task.__dict__["name"] in [t.__dict__["name"] for t in self.tasks]:
             raise AttributeError("task already exists")
         if task.__dict__["dependencies"]:
-            for dependency in task.__dict__["dependencies"]:
-                if dependency["task"] not in [task.__dict__["name"] for task in self.tasks]:
+            try:
+                from dependencies import edges
+            except ImportError:
+                from .dependencies import edges
+
+            names = set(t.__dict__["name"] for t in self.tasks)
+            for name, _ in edges(task.__dict__["dependencies"]):
+                if name not in names:
                     raise AttributeError("dependency not fulfilled")
         self.task_name_counter += 1
         self.tasks.append(task)
+        task._experiment = self
+        self.invalidate()
+
+    def bulk(self, strict=True):
+        """
+        Build mode accepting the tasks in any order, from several threads,
+        without the checks of addTask on each insertion; the tasks are
+        validated at once at the end of the with block (duplicate names,
+        dependencies on unknown tasks, dependency cycles) and, if valid,
+        sorted so that each task follows the tasks it depends on
+
+        Parameters
+        ----------
+        strict : bool, optional
+            True to raise ExperimentValidationError at the end of the block if
+            the tasks are not valid, False to only fill the report
+
+        Returns
+        -------
+        bulk : <class 'esdm_pav_client.validation.BulkBuild'>
+            Returns the context manager, whose with statement gives the
+            <class 'esdm_pav_client.validation.ValidationReport'> filled at the
+            end of the block
+
+        Raises
+        ------
+        ExperimentValidationError
+            Raises ExperimentValidationError (an AttributeError) listing all
+            the errors if strict is True and the tasks are not valid
+
+        Example
+        -------
+        with e1.bulk() as report:
+            t2 = e1.newTask(name="Reduce", operator="oph_reduce",
+                            arguments={'operation': 'avg'})
+            t1 = e1.newTask(name="Import", operator="oph_importnc",
+                            arguments={'input': '$1'})
+            t2.addDependency(t1, "cube")
+        """
+        try:
+            from validation import BulkBuild
+        except ImportError:
+            from .validation import BulkBuild
+
+        return BulkBuild(self, strict=strict)
+
+    def validate(self):
+        """
+        Check the tasks of the ESDM-PAV experiment: duplicate names,
+        dependencies on unknown tasks and dependency cycles
+
+        Returns
+        -------
+        report : <class 'esdm_pav_client.validation.ValidationReport'>
+            Returns the report listing all the errors
+
+        Example
+        -------
+        report = e1.validate()
+        if not report.valid:
+            print(report)
+        """
+        try:
+            from validation import validate_tasks
+        except ImportError:
+            from .validation import validate_tasks
+
+        return validate_tasks(self.tasks)[0]
 
     def getTask(self, taskname):
         """
@@ -162,15 +293,25 @@ class Experiment:
         elif len(tasks) == 0:
             return None
 
-    def save(self, experimentname):
+    def save(self, experimentname, shards=None):
         """
         Save the ESDM-PAV experiment as a JSON document
 
+        With shards, the experiment is saved as a manifest (the experiment
+        attributes and the file and hash of each shard) plus that number of
+        files with consecutive chunks of the tasks, named after the manifest
+        (sample_experiment.0.json, ...). Experiment.load parses the shards in
+        parallel; the PAV document sent to the runtime is still assembled by
+        Workflow.submit.
+
         Parameters
         ----------
         experimentname : str
             The path to the PAV document file where the experiment is being
             saved
+        shards : int, optional
+            number of files the tasks are split into, a single PAV document
+            if None
 
         Example
         -------
@@ -178,22 +319,34 @@ class Experiment:
         e1 = experiment(name="sample name", author="sample author",
                         abstract="sample abstract")
         e1.save("sample_experiment")
+        e1.save("large_experiment", shards=32)
 
         Raises
         ------
         AttributeError
-            If worfklowname is not a string or it is empty
+            If worfklowname is not a string or it is empty, or if shards is
+            not a positive int
         """
         import json
         import os
 
+        try:
+            from shards import save_shards
+        except ImportError:
+            from .shards import save_shards
+
         if not isinstance(experimentname, str):
             raise AttributeError("experimentname must be string")
         if len(experimentname) == 0:
             raise AttributeError("experimentname must contain more than 1 characters")
+        if shards is not None and (not isinstance(shards, int) or shards < 1):
+            raise AttributeError("shards must be a positive int")
         data = self.wokrflow_to_json()
         if not experimentname.endswith(".json"):
             experimentname += ".json"
+        if shards is not None:
+            save_shards(data, os.path.join(os.getcwd(), experimentname), shards)
+            return
         with open(os.path.join(os.getcwd(), experimentname), "w") as fp:
             json.dump(data, fp, indent=4)
 
@@ -379,17 +532,26 @@ class Experiment:
             new_arguments = check_replace_args(params, task.reverted_arguments())
             task.arguments = new_arguments
             self.tasks.append(task)
+            task._experiment = self
+        self.invalidate()
         return copied_experiment.tasks[-1]
 
     @staticmethod
-    def load(file):
+    def load(file, processes=None):
         """
         Load a ESDM-PAV experiment from the JSON document
 
+        The manifest of an experiment saved in shards (see save) can be given
+        as well: the shards are then parsed in parallel by a process pool and
+        checked against their hashes.
+
         Parameters
         ----------
         file : str
             The path/name of the PAV document file to be loaded
+        processes : int, optional
+            maximum number of processes parsing the shards, the number of CPUs
+            if None
 
         Returns
         -------
@@ -399,15 +561,25 @@ class Experiment:
         Raises
         ------
         IOError
-            Raises IOError if the file does not exist
+            Raises IOError if the file or one of its shards does not exist
         JSONDecodeError
             Raises JSONDecodeError if the file does not containt a valid JSON
             structure
+        ValueError
+            Raises ValueError if a shard does not match the hash in the
+            manifest
 
         Example
         -------
         e1 = Experiment.load("json_file.json")
+        e2 = Experiment.load("large_experiment.json", processes=32)
         """
+        import os
+
+        try:
+            from shards import load_shards
+        except ImportError:
+            from .shards import load_shards
 
         def file_check(filename):
             import os
@@ -422,38 +594,287 @@ class Experiment:
                 except json.decoder.JSONDecodeError:
                     raise ValueError("File is not a valid JSON")
 
-        def check_experiment_name(data):
-            if "name" not in data.keys():
-                raise AttributeError("experiment doesn't have a key")
-
-        def start_experiment(data):
-            try:
-                from task import Task
-            except ImportError:
-                from .task import Task
-
-            experiment = Experiment(name=data["name"])
-            del data["name"]
-            attrs = {k: data[k] for k in data if k != "name" and k != "tasks"}
-            experiment.__dict__.update(attrs)
-            for d in data["tasks"]:
-                new_task = Task(
-                    operator=d["operator"],
-                    name=d["name"],
-                    arguments={a.split("=")[0]: a.split("=", 1)[1] for a in d["arguments"]},
-                )
-                new_task.__dict__.update(
-                    {k: d[k] for k in d if k != "name" and k != "operator" and k != "arguments"}
-                )
-                experiment.addTask(new_task)
-            return experiment
-
         data = file_check(file)
-        check_experiment_name(data)
-        experiment = start_experiment(data)
+        if "task_shards" in data:
+            return load_shards(data, os.path.dirname(os.path.abspath(file)), processes)
+        return Experiment._from_dict(data)
+
+    @staticmethod
+    def _from_dict(data):
+        """
+        Build an experiment from the dict of a PAV document, as loaded from
+        JSON or returned by Workflow.workflow_to_json
+        """
+        if "name" not in data.keys():
+            raise AttributeError("experiment doesn't have a key")
+        experiment = Experiment(name=data["name"])
+        attrs = {k: data[k] for k in data if k != "name" and k != "tasks"}
+        experiment.__dict__.update(attrs)
+        for new_task in Experiment._tasks_from_dicts(data["tasks"]):
+            experiment.addTask(new_task)
         return experiment
 
-    def check(self, filename="sample.dot", visual=True):
+    @staticmethod
+    def _tasks_from_dicts(tasks):
+        """
+        Build the tasks from their dicts in a PAV document
+        """
+        return Experiment._tasks_from_columns(Experiment._task_columns(tasks))
+
+    @staticmethod
+    def _task_columns(tasks):
+        """
+        Return the attributes of the tasks from their dicts in a PAV
+        document, as lists of plain values (the dependencies packed as in
+        DependencyList), which _tasks_from_columns turns into tasks without
+        any further parsing
+        """
+        try:
+            from dependencies import DependencyList
+        except ImportError:
+            from .dependencies import DependencyList
+
+        names = []
+        operators = []
+        types = []
+        arguments = []
+        dependencies = []
+        extras = []
+        for d in tasks:
+            names.append(d["name"])
+            operators.append(d["operator"])
+            types.append(d.get("type", "ophidia"))
+            # the arguments are split and joined again only if needed to
+            # drop the duplicates (and fail on an argument without a value)
+            task_arguments = d["arguments"]
+            if len({a.partition("=")[0] for a in task_arguments if "=" in a}) != len(
+                task_arguments
+            ):
+                task_arguments = {a.split("=")[0]: a.split("=", 1)[1] for a in task_arguments}
+                task_arguments = ["{0}={1}".format(k, v) for k, v in task_arguments.items()]
+            arguments.append(list(task_arguments))
+            packed = DependencyList(d.get("dependencies", ()))
+            dependencies.append((packed._tasks, packed._arguments))
+            extra = [
+                (k, d[k])
+                for k in d
+                if k not in ("name", "operator", "type", "arguments", "dependencies")
+            ]
+            extras.append(extra or None)
+        return names, operators, types, arguments, dependencies, extras
+
+    @staticmethod
+    def _tasks_from_columns(columns):
+        """
+        Build the tasks from the columns returned by _task_columns
+        """
+        try:
+            from task import Task
+            from dependencies import DependencyList
+        except ImportError:
+            from .task import Task
+            from .dependencies import DependencyList
+
+        new_tasks = []
+        new_task = Task.__new__
+        new_dependencies = DependencyList.__new__
+        for name, operator, type, arguments, (tasks, edges), extra in zip(*columns):
+            dependencies = new_dependencies(DependencyList)
+            dependencies._tasks = tasks
+            dependencies._arguments = edges
+            # the attributes Task() would set, in the same order
+            task = new_task(Task)
+            task.__dict__ = {
+                "type": type,
+                "name": name,
+                "operator": operator,
+                "arguments": arguments,
+                "dependencies": dependencies,
+            }
+            if extra:
+                task.__dict__.update(extra)
+            new_tasks.append(task)
+        return new_tasks
+
+    def optimize(self, reduce=True, fuse=True, eliminate=True):
+        """
+        Optimize the ESDM-PAV experiment without changing its results
+
+        The following passes are run in order:
+
+        - reduce: removes the ordering dependencies (without argument)
+          already implied by other dependencies (transitive reduction)
+        - fuse: merges chains of composable Ophidia operators into a single
+          task, e.g. two oph_apply in a row are replaced by one oph_apply
+          with the composed query
+        - eliminate: removes the tasks of pure operators (e.g. oph_reduce)
+          whose output cube is deleted at exit (on_exit=oph_delete) without
+          being used by any other task
+
+        Parameters
+        ----------
+        reduce : bool, optional
+            run the transitive reduction of the dependencies
+        fuse : bool, optional
+            run the operator fusion
+        eliminate : bool, optional
+            run the dead task elimination
+
+        Returns
+        -------
+        report : <class 'esdm_pav_client.optimizer.OptimizationReport'>
+            Returns the report of the changes
+
+        Raises
+        ------
+        AttributeError
+            If the dependencies contain a cycle
+
+        Example
+        -------
+        report = e1.optimize()
+        print(report)
+        """
+        try:
+            from optimizer import (
+                OptimizationReport,
+                eliminate_dead_tasks,
+                fuse_operators,
+                transitive_reduction,
+            )
+        except ImportError:
+            from .optimizer import (
+                OptimizationReport,
+                eliminate_dead_tasks,
+                fuse_operators,
+                transitive_reduction,
+            )
+
+        report = OptimizationReport()
+        if reduce:
+            transitive_reduction(self.tasks, report)
+        if fuse:
+            fuse_operators(self.tasks, report)
+        if eliminate:
+            eliminate_dead_tasks(self.tasks, report)
+        self.invalidate()
+        return report
+
+    def cleanup(self, keep=None, args=()):
+        """
+        Delete the intermediate cubes of the ESDM-PAV experiment as soon as
+        they are no longer needed, to reduce the runtime memory usage
+
+        Each task whose output cube is only used as input by other Ophidia
+        tasks gets on_exit=oph_delete. Cubes that are exported, gathered by
+        flow control tasks (e.g. endfor), used by non-Ophidia tasks, listed in
+        keep or whose task already defines on_exit are left untouched.
+
+        Parameters
+        ----------
+        keep : list of str, optional
+            names of the tasks whose output cube must be kept
+        args : list, optional
+            list of arguments to be substituted in the loop values, used to
+            estimate the number of live cubes
+
+        Returns
+        -------
+        report : <class 'esdm_pav_client.cleanup.CleanupReport'>
+            Returns the released and exempted cubes and the estimated peak
+            number of live cubes before and after the cleanup
+
+        Example
+        -------
+        report = e1.cleanup(keep=["Import"])
+        print(report)
+        """
+        try:
+            from cleanup import release_intermediate_cubes
+        except ImportError:
+            from .cleanup import release_intermediate_cubes
+
+        return release_intermediate_cubes(self, keep=keep, args=args)
+
+    def memoize(self, store, args=()):
+        """
+        Reuse the outputs exported by completed workflows: each task whose
+        output cube was exported (e.g. by oph_exportesdm) by a workflow
+        recorded in the memo store is replaced by the import of that output,
+        and the tasks only needed to compute it are removed
+
+        Tasks are matched by a hash of their operator, their arguments and
+        the hashes of the tasks they depend on, see
+        esdm_pav_client.memo.task_hashes.
+
+        Parameters
+        ----------
+        store : <class 'esdm_pav_client.memo.MemoStore'>
+            store of the exported outputs
+        args : list, optional
+            list of arguments to be substituted in the workflow
+
+        Returns
+        -------
+        report : <class 'esdm_pav_client.memo.MemoReport'>
+            Returns the replaced and removed tasks
+
+        Raises
+        ------
+        AttributeError
+            If the dependencies contain a cycle
+
+        Example
+        -------
+        report = e1.memoize(MemoStore(), args=["input.nc"])
+        print(report)
+        """
+        try:
+            from memo import rewrite
+        except ImportError:
+            from .memo import rewrite
+
+        report = rewrite(self, store, args=args)
+        self.invalidate()
+        return report
+
+    def expand(self, args=()):
+        """
+        Preview the task instances the runtime will create from the
+        experiment: the $N placeholders are replaced by the arguments and
+        the for loops (nested ones as well) are unrolled over their values
+
+        The expansion is lazy: iterating over it yields the instances one by
+        one (see esdm_pav_client.dag.unroll), while its report method counts
+        them, with the iterations of each loop and the estimated size of the
+        runtime document, and can stop at a limit. See also the
+        max_instances and max_document_size attributes of Workflow.
+
+        Parameters
+        ----------
+        args : list, optional
+            list of arguments to be substituted in the workflow
+
+        Returns
+        -------
+        expansion : <class 'esdm_pav_client.expand.Expansion'>
+            Returns the expansion of the experiment
+
+        Example
+        -------
+        x1 = e1.expand(args=["input.nc", "1|2|3"])
+        print(x1.report(max_instances=10000))
+        for instance in x1:
+            print(instance["name"], instance["arguments"])
+        """
+        try:
+            from expand import Expansion
+        except ImportError:
+            from .expand import Expansion
+
+        return Expansion(self, args)
+
+    def check(self, filename="sample.dot", visual=True, catalogue=None):
         """
         Check the ESDM-PAV experiment definition validity and display the
         graph of the experiment structure
@@ -462,6 +883,11 @@ class Experiment:
         ----------
         filename  : str, optional
             The name of the file that will contain the diagram
+        visual : bool, optional
+            False to only return the validity of the experiment
+        catalogue : <class 'esdm_pav_client.catalogue.OperatorCatalogue'>, optional
+            catalogue the operators and arguments of the tasks are checked
+            against locally, in place of the validation by the runtime
 
         Returns
         -------
@@ -480,39 +906,28 @@ class Experiment:
         def _trim_text(text):
             return text[:7] + "..." if len(text) > 10 else text
 
-        def _find_subgraphs(tasks):
-            list_of_operators = [t.operator for t in tasks]
-            subgraphs_list = [
-                {"start_index": start_index, "operator": "if"}
-                for start_index in [i for i, t in enumerate(list_of_operators) if t == "if"]
-            ]
-            subgraphs_list += [
-                {"start_index": start_index, "operator": "for"}
-                for start_index in [i for i, t in enumerate(list_of_operators) if t == "for"]
-            ]
-            subgraphs_list = sorted(subgraphs_list, key=lambda i: i["start_index"])
-            closing_indexes = sorted(
-                [i for i, t in enumerate(list_of_operators) if t == "endfor" or t == "endif"]
-            )[::-1]
-            for i in range(0, len(subgraphs_list)):
-                subgraphs_list[i]["end_index"] = closing_indexes[i]
-
-            cluster_counter = 0
-            for subgraph in subgraphs_list:
-                new_dot = graphviz.Digraph(name="cluster_{0}".format(str(cluster_counter)))
-                for i in range(subgraph["start_index"], subgraph["end_index"] + 1):
-                    new_dot.attr("node")
-                    new_dot.node(
-                        tasks[i].name,
-                        _trim_text(tasks[i].name)
-                        + "\n"
-                        + _trim_text(tasks[i].type)
-                        + "\n"
-                        + _trim_text(tasks[i].operator),
-                    )
-                subgraph["dot"] = new_dot
-                cluster_counter += 1
-            return subgraphs_list
+        def _find_subgraphs(graph):
+            # one cluster per for/if block, nested in the cluster of the
+            # enclosing block; inner blocks are built first
+            blocks = graph.blocks()
+            clusters = {}
+            for opener in sorted(blocks, key=lambda o: len(blocks[o]["body"])):
+                cluster = graphviz.Digraph(name="cluster_{0}".format(opener))
+                for i in [opener] + blocks[opener]["body"]:
+                    if i == opener or (graph.enclosing_block(i) == opener and i not in blocks):
+                        cluster.node(
+                            graph.names[i],
+                            _trim_text(graph.names[i])
+                            + "\n"
+                            + _trim_text(graph.tasks[i].type)
+                            + "\n"
+                            + _trim_text(graph.tasks[i].operator),
+                        )
+                for child in blocks:
+                    if blocks[child]["parent"] == opener:
+                        cluster.subgraph(clusters[child])
+                clusters[opener] = cluster
+            return [clusters[o] for o in blocks if blocks[o]["parent"] is None]
 
         def _check_experiment_validity():
             import json
@@ -530,7 +945,10 @@ class Experiment:
             else:
                 return False
 
-        experiment_validity = _check_experiment_validity()
+        if catalogue is not None:
+            experiment_validity = catalogue.validate(self, self.validate()).valid
+        else:
+            experiment_validity = _check_experiment_validity()
         self.__param_check(
             [
                 {"name": "filename", "value": filename, "type": str},
@@ -557,16 +975,13 @@ class Experiment:
                 + "\n"
                 + _trim_text(task.operator),
             )
-            dot.attr("edge", style="solid")
-            for d in task.dependencies:
-                if "argument" not in d.keys():
-                    dot.attr("edge", style="dashed")
-                dot.edge(d["task"], task.name)
-        subgraphs = _find_subgraphs(self.tasks)
-        if len(subgraphs) > 1:
-            for i in range(0, len(subgraphs) - 1):
-                subgraphs[i]["dot"].subgraph(subgraphs[i + 1]["dot"])
-            dot.subgraph(subgraphs[0]["dot"])
+        graph = self.graph
+        for i in range(len(graph)):
+            for j in graph.predecessors[i]:
+                style = "solid" if graph.argument(j, i) is not None else "dashed"
+                dot.edge(graph.names[j], graph.names[i], style=style)
+        for subgraph in _find_subgraphs(graph):
+            dot.subgraph(subgraph)
         notebook_check = self._notebook_check()
         if notebook_check is True:
             # TODO change the image dimensions
@@ -0,0 +1,131 @@
+import hashlib
+import json
+
+# fields of an experiment that do not change the submitted workflow
+_ignored_fields = ["pyophidia_client", "task_name_counter", "workflow_id", "exec_mode"]
+
+
+def _tokens(value):
+    # canonical JSON of a value, yielded piece by piece with the dict keys sorted
+    if isinstance(value, dict):
+        yield "{"
+        for key in sorted(value, key=str):
+            yield json.dumps(str(key))
+            yield ":"
+            yield from _tokens(value[key])
+            yield ","
+        yield "}"
+    elif isinstance(value, (list, tuple)):
+        yield "["
+        for item in value:
+            yield from _tokens(item)
+            yield ","
+        yield "]"
+    elif value is None or isinstance(value, (bool, int, float)):
+        yield json.dumps(value)
+    else:
+        yield json.dumps(str(value))
+
+
+def _task_tokens(task):
+    # the order of the arguments and of the dependencies of a task does not
+    # change the workflow
+    yield "{"
+    for key in sorted(task.__dict__):
+        if key.startswith("_"):
+            continue
+        value = task.__dict__[key]
+        if key == "arguments":
+            value = sorted(str(a) for a in value)
+        elif key == "dependencies":
+            value = sorted(value, key=lambda d: (str(d.get("task")), str(d.get("argument"))))
+        yield json.dumps(key)
+        yield ":"
+        yield from _tokens(value)
+        yield ","
+    yield "}"
+
+
+def experiment_tokens(experiment):
+    """
+    Yield the canonical representation of an experiment piece by piece: keys
+    sorted, tasks sorted by name, arguments and dependencies of each task
+    sorted, fields that do not change the submitted workflow left out
+    """
+    fields = experiment.__dict__
+    yield "{"
+    for key in sorted(fields):
+        if key in _ignored_fields or key.startswith("_"):
+            continue
+        yield json.dumps(key)
+        yield ":"
+        if key == "tasks":
+            yield "["
+            for task in sorted(fields[key], key=lambda t: str(t.name)):
+                yield from _task_tokens(task)
+                yield ","
+            yield "]"
+        else:
+            yield from _tokens(fields[key])
+        yield ","
+    yield "}"
+
+
+def fingerprint(experiment, args=(), options=None):
+    """
+    Return the content-addressed fingerprint of an experiment submitted with
+    a list of arguments, computed in a single pass without serializing the
+    whole document
+
+    Two experiments get the same fingerprint if they differ only by the order
+    of their tasks, of the arguments or of the dependencies of their tasks,
+    or by their execution mode.
+
+    Parameters
+    ----------
+    experiment : <class 'esdm_pav_client.experiment.Experiment'>
+        experiment to be fingerprinted
+    args : list, optional
+        arguments substituted in the workflow (their order matters)
+    options : dict, optional
+        submission options changing the submitted workflow, e.g.
+        {"optimize": True}; the options set to a false value are ignored
+
+    Returns
+    -------
+    fingerprint : str
+        Returns the hexadecimal SHA-256 digest
+
+    Example
+    -------
+    fingerprint(e1, ["input.nc"])
+    """
+    return fingerprints(experiment, args, options)[1]
+
+
+def fingerprints(experiment, args=(), options=None):
+    """
+    Return the fingerprint of an experiment alone (as if submitted without
+    arguments) and the fingerprint of its submission with a list of
+    arguments, computed in the same pass
+
+    Returns
+    -------
+    (experiment_hash, fingerprint) : tuple of str
+        Returns the hexadecimal SHA-256 digests
+    """
+    digest = hashlib.sha256()
+    for token in experiment_tokens(experiment):
+        digest.update(token.encode("utf-8"))
+    digest.update(b"\x00")
+    experiment_digest = digest.copy()
+    for token in _tokens([]):
+        experiment_digest.update(token.encode("utf-8"))
+    for token in _tokens([str(a) for a in args]):
+        digest.update(token.encode("utf-8"))
+    options = {k: v for k, v in (options or {}).items() if v}
+    if options:
+        digest.update(b"\x00")
+        for token in _tokens(options):
+            digest.update(token.encode("utf-8"))
+    return experiment_digest.hexdigest(), digest.hexdigest()
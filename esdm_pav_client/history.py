@@ -0,0 +1,432 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+_schema = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    workflow_id TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    experiment_name TEXT,
+    experiment_hash TEXT,
+    fingerprint TEXT,
+    args TEXT NOT NULL,
+    submitted REAL NOT NULL,
+    updated REAL NOT NULL,
+    ended REAL,
+    status TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS submissions_workflow ON submissions (endpoint, workflow_id);
+CREATE INDEX IF NOT EXISTS submissions_submitted ON submissions (submitted);
+CREATE INDEX IF NOT EXISTS submissions_status ON submissions (status, submitted);
+CREATE INDEX IF NOT EXISTS submissions_hash ON submissions (experiment_hash, submitted);
+CREATE INDEX IF NOT EXISTS submissions_fingerprint ON submissions (fingerprint, submitted);
+CREATE TABLE IF NOT EXISTS tasks (
+    submission INTEGER NOT NULL REFERENCES submissions (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    started REAL,
+    ended REAL,
+    PRIMARY KEY (submission, name)
+);
+"""
+
+# statuses after which a workflow or a task does not change anymore
+final_statuses = "(?i).*(COMPLETED|ERROR|ABORTED|SKIPPED|UNSELECTED)"
+
+_failed_condition = "(status LIKE '%ERROR%' OR status LIKE '%ABORTED%')"
+
+
+def parse_since(value, now=None):
+    """
+    Convert a relative duration ("30m", "12h", "2d", "1w", in seconds if no
+    unit is given) or an ISO date ("2023-02-23") into a timestamp
+
+    Raises
+    ------
+    AttributeError
+        If the value is not valid
+    """
+    import datetime
+
+    now = time.time() if now is None else now
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*$", str(value))
+    if match:
+        units = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+        return now - float(match.group(1)) * units[match.group(2)]
+    try:
+        return datetime.datetime.fromisoformat(str(value).strip()).timestamp()
+    except ValueError:
+        raise AttributeError("invalid time: {0}".format(value))
+
+
+def experiment_hash(experiment):
+    """
+    Return the fingerprint of an experiment, regardless of its arguments
+    """
+    try:
+        from fingerprint import fingerprint
+    except ImportError:
+        from .fingerprint import fingerprint
+
+    return fingerprint(experiment)
+
+
+class HistoryStore:
+    """
+    Local history of the submitted workflows, stored in a SQLite database
+
+    Each submission is recorded with the hash of the experiment, the
+    arguments, the runtime and the workflow id; the statuses seen while
+    monitoring the workflow update the final status and the timings of the
+    tasks (first time seen running and first time seen ended), so that the
+    history can be queried without contacting the runtime.
+
+    Construction::
+    h1 = HistoryStore("history.sqlite")
+
+    Parameters
+    ----------
+    path : str, optional
+        path of the database, the ESDM_PAV_CLIENT_HISTORY environment
+        variable or ~/.esdm_pav_client/history.sqlite if None
+
+    Example
+    -------
+    h1 = HistoryStore()
+    w1 = Workflow(e1, history=h1)
+    w1.submit("2")
+    w1.monitor()
+    h1.query(failed=True, since="2d")
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.environ.get("ESDM_PAV_CLIENT_HISTORY") or os.path.join(
+                os.path.expanduser("~"), ".esdm_pav_client", "history.sqlite"
+            )
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("PRAGMA foreign_keys = ON")
+            self._db.executescript(_schema)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def record_submission(
+        self,
+        workflow_id,
+        endpoint,
+        experiment=None,
+        args=(),
+        fingerprint=None,
+        experiment_hash=None,
+        now=None,
+    ):
+        """
+        Record a submitted workflow
+
+        Parameters
+        ----------
+        workflow_id : str
+            id of the workflow
+        endpoint : str
+            runtime of the workflow, as "server:port"
+        experiment : <class 'esdm_pav_client.experiment.Experiment'>, optional
+            submitted experiment
+        args : list, optional
+            arguments substituted in the workflow
+        fingerprint : str, optional
+            fingerprint of the experiment and of the arguments, see
+            esdm_pav_client.fingerprint; computed from experiment if None
+        experiment_hash : str, optional
+            fingerprint of the experiment alone; computed from experiment if
+            None, in the same pass as the fingerprint
+
+        Returns
+        -------
+        submission : int
+            Returns the id of the submission in the history
+        """
+        now = time.time() if now is None else now
+        name = experiment.name if experiment is not None else None
+        if experiment is not None and (fingerprint is None or experiment_hash is None):
+            try:
+                from fingerprint import fingerprints
+            except ImportError:
+                from .fingerprint import fingerprints
+
+            hashes = fingerprints(experiment, args)
+            experiment_hash = experiment_hash or hashes[0]
+            fingerprint = fingerprint or hashes[1]
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO submissions (workflow_id, endpoint, experiment_name, "
+                "experiment_hash, fingerprint, args, submitted, updated, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'OPH_STATUS_PENDING') "
+                "ON CONFLICT (endpoint, workflow_id) DO UPDATE SET "
+                "experiment_name = COALESCE(excluded.experiment_name, experiment_name), "
+                "experiment_hash = COALESCE(excluded.experiment_hash, experiment_hash), "
+                "fingerprint = COALESCE(excluded.fingerprint, fingerprint), "
+                "args = excluded.args, updated = excluded.updated, ended = NULL, "
+                "status = excluded.status",
+                (
+                    str(workflow_id),
+                    endpoint,
+                    name,
+                    experiment_hash,
+                    fingerprint,
+                    json.dumps([str(a) for a in args]),
+                    now,
+                    now,
+                ),
+            )
+            return self._db.execute(
+                "SELECT id FROM submissions WHERE endpoint = ? AND workflow_id = ?",
+                (endpoint, str(workflow_id)),
+            ).fetchone()["id"]
+
+    def record_status(self, workflow_id, endpoint, status, tasks=None, now=None):
+        """
+        Record the status of a workflow and of its tasks seen by monitoring;
+        workflows that were not recorded at submission are ignored
+
+        Parameters
+        ----------
+        workflow_id : str
+            id of the workflow
+        endpoint : str
+            runtime of the workflow, as "server:port"
+        status : str
+            workflow status
+        tasks : dict, optional
+            task name -> task status
+        """
+        now = time.time() if now is None else now
+        ended = now if re.match(final_statuses, str(status)) else None
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT id FROM submissions WHERE endpoint = ? AND workflow_id = ?",
+                (endpoint, str(workflow_id)),
+            ).fetchone()
+            if row is None:
+                return
+            self._db.execute(
+                "UPDATE submissions SET status = ?, updated = ?, ended = COALESCE(ended, ?) "
+                "WHERE id = ?",
+                (str(status), now, ended, row["id"]),
+            )
+            for name, task_status in (tasks or {}).items():
+                running = not re.match("(?i).*(PENDING|WAITING|UNKNOWN)", str(task_status))
+                final = re.match(final_statuses, str(task_status))
+                self._db.execute(
+                    "INSERT INTO tasks (submission, name, status, first_seen, started, ended) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (submission, name) DO UPDATE SET status = excluded.status, "
+                    "started = COALESCE(started, excluded.started), "
+                    "ended = COALESCE(ended, excluded.ended)",
+                    (
+                        row["id"],
+                        name,
+                        str(task_status),
+                        now,
+                        now if running else None,
+                        now if final else None,
+                    ),
+                )
+
+    def query(
+        self,
+        failed=False,
+        status=None,
+        since=None,
+        until=None,
+        name=None,
+        endpoint=None,
+        experiment_hash=None,
+        fingerprint=None,
+        limit=None,
+    ):
+        """
+        Return the recorded submissions, most recent first
+
+        Parameters
+        ----------
+        failed : bool, optional
+            only the workflows ended with an error
+        status : str, optional
+            only the workflows whose status contains status (e.g. RUNNING)
+        since : str or float, optional
+            only the workflows submitted since a timestamp, a relative
+            duration ("2d") or an ISO date
+        until : str or float, optional
+            only the workflows submitted before a timestamp, a relative
+            duration or an ISO date
+        name : str, optional
+            only the experiments whose name contains name
+        endpoint : str, optional
+            only the workflows of a runtime, as "server:port"
+        experiment_hash : str, optional
+            only the submissions of an experiment hash
+        fingerprint : str, optional
+            only the submissions of a fingerprint of the experiment and of
+            the arguments
+        limit : int, optional
+            maximum number of submissions
+
+        Returns
+        -------
+        submissions : list of dict
+            Returns the submissions, with their args decoded and their
+            duration in seconds (None while running)
+        """
+        conditions = []
+        params = []
+        if failed:
+            conditions.append(_failed_condition)
+        if status:
+            conditions.append("status LIKE ?")
+            params.append("%{0}%".format(status))
+        for value, operator in [(since, ">="), (until, "<")]:
+            if value is not None:
+                if not isinstance(value, (int, float)):
+                    value = parse_since(value)
+                conditions.append("submitted {0} ?".format(operator))
+                params.append(value)
+        if name:
+            conditions.append("experiment_name LIKE ?")
+            params.append("%{0}%".format(name))
+        if endpoint:
+            conditions.append("endpoint = ?")
+            params.append(endpoint)
+        if experiment_hash:
+            conditions.append("experiment_hash = ?")
+            params.append(experiment_hash)
+        if fingerprint:
+            conditions.append("fingerprint = ?")
+            params.append(fingerprint)
+        query = "SELECT * FROM submissions"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY submitted DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [self._submission(row) for row in rows]
+
+    @staticmethod
+    def _submission(row):
+        submission = dict(row)
+        submission["args"] = json.loads(submission["args"])
+        submission["duration"] = (
+            submission["ended"] - submission["submitted"] if submission["ended"] else None
+        )
+        return submission
+
+    def duplicate(self, fingerprint, endpoints=None, since=None):
+        """
+        Return the most recent submission of a fingerprint that is pending,
+        running or completed, i.e. not ended with an error
+
+        Parameters
+        ----------
+        fingerprint : str
+            fingerprint of the experiment and of the arguments
+        endpoints : list of str, optional
+            only the workflows of these runtimes, as "server:port"
+        since : str or float, optional
+            only the workflows submitted since a timestamp, a relative
+            duration ("7d") or an ISO date
+
+        Returns
+        -------
+        submission : dict
+            Returns the submission as returned by query, None if there is no
+            such submission
+        """
+        query = "SELECT * FROM submissions WHERE fingerprint = ? AND NOT " + _failed_condition
+        params = [fingerprint]
+        if since is not None:
+            if not isinstance(since, (int, float)):
+                since = parse_since(since)
+            query += " AND submitted >= ?"
+            params.append(since)
+        if endpoints is not None:
+            endpoints = list(endpoints)
+            if not endpoints:
+                return None
+            query += " AND endpoint IN ({0})".format(", ".join("?" for _ in endpoints))
+            params.extend(endpoints)
+        with self._lock:
+            row = self._db.execute(
+                query + " ORDER BY submitted DESC, id DESC LIMIT 1", params
+            ).fetchone()
+        return self._submission(row) if row is not None else None
+
+    def tasks(self, workflow_id, endpoint=None):
+        """
+        Return the tasks of a workflow seen by monitoring, with their status
+        and their duration in seconds (None if unknown)
+        """
+        query = (
+            "SELECT tasks.* FROM tasks JOIN submissions ON tasks.submission = submissions.id "
+            "WHERE submissions.workflow_id = ?"
+        )
+        params = [str(workflow_id)]
+        if endpoint:
+            query += " AND submissions.endpoint = ?"
+            params.append(endpoint)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY first_seen, name", params).fetchall()
+        tasks = []
+        for row in rows:
+            task = dict(row)
+            task["duration"] = (
+                task["ended"] - task["started"] if task["ended"] and task["started"] else None
+            )
+            tasks.append(task)
+        return tasks
+
+    def prune(self, before):
+        """
+        Delete the submissions older than before (a timestamp, a relative
+        duration or an ISO date)
+
+        Returns
+        -------
+        deleted : int
+            Returns the number of deleted submissions
+        """
+        if not isinstance(before, (int, float)):
+            before = parse_since(before)
+        with self._lock, self._db:
+            return self._db.execute(
+                "DELETE FROM submissions WHERE submitted < ?", (before,)
+            ).rowcount
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def default_history():
+    """
+    Return the history store shared by the process, opened at the first call
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = HistoryStore()
+        return _default_store
@@ -0,0 +1,594 @@
+import itertools
+import threading
+
+
+def run_command(command, cwd=None):
+    """
+    Run a command on the local host, in a worker process of LocalExecutor
+
+    Returns
+    -------
+    (returncode, stdout, stderr) : tuple
+        Returns the exit code and the outputs of the command
+    """
+    import subprocess
+
+    completed = subprocess.run(
+        command,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    return completed.returncode, completed.stdout, completed.stderr
+
+
+def _script_args(arguments):
+    return [a for a in arguments.get("args", "").split("|") if a]
+
+
+def _cdo_command(operator, arguments):
+    import shlex
+
+    command = ["cdo"]
+    if arguments.get("force", "no").lower() == "yes":
+        command.append("-O")
+    command += shlex.split(operator)
+    command += [i for i in arguments.get("input", "").split("|") if i]
+    if arguments.get("output"):
+        command.append(arguments["output"])
+    return command
+
+
+def _shell_command(operator, arguments):
+    import shlex
+
+    return shlex.split(operator) + _script_args(arguments)
+
+
+def _python_command(operator, arguments):
+    import shlex
+    import sys
+
+    return [sys.executable] + shlex.split(operator) + _script_args(arguments)
+
+
+def _script_command(operator, arguments):
+    return [arguments.get("script", "")] + _script_args(arguments)
+
+
+# task type -> function returning the command line of a task run locally
+command_builders = {
+    "cdo": _cdo_command,
+    "shell": _shell_command,
+    "python": _python_command,
+}
+
+
+def evaluate_condition(condition):
+    """
+    Evaluate the condition of an if or elseif task: an arithmetic, comparison
+    or boolean expression of literals, e.g. "3 > 2 and not 0"
+
+    Raises
+    ------
+    AttributeError
+        If the condition is not a valid expression
+    """
+    import ast
+    import operator as op
+
+    operators = {
+        ast.Add: op.add,
+        ast.Sub: op.sub,
+        ast.Mult: op.mul,
+        ast.Div: op.truediv,
+        ast.Mod: op.mod,
+        ast.Pow: op.pow,
+        ast.USub: op.neg,
+        ast.UAdd: op.pos,
+        ast.Not: op.not_,
+        ast.Eq: op.eq,
+        ast.NotEq: op.ne,
+        ast.Lt: op.lt,
+        ast.LtE: op.le,
+        ast.Gt: op.gt,
+        ast.GtE: op.ge,
+    }
+
+    def _eval(node):
+        if isinstance(node, ast.Expression):
+            return _eval(node.body)
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.BoolOp):
+            values = [_eval(v) for v in node.values]
+            return all(values) if isinstance(node.op, ast.And) else any(values)
+        if isinstance(node, ast.UnaryOp) and type(node.op) in operators:
+            return operators[type(node.op)](_eval(node.operand))
+        if isinstance(node, ast.BinOp) and type(node.op) in operators:
+            return operators[type(node.op)](_eval(node.left), _eval(node.right))
+        if isinstance(node, ast.Compare):
+            left = _eval(node.left)
+            for comparison, comparator in zip(node.ops, node.comparators):
+                right = _eval(comparator)
+                if type(comparison) not in operators or not operators[type(comparison)](
+                    left, right
+                ):
+                    return False
+                left = right
+            return True
+        raise AttributeError("unsupported condition: {0}".format(condition))
+
+    if not condition.strip():
+        return True
+    try:
+        return bool(_eval(ast.parse(condition.strip(), mode="eval")))
+    except (SyntaxError, TypeError, ValueError, ZeroDivisionError) as e:
+        raise AttributeError("invalid condition: {0}".format(condition)) from e
+
+
+class RuntimeBackend:
+    """
+    Backend of LocalExecutor running the Ophidia tasks one by one on an
+    ESDM-PAV runtime
+
+    Parameters
+    ----------
+    server : str, optional
+        ESDM-PAV runtime DNS/IP address
+    port : str, optional
+        ESDM-PAV runtime port
+    username : str, optional
+        runtime username
+    password : str, optional
+        runtime password
+    """
+
+    def __init__(self, server="127.0.0.1", port="11732", username="oph-test", password="abcd"):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self._client = None
+        self._lock = threading.Lock()
+
+    def run(self, operator, arguments):
+        """
+        Run an Ophidia operator and return the PID of its output cube
+
+        Raises
+        ------
+        RuntimeError
+            If the operator fails
+        """
+        from PyOphidia import client
+
+        query = operator + " "
+        query += "".join("{0}={1};".format(k, v) for k, v in arguments.items())
+        query += "exec_mode=sync;"
+        with self._lock:
+            if self._client is None:
+                self._client = client.Client(
+                    username=self.username,
+                    password=self.password,
+                    server=self.server,
+                    port=self.port,
+                    api_mode=False,
+                )
+            self._client.submit(query, display=False)
+            if self._client.last_return_value != 0:
+                raise RuntimeError(self._client.last_error)
+            return self._client.cube or ""
+
+
+class LocalExecutor:
+    """
+    Executes an ESDM-PAV experiment on the local host
+
+    The for loops are expanded (see esdm_pav_client.dag.unroll) and the task
+    instances are scheduled in topological order: tasks of type cdo, shell and
+    python, and oph_script tasks, run as commands in a pool of worker
+    processes; the other Ophidia tasks are delegated to the backend, e.g. a
+    RuntimeBackend. Flow control tasks are executed by the scheduler: an if or
+    elseif task evaluates its condition argument and the tasks of the branches
+    not taken are UNSELECTED.
+
+    The output of a command is its output argument, if any, or its standard
+    output; the output of a flow control task is the list of the outputs of
+    its dependencies separated by "|". A dependency argument is set with the
+    outputs of the tasks it depends on.
+
+    The on_error attribute of a task, or of the experiment, sets what
+    happens when the task fails: "break" (default) stops the execution,
+    "skip" marks the task and the tasks depending on it as SKIPPED, "continue"
+    marks the task as COMPLETED and "repeat N" tries it again up to N times.
+
+    The status is available in the format of the oph_resume responses, with
+    the workflow_status and workflow_list (TASK NAME and EXIT STATUS) objects
+    read by Workflow.monitor.
+
+    Construction::
+    x1 = LocalExecutor(e1, max_workers=4)
+
+    Parameters
+    ----------
+    experiment : <class 'esdm_pav_client.experiment.Experiment'>
+        experiment to be executed
+    max_workers : int, optional
+        maximum number of tasks running at the same time
+    backend : object, optional
+        object with a run(operator, arguments) method executing an Ophidia
+        task and returning its output
+    cwd : str, optional
+        working directory of the commands
+    listener : callable, optional
+        function called with the status response at every status change
+
+    Raises
+    ------
+    AttributeError
+        If max_workers is not a positive int
+
+    Example
+    -------
+    x1 = LocalExecutor(e1, backend=RuntimeBackend("127.0.0.1", "11732"))
+    x1.submit("2000|2001")
+    x1.monitor(frequency=1)
+    """
+
+    task_statuses = [
+        "OPH_STATUS_PENDING",
+        "OPH_STATUS_RUNNING",
+        "OPH_STATUS_COMPLETED",
+        "OPH_STATUS_ERROR",
+        "OPH_STATUS_SKIPPED",
+        "OPH_STATUS_UNSELECTED",
+        "OPH_STATUS_ABORTED",
+    ]
+    _ids = itertools.count(1)
+
+    def __init__(self, experiment, max_workers=4, backend=None, cwd=None, listener=None):
+        if not isinstance(max_workers, int) or max_workers < 1:
+            raise AttributeError("max_workers must be a positive int")
+        self.experiment = experiment
+        self.max_workers = max_workers
+        self.backend = backend
+        self.cwd = cwd
+        self.listener = listener
+        self.workflow_id = None
+        self.workflow_status = "OPH_STATUS_PENDING"
+        self.instances = []
+        self.statuses = []
+        self.outputs = []
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._thread = None
+
+    def submit(self, *args):
+        """
+        Start the execution of the experiment in the background
+
+        Parameters
+        ----------
+        args : list
+            list of arguments to be substituted in the workflow
+
+        Returns
+        -------
+        workflow_id : str
+            Returns the id of the local execution
+
+        Raises
+        ------
+        AttributeError
+            If the experiment is already running, if its dependencies contain
+            a cycle or if the values of a loop are not known
+        """
+        try:
+            from dag import unroll
+        except ImportError:
+            from .dag import unroll
+
+        if self._thread is not None and self._thread.is_alive():
+            raise AttributeError("experiment is already running")
+        self.instances = unroll(self.experiment.tasks, args)
+        self.statuses = ["OPH_STATUS_PENDING"] * len(self.instances)
+        self.outputs = [""] * len(self.instances)
+        self.errors = {}
+        self._cancelled.clear()
+        self.workflow_id = "local-{0}".format(next(self._ids))
+        self.workflow_status = "OPH_STATUS_RUNNING"
+        self._notify()
+        self._thread = threading.Thread(target=self._execute, daemon=True)
+        self._thread.start()
+        return self.workflow_id
+
+    def run(self, *args):
+        """
+        Execute the experiment and wait for its end
+
+        Parameters
+        ----------
+        args : list
+            list of arguments to be substituted in the workflow
+
+        Returns
+        -------
+        workflow_status : <class 'str'>
+            Returns the final workflow status
+        """
+        self.submit(*args)
+        return self.wait()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the end of the execution
+
+        Parameters
+        ----------
+        timeout : float, optional
+            maximum number of seconds to wait
+
+        Returns
+        -------
+        workflow_status : <class 'str'>
+            Returns the workflow status
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.workflow_status
+
+    def status(self):
+        """
+        Return the current workflow status
+        """
+        return self.workflow_status
+
+    def response(self):
+        """
+        Return the status in the format of the oph_resume responses
+
+        Returns
+        -------
+        response : dict
+            Returns a dict with the workflow_status and workflow_list objects
+        """
+        with self._lock:
+            rows = [
+                [instance["name"], self.experiment.tasks[instance["position"]].type, status]
+                for instance, status in zip(self.instances, self.statuses)
+            ]
+            return {
+                "response": [
+                    {
+                        "objkey": "workflow_status",
+                        "objcontent": [{"message": self.workflow_status}],
+                    },
+                    {
+                        "objkey": "workflow_list",
+                        "objcontent": [
+                            {"rowkeys": ["TASK NAME", "TYPE", "EXIT STATUS"], "rowvalues": rows}
+                        ],
+                    },
+                ]
+            }
+
+    def monitor(self, frequency=10, iterative=True):
+        """
+        Print the workflow status until the end of the execution
+
+        Parameters
+        ----------
+        frequency : int
+            The frequency in seconds to receive the updates
+        iterative: bool
+            True for receiving updates periodically, based on the frequency, or
+            False to receive updates only once
+
+        Returns
+        -------
+        workflow_status : <class 'str'>
+            Returns the workflow status as a string
+        """
+        while True:
+            workflow_status = self.workflow_status
+            print(workflow_status)
+            if not iterative or workflow_status != "OPH_STATUS_RUNNING":
+                return workflow_status
+            self.wait(frequency)
+
+    def cancel(self):
+        """
+        Stop the execution: the running tasks are completed, the pending ones
+        are ABORTED
+        """
+        self._cancelled.set()
+
+    def _notify(self):
+        if self.listener is not None:
+            self.listener(self.response())
+
+    def _update(self, i, status, output=""):
+        with self._lock:
+            self.statuses[i] = status
+            self.outputs[i] = output
+        self._notify()
+
+    def _on_error(self, task):
+        policy = task.__dict__.get("on_error") or self.experiment.__dict__.get("on_error")
+        policy = str(policy or "break").strip().lower()
+        if policy.startswith("repeat"):
+            try:
+                return "repeat", int(policy.split()[1])
+            except (IndexError, ValueError):
+                return "repeat", 1
+        return policy, 0
+
+    def _inputs(self, i):
+        inputs = {}
+        for j, argument in self.instances[i]["dependencies"]:
+            if argument and self.statuses[j] == "OPH_STATUS_COMPLETED" and self.outputs[j]:
+                inputs.setdefault(argument, []).append(self.outputs[j])
+        return {k: "|".join(v) for k, v in inputs.items()}
+
+    def _start(self, i, pools, successors, forced):
+        """
+        Start the instance i: returns a (status, output, None) tuple if it
+        ended at once, or a (future, output, command) tuple if it was
+        submitted to a pool, command being True for a local command
+        """
+        try:
+            from dag import control_operator
+        except ImportError:
+            from .dag import control_operator
+
+        instance = self.instances[i]
+        task = self.experiment.tasks[instance["position"]]
+        operator = control_operator(task)
+        statuses = [self.statuses[j] for j, _ in instance["dependencies"]]
+        inactive = [s for s in statuses if s in ["OPH_STATUS_SKIPPED", "OPH_STATUS_UNSELECTED"]]
+        if i in forced:
+            return forced[i], "", None
+        if inactive and (operator not in ["endfor", "endif"] or len(inactive) == len(statuses)):
+            return inactive[0], "", None
+        arguments = dict(instance["arguments"], **self._inputs(i))
+
+        if operator is not None or task.type == "control":
+            output = "|".join(
+                self.outputs[j]
+                for j in dict.fromkeys(j for j, _ in instance["dependencies"])
+                if self.statuses[j] == "OPH_STATUS_COMPLETED" and self.outputs[j]
+            )
+            if operator in ["if", "elseif"]:
+                selected = evaluate_condition(arguments.get("condition", ""))
+                for j in successors[i]:
+                    position = self.instances[j]["position"]
+                    successor = control_operator(self.experiment.tasks[position])
+                    if successor in ["endif", "endfor"]:
+                        continue
+                    if selected == (successor in ["else", "elseif"]):
+                        forced[j] = "OPH_STATUS_UNSELECTED"
+            return "OPH_STATUS_COMPLETED", output, None
+
+        if task.type == "ophidia" and task.operator != "oph_script":
+            if self.backend is None:
+                raise AttributeError("no backend for the Ophidia task {0}".format(task.name))
+            return pools("thread").submit(self.backend.run, task.operator, arguments), None, False
+        if task.type == "ophidia":
+            command = _script_command(task.operator, arguments)
+        elif task.type in command_builders:
+            command = command_builders[task.type](task.operator, arguments)
+        else:
+            raise AttributeError("task type {0} cannot be run locally".format(task.type))
+        future = pools("process").submit(run_command, command, self.cwd)
+        return future, arguments.get("output"), True
+
+    def _execute(self):
+        from collections import deque
+        from concurrent.futures import (
+            FIRST_COMPLETED,
+            ProcessPoolExecutor,
+            ThreadPoolExecutor,
+            wait,
+        )
+
+        n = len(self.instances)
+        successors = [[] for _ in range(n)]
+        waiting = [0] * n
+        for i, instance in enumerate(self.instances):
+            predecessors = set(j for j, _ in instance["dependencies"])
+            waiting[i] = len(predecessors)
+            for j in predecessors:
+                successors[j].append(i)
+        ready = deque(i for i in range(n) if waiting[i] == 0)
+        attempts = [0] * n
+        forced = {}
+        running = {}
+        executors = {}
+        failed = False
+
+        def _pools(kind):
+            if kind not in executors:
+                if kind == "process":
+                    executors[kind] = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    executors[kind] = ThreadPoolExecutor(max_workers=self.max_workers)
+            return executors[kind]
+
+        def _end(i, status, output=""):
+            self._update(i, status, output)
+            for j in successors[i]:
+                waiting[j] -= 1
+                if waiting[j] == 0:
+                    ready.append(j)
+
+        def _fail(i, error):
+            nonlocal failed
+            self.errors[self.instances[i]["name"]] = str(error)
+            policy, repeat = self._on_error(self.experiment.tasks[self.instances[i]["position"]])
+            if policy == "repeat" and attempts[i] < repeat:
+                attempts[i] += 1
+                ready.appendleft(i)
+            elif policy == "skip":
+                _end(i, "OPH_STATUS_SKIPPED")
+            elif policy == "continue":
+                _end(i, "OPH_STATUS_COMPLETED")
+            else:
+                self._update(i, "OPH_STATUS_ERROR")
+                failed = True
+
+        finished = False
+        try:
+            while ready or running:
+                while ready and len(running) < self.max_workers:
+                    if failed or self._cancelled.is_set():
+                        ready.clear()
+                        break
+                    i = ready.popleft()
+                    try:
+                        result, output, command = self._start(i, _pools, successors, forced)
+                    except Exception as e:
+                        _fail(i, e)
+                        continue
+                    if command is not None:
+                        running[result] = (i, output, command)
+                        self._update(i, "OPH_STATUS_RUNNING")
+                    else:
+                        _end(i, result, output)
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, output, command = running.pop(future)
+                    try:
+                        result = future.result()
+                        if command:
+                            returncode, stdout, stderr = result
+                            if returncode != 0:
+                                raise RuntimeError(
+                                    stderr.strip() or "exit code {0}".format(returncode)
+                                )
+                            result = output or stdout.strip()
+                    except Exception as e:
+                        _fail(i, e)
+                        continue
+                    _end(i, "OPH_STATUS_COMPLETED", str(result or ""))
+            finished = True
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+            with self._lock:
+                for i, status in enumerate(self.statuses):
+                    if status in ["OPH_STATUS_PENDING", "OPH_STATUS_RUNNING"]:
+                        self.statuses[i] = "OPH_STATUS_ABORTED"
+                # an unexpected exception (e.g. raised by the listener) left
+                # the loop without running the remaining tasks
+                if failed or not finished:
+                    self.workflow_status = "OPH_STATUS_ERROR"
+                elif self._cancelled.is_set():
+                    self.workflow_status = "OPH_STATUS_ABORTED"
+                else:
+                    self.workflow_status = "OPH_STATUS_COMPLETED"
+            self._notify()
@@ -0,0 +1,485 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    from cleanup import cube_operators
+except ImportError:
+    from .cleanup import cube_operators
+
+# export operators whose output can be imported back instead of recomputing
+# the exported cube: operator -> (output argument, import operator, input
+# argument of the import operator)
+exporters = {"oph_exportesdm": ("output", "oph_importesdm", "input")}
+
+# operators creating the same cube from the same arguments and input cubes
+deterministic_operators = [o for o in cube_operators if not o.startswith("oph_randcube")]
+
+# arguments not changing the content of the output cube
+neutral_arguments = [
+    "ncores",
+    "nthreads",
+    "nhost",
+    "exec_mode",
+    "sessionid",
+    "description",
+]
+
+_schema = """
+CREATE TABLE IF NOT EXISTS memo (
+    hash TEXT PRIMARY KEY,
+    output TEXT NOT NULL,
+    operator TEXT NOT NULL,
+    arguments TEXT NOT NULL,
+    workflow_id TEXT,
+    endpoint TEXT,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS memo_output ON memo (output);
+CREATE INDEX IF NOT EXISTS memo_last_used ON memo (last_used);
+"""
+
+
+class MemoReport:
+    """
+    Changes made by Experiment.memoize
+
+    Attributes
+    ----------
+    replaced : list of tuple
+        (task, output) pairs of the tasks replaced by the import of an
+        existing output
+    removed : list of str
+        names of the tasks removed because only the replaced tasks used them
+    """
+
+    def __init__(self):
+        self.replaced = []
+        self.removed = []
+
+    @property
+    def changed(self):
+        return bool(self.replaced or self.removed)
+
+    def __str__(self):
+        return "{0} tasks replaced by memoized outputs, {1} tasks removed".format(
+            len(self.replaced), len(self.removed)
+        )
+
+    def __repr__(self):
+        return "<MemoReport: {0}>".format(str(self))
+
+
+def task_hashes(tasks, args=(), graph=None):
+    """
+    Return the hash of the output cube of each task, computed from its
+    operator, its arguments (with the $N placeholders substituted) and the
+    hashes of the tasks it depends on
+
+    Tasks whose output cannot be memoized get None: tasks of operators that
+    do not deterministically create a cube, flow control tasks and the tasks
+    of their blocks, tasks with placeholders left and tasks depending on such
+    tasks.
+
+    Parameters
+    ----------
+    tasks : list of <class 'esdm_pav_client.task.Task'>
+        tasks of the experiment
+    args : list, optional
+        list of arguments to be substituted in the workflow
+    graph : <class 'esdm_pav_client.dag.GraphView'>, optional
+        graph of the tasks, built if None
+
+    Returns
+    -------
+    hashes : list of str
+        Returns the hexadecimal hashes, in the order of the tasks
+    """
+    try:
+        from dag import GraphView, substitute_args
+    except ImportError:
+        from .dag import GraphView, substitute_args
+
+    if graph is None:
+        graph = GraphView(tasks)
+    hashes = [None] * len(tasks)
+    for i in graph.topological_order():
+        task = tasks[i]
+        if (
+            task.type != "ophidia"
+            or task.operator not in deterministic_operators
+            or graph.enclosing_block(i) is not None
+        ):
+            continue
+        # the arguments filled by a dependency (e.g. cube) are covered by the
+        # hash of that dependency, the literal ones (e.g. a cube PID) are not
+        filled = [d.get("argument") for d in task.dependencies if d.get("argument")]
+        arguments = sorted(
+            substitute_args(a, args)
+            for a in task.arguments
+            if a.partition("=")[0] not in neutral_arguments and a.partition("=")[0] not in filled
+        )
+        if any("$" in a or "@{" in a for a in arguments):
+            continue
+        upstream = []
+        for d in task.dependencies:
+            j = graph.index.get(d["task"])
+            if j is None or hashes[j] is None:
+                break
+            upstream.append([d.get("argument") or "", hashes[j]])
+        else:
+            digest = hashlib.sha256(
+                json.dumps([task.operator, arguments, sorted(upstream)]).encode("utf-8")
+            )
+            hashes[i] = digest.hexdigest()
+    return hashes
+
+
+def exported_outputs(tasks, args=()):
+    """
+    Return the outputs of the export tasks whose exported cube can be
+    memoized
+
+    Returns
+    -------
+    exports : dict
+        Returns a dict export task name -> {"hash": hash of the exported cube,
+        "output": exported output, "operator": import operator, "arguments":
+        arguments of the import task}
+    """
+    try:
+        from dag import GraphView, substitute_args, task_arguments
+    except ImportError:
+        from .dag import GraphView, substitute_args, task_arguments
+
+    graph = GraphView(tasks)
+    hashes = task_hashes(tasks, args)
+    exports = {}
+    for i, task in enumerate(tasks):
+        if task.operator not in exporters or graph.enclosing_block(i) is not None:
+            continue
+        output_argument, operator, input_argument = exporters[task.operator]
+        output = substitute_args(task_arguments(task).get(output_argument, ""), args)
+        cubes = [j for j in graph.predecessors[i] if graph.argument(j, i) == "cube"]
+        if not output or "$" in output or "@{" in output or len(cubes) != 1:
+            continue
+        if hashes[cubes[0]] is None:
+            continue
+        exports[task.name] = {
+            "hash": hashes[cubes[0]],
+            "output": output,
+            "operator": operator,
+            "arguments": {input_argument: output},
+        }
+    return exports
+
+
+def rewrite(experiment, store, args=()):
+    """
+    Replace the tasks whose output cube was exported by a completed workflow
+    with the import of that output; the tasks only needed by the replaced
+    tasks, and the exports of a replaced cube to the output it is imported
+    from, are removed
+
+    Returns
+    -------
+    report : <class 'esdm_pav_client.memo.MemoReport'>
+        Returns the report of the changes
+    """
+    try:
+        from dag import substitute_args, task_arguments
+    except ImportError:
+        from .dag import substitute_args, task_arguments
+
+    report = MemoReport()
+    tasks = experiment.tasks
+    graph = experiment.graph
+    hashes = task_hashes(tasks, args, graph)
+    entries = {}
+    for i, digest in enumerate(hashes):
+        if digest is not None:
+            entry = store.lookup(digest)
+            if entry is not None:
+                entries[i] = entry
+    if not entries:
+        return report
+    keep = [False] * len(tasks)
+    replaced = [False] * len(tasks)
+    for i in reversed(graph.topological_order()):
+        keep[i] = not graph.successors[i] or any(
+            keep[j] and not replaced[j] for j in graph.successors[i]
+        )
+        replaced[i] = keep[i] and i in entries
+    for i in [i for i in range(len(tasks)) if replaced[i]]:
+        # an export of the replaced cube to the output it is imported from
+        # would write the output onto itself: it is removed, and its
+        # successors depend on the import instead
+        for j in graph.successors[i]:
+            if (
+                not keep[j]
+                or tasks[j].operator not in exporters
+                or graph.predecessors[j] != [i]
+                or graph.enclosing_block(j) is not None
+            ):
+                continue
+            output_argument = exporters[tasks[j].operator][0]
+            output = task_arguments(tasks[j]).get(output_argument, "")
+            if substitute_args(output, args) != entries[i]["output"]:
+                continue
+            keep[j] = False
+            for k in graph.successors[j]:
+                dependencies = tasks[k].dependencies
+                for n, d in enumerate(dependencies):
+                    if d["task"] == tasks[j].name:
+                        d["task"] = tasks[i].name
+                        dependencies[n] = d
+    for i, task in enumerate(tasks):
+        if replaced[i]:
+            entry = entries[i]
+            kept = [a for a in task.arguments if a.partition("=")[0] in ["ncores", "nthreads"]]
+            task.operator = entry["operator"]
+            task.arguments = ["{0}={1}".format(k, v) for k, v in entry["arguments"].items()] + kept
+            task.dependencies[:] = []
+            report.replaced.append((task.name, entry["output"]))
+    removed = set(tasks[i].name for i in range(len(tasks)) if not keep[i])
+    for task in tasks:
+        task.dependencies[:] = [d for d in task.dependencies if d["task"] not in removed]
+    report.removed = [t.name for t in tasks if t.name in removed]
+    tasks[:] = [t for t in tasks if t.name not in removed]
+    return report
+
+
+class MemoStore:
+    """
+    Local index of the outputs exported by completed workflows, keyed by the
+    hash of the exported cube (see task_hashes), stored in a SQLite database
+
+    Workflows given a store record the outputs of their export tasks once
+    they are seen completed; Experiment.memoize (or the memoize argument of
+    Workflow.submit) replaces the tasks computing a recorded cube with the
+    import of the output. Outputs are not checked for existence: entries
+    must be invalidated when outputs are deleted or when the inputs change.
+
+    Entries are evicted when they are older than max_age and, beyond
+    max_entries, least recently used first.
+
+    Construction::
+    m1 = MemoStore("memo.sqlite")
+
+    Parameters
+    ----------
+    path : str, optional
+        path of the database, the ESDM_PAV_CLIENT_MEMO environment variable
+        or ~/.esdm_pav_client/memo.sqlite if None
+    max_entries : int, optional
+        maximum number of entries, unlimited if None
+    max_age : str or float, optional
+        maximum age of the entries, in seconds or as a relative duration
+        ("30d"), unlimited if None
+
+    Raises
+    ------
+    AttributeError
+        If max_entries is not a positive int
+
+    Example
+    -------
+    m1 = MemoStore(max_entries=1000, max_age="30d")
+    w1 = Workflow(e1, memo=m1)
+    w1.submit("input.nc", memoize=True)
+    w1.memoization_report
+    m1.invalidate(output="esdm://tos_mean")
+    """
+
+    def __init__(self, path=None, max_entries=None, max_age=None):
+        if max_entries is not None and (not isinstance(max_entries, int) or max_entries < 1):
+            raise AttributeError("max_entries must be a positive int")
+        if path is None:
+            path = os.environ.get("ESDM_PAV_CLIENT_MEMO") or os.path.join(
+                os.path.expanduser("~"), ".esdm_pav_client", "memo.sqlite"
+            )
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.executescript(_schema)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _entry(row):
+        entry = dict(row)
+        entry["arguments"] = json.loads(entry["arguments"])
+        return entry
+
+    def _expiry(self, now):
+        try:
+            from history import parse_since
+        except ImportError:
+            from .history import parse_since
+
+        return parse_since(self.max_age, now) if self.max_age is not None else None
+
+    def record(
+        self, digest, output, operator, arguments, workflow_id=None, endpoint=None, now=None
+    ):
+        """
+        Record the output exported from the cube of a hash, then evict the
+        entries beyond the limits
+
+        Parameters
+        ----------
+        digest : str
+            hash of the exported cube
+        output : str
+            exported output, e.g. an esdm:// dataset
+        operator : str
+            operator importing the output
+        arguments : dict
+            arguments of the import task
+        workflow_id : str, optional
+            id of the workflow that exported the output
+        endpoint : str, optional
+            runtime of the workflow, as "server:port"
+        """
+        now = time.time() if now is None else now
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO memo (hash, output, operator, arguments, workflow_id, "
+                "endpoint, created, last_used, hits) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (
+                    digest,
+                    output,
+                    operator,
+                    json.dumps(arguments),
+                    None if workflow_id is None else str(workflow_id),
+                    endpoint,
+                    now,
+                    now,
+                ),
+            )
+        self.evict(now)
+
+    def lookup(self, digest, now=None):
+        """
+        Return the entry of a hash as a dict, None if there is no such entry
+        or if it expired
+        """
+        now = time.time() if now is None else now
+        expiry = self._expiry(now)
+        with self._lock, self._db:
+            row = self._db.execute("SELECT * FROM memo WHERE hash = ?", (digest,)).fetchone()
+            if row is None:
+                return None
+            if expiry is not None and row["created"] < expiry:
+                self._db.execute("DELETE FROM memo WHERE hash = ?", (digest,))
+                return None
+            self._db.execute(
+                "UPDATE memo SET last_used = ?, hits = hits + 1 WHERE hash = ?", (now, digest)
+            )
+        return self._entry(row)
+
+    def entries(self):
+        """
+        Return the entries, most recently used first
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM memo ORDER BY last_used DESC").fetchall()
+        return [self._entry(row) for row in rows]
+
+    def invalidate(self, digest=None, output=None, workflow_id=None, before=None):
+        """
+        Delete the entries of a hash, of an output, of a workflow or created
+        before a timestamp, a relative duration or an ISO date
+
+        Returns
+        -------
+        deleted : int
+            Returns the number of deleted entries
+
+        Raises
+        ------
+        AttributeError
+            If no criterion is given
+        """
+        try:
+            from history import parse_since
+        except ImportError:
+            from .history import parse_since
+
+        conditions = []
+        params = []
+        for column, value in [("hash", digest), ("output", output), ("workflow_id", workflow_id)]:
+            if value is not None:
+                conditions.append("{0} = ?".format(column))
+                params.append(str(value))
+        if before is not None:
+            conditions.append("created < ?")
+            params.append(before if isinstance(before, (int, float)) else parse_since(before))
+        if not conditions:
+            raise AttributeError("invalidate requires a hash, an output, a workflow or a date")
+        with self._lock, self._db:
+            return self._db.execute(
+                "DELETE FROM memo WHERE " + " OR ".join(conditions), params
+            ).rowcount
+
+    def clear(self):
+        """
+        Delete all the entries
+        """
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM memo")
+
+    def evict(self, now=None):
+        """
+        Delete the entries older than max_age, then the least recently used
+        entries beyond max_entries
+
+        Returns
+        -------
+        deleted : int
+            Returns the number of deleted entries
+        """
+        now = time.time() if now is None else now
+        expiry = self._expiry(now)
+        deleted = 0
+        with self._lock, self._db:
+            if expiry is not None:
+                deleted += self._db.execute(
+                    "DELETE FROM memo WHERE created < ?", (expiry,)
+                ).rowcount
+            if self.max_entries is not None:
+                deleted += self._db.execute(
+                    "DELETE FROM memo WHERE hash IN (SELECT hash FROM memo "
+                    "ORDER BY last_used DESC, created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+        return deleted
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def default_memo():
+    """
+    Return the memo store shared by the process, opened at the first call
+    with at most 10000 entries of at most 30 days
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = MemoStore(max_entries=10000, max_age="30d")
+        return _default_store
@@ -0,0 +1,220 @@
+import re
+
+try:
+    from dag import GraphView, control_operator, task_arguments
+except ImportError:
+    from .dag import GraphView, control_operator, task_arguments
+
+# operators whose only effect is the creation of their output cube
+pure_operators = [
+    "oph_aggregate",
+    "oph_aggregate2",
+    "oph_apply",
+    "oph_drilldown",
+    "oph_duplicate",
+    "oph_intercube",
+    "oph_intercube2",
+    "oph_merge",
+    "oph_mergecubes",
+    "oph_mergecubes2",
+    "oph_permute",
+    "oph_reduce",
+    "oph_reduce2",
+    "oph_rollup",
+    "oph_subset",
+    "oph_subset2",
+]
+
+# task attributes that must match for two tasks to be fused
+execution_attributes = ["type", "run", "on_error", "on_exit"]
+
+
+class OptimizationReport:
+    """
+    Changes made by Experiment.optimize
+
+    Attributes
+    ----------
+    removed_dependencies : list of tuple
+        (task, dependent task) pairs of the redundant dependencies removed
+    fused : list of tuple
+        (removed task, fused task) pairs of the tasks merged together
+    eliminated : list of str
+        names of the removed dead tasks
+    """
+
+    def __init__(self):
+        self.removed_dependencies = []
+        self.fused = []
+        self.eliminated = []
+
+    @property
+    def changed(self):
+        return bool(self.removed_dependencies or self.fused or self.eliminated)
+
+    def __str__(self):
+        return "{0} redundant dependencies removed, {1} tasks fused, {2} dead tasks removed".format(
+            len(self.removed_dependencies), len(self.fused), len(self.eliminated)
+        )
+
+    def __repr__(self):
+        return "<OptimizationReport: {0}>".format(str(self))
+
+
+def _is_control(task):
+    return control_operator(task) is not None or task.type == "control"
+
+
+def transitive_reduction(tasks, report):
+    """
+    Remove the ordering dependencies (without argument) implied by other
+    dependencies. Dependencies carrying data and those involving flow control
+    tasks are kept.
+    """
+    graph = GraphView(tasks)
+    rank = [0] * len(tasks)
+    for n, i in enumerate(graph.topological_order()):
+        rank[i] = n
+    for v, task in enumerate(tasks):
+        if _is_control(task):
+            continue
+        candidates = set(
+            graph.index[d["task"]]
+            for d in task.dependencies
+            if "argument" not in d
+            and d["task"] in graph.index
+            and not _is_control(tasks[graph.index[d["task"]]])
+        )
+        implied = _implied(graph, rank, v, candidates) if candidates else set()
+        kept = []
+        for position, d in enumerate(task.dependencies):
+            u = graph.index.get(d["task"])
+            redundant = u in implied
+            if u in candidates and not redundant:
+                # the same dependency given twice, or with an argument too
+                for other_position, other in enumerate(task.dependencies):
+                    if other_position != position and other["task"] == d["task"]:
+                        if "argument" in other or other_position < position:
+                            redundant = True
+                            break
+            if redundant:
+                report.removed_dependencies.append((d["task"], task.name))
+            else:
+                kept.append(d)
+        task.dependencies[:] = kept
+
+
+def _implied(graph, rank, v, candidates):
+    # candidate predecessors of v that are also ancestors of another
+    # predecessor of v: the walk goes up from the predecessors of the
+    # predecessors of v, skipping the tasks before the first candidate in the
+    # topological order (they cannot lead to a candidate), and stops once
+    # every candidate is found
+    lowest = min(rank[u] for u in candidates)
+    found = set()
+    seen = set()
+    stack = [j for w in set(graph.predecessors[v]) for j in graph.predecessors[w]]
+    while stack and len(found) < len(candidates):
+        j = stack.pop()
+        if j in seen or rank[j] < lowest:
+            continue
+        seen.add(j)
+        if j in candidates:
+            found.add(j)
+        stack.extend(graph.predecessors[j])
+    return found
+
+
+def _fuse_apply(producer, consumer):
+    # oph_apply(query=g(measure)) applied to oph_apply(query=f(measure)) is
+    # oph_apply(query=g(f(measure)))
+    if producer.operator != "oph_apply" or consumer.operator != "oph_apply":
+        return None
+    a = task_arguments(producer)
+    b = task_arguments(consumer)
+    neutral = ["ncores", "nthreads"]
+    if set(a) - set(["query"] + neutral) or set(b) - set(["query"] + neutral):
+        return None
+    if "query" not in a or "query" not in b:
+        return None
+    if any(a.get(k) != b.get(k) for k in neutral):
+        return None
+    if not re.search(r"\bmeasure\b", b["query"]) or re.search(r"\bdimension\b", b["query"]):
+        return None
+    b["query"] = re.sub(r"\bmeasure\b", lambda m: a["query"], b["query"])
+    return b
+
+
+# fusion rules: functions returning the arguments of the fused task, or None
+fusions = [_fuse_apply]
+
+
+def fuse_operators(tasks, report):
+    """
+    Merge chains of composable Ophidia operators into a single task: the
+    consumer takes the dependencies of its producer, which is removed. Only
+    producers whose output cube is deleted at exit (on_exit=oph_delete) are
+    fused, so that the cubes kept by the experiment are still created
+    """
+    graph = GraphView(tasks)
+    # the graph is updated in place: each fusion moves the predecessors of
+    # the removed producer to its consumer
+    predecessors = [list(p) for p in graph.predecessors]
+    successors = [list(s) for s in graph.successors]
+    removed = set()
+    for v in graph.topological_order():
+        consumer = tasks[v]
+        while len(consumer.dependencies) == 1 and consumer.type == "ophidia":
+            d = consumer.dependencies[0]
+            u = graph.index.get(d["task"])
+            if u is None or u in removed or d.get("argument") != "cube":
+                break
+            if len(successors[u]) != 1:
+                break
+            producer = tasks[u]
+            if graph.enclosing_block(u) != graph.enclosing_block(v):
+                break
+            # the output cube of the producer disappears with the fusion, so
+            # it must be one the runtime deletes anyway
+            if producer.__dict__.get("on_exit") != "oph_delete" or any(
+                producer.__dict__.get(k) != consumer.__dict__.get(k)
+                for k in execution_attributes
+                if k != "on_exit"
+            ):
+                break
+            for fuse in fusions:
+                arguments = fuse(producer, consumer)
+                if arguments is not None:
+                    break
+            else:
+                break
+            consumer.arguments = ["{0}={1}".format(k, arguments[k]) for k in arguments]
+            consumer.dependencies[:] = producer.dependencies
+            for j in predecessors[u]:
+                successors[j] = [v if k == u else k for k in successors[j]]
+            predecessors[v] = predecessors[u]
+            removed.add(u)
+            report.fused.append((producer.name, consumer.name))
+    if removed:
+        tasks[:] = [t for i, t in enumerate(tasks) if i not in removed]
+
+
+def eliminate_dead_tasks(tasks, report):
+    """
+    Remove the tasks of pure operators whose output cube is deleted at exit
+    (on_exit=oph_delete) without being used by any other task
+    """
+    while True:
+        used = set(d["task"] for t in tasks for d in t.dependencies)
+        dead = [
+            i
+            for i, t in enumerate(tasks)
+            if t.name not in used
+            and t.operator in pure_operators
+            and t.__dict__.get("on_exit") == "oph_delete"
+        ]
+        if not dead:
+            return
+        for i in reversed(dead):
+            report.eliminated.append(tasks[i].name)
+            del tasks[i]
@@ -0,0 +1,358 @@
+import copy
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Partitioner:
+    """
+    Splits an ESDM-PAV experiment into smaller experiments that can be
+    executed in parallel, possibly on different runtimes
+
+    The experiment is split along:
+
+    - its weakly connected components, which share no dependency;
+    - the iterations of a parallel for loop (parallel=yes) with literal
+      values, when the loop has no predecessor and no data flows out of its
+      endfor task. The iteration values are divided among the parts; the
+      tasks following the endfor are moved to a join experiment that is
+      executed when all the parts have completed.
+
+    Parts that cannot be split further are grouped so that at most max_parts
+    experiments are produced.
+
+    Construction::
+    p1 = Partitioner(e1, max_parts=4)
+
+    Parameters
+    ----------
+    experiment : <class 'esdm_pav_client.experiment.Experiment'>
+        experiment to be partitioned
+    max_parts : int, optional
+        maximum number of parallel experiments
+
+    Raises
+    ------
+    AttributeError
+        If max_parts is not a positive int
+
+    Example
+    -------
+    p1 = Partitioner(e1, max_parts=4)
+    parts, join = p1.partition("2000|2001|2002|2003")
+    g1 = p1.group("2000|2001|2002|2003")
+    g1.submit("2000|2001|2002|2003")
+    g1.monitor()
+    """
+
+    def __init__(self, experiment, max_parts=4):
+        if not isinstance(max_parts, int) or max_parts < 1:
+            raise AttributeError("max_parts must be a positive int")
+        self.experiment = experiment
+        self.max_parts = max_parts
+
+    def partition(self, *args):
+        """
+        Compute the partition of the experiment
+
+        Parameters
+        ----------
+        args : list
+            list of arguments to be substituted in the loop values
+
+        Returns
+        -------
+        (parts, join) : tuple
+            Returns the list of the parallel experiments and the join
+            experiment, or None if no join is needed
+        """
+        try:
+            from workflow import Workflow
+        except ImportError:
+            from .workflow import Workflow
+
+        document = Workflow(self.experiment).workflow_to_json()
+        graph = self.experiment.graph
+        components = graph.components()
+        splits = []
+        units = []
+        for component in components:
+            split = self._loop_split(graph, component, args)
+            if split is None:
+                units.append(component)
+            else:
+                splits.append(split)
+
+        # slots left for the iterations of the splittable loops
+        slots = max(self.max_parts - len(units), len(splits))
+        parts = []
+        join_tasks = []
+        for n, split in enumerate(splits):
+            chunks = slots // len(splits) + (1 if n < slots % len(splits) else 0)
+            chunks = max(1, min(chunks, len(split["values"])))
+            for i in range(chunks):
+                values = split["values"][i::chunks]
+                parts.append(self._loop_tasks(document, split, values))
+            join_tasks += split["join"]
+        if splits:
+            units = self._bins(units, max(1, self.max_parts - len(parts)))
+        else:
+            units = self._bins(units, self.max_parts)
+        for unit in units:
+            parts.append([copy.deepcopy(document["tasks"][i]) for i in unit])
+
+        experiments = [
+            self._experiment(document, tasks, " (part {0})".format(i + 1))
+            for i, tasks in enumerate(parts)
+        ]
+        join = None
+        if join_tasks:
+            join_names = set(graph.names[i] for i in join_tasks)
+            tasks = []
+            for i in sorted(join_tasks):
+                task = copy.deepcopy(document["tasks"][i])
+                task["dependencies"] = [d for d in task["dependencies"] if d["task"] in join_names]
+                tasks.append(task)
+            join = self._experiment(document, tasks, " (join)")
+        return experiments, join
+
+    def group(self, *args):
+        """
+        Partition the experiment and return the handle of the group of
+        workflows
+
+        Parameters
+        ----------
+        args : list
+            list of arguments to be substituted in the loop values
+
+        Returns
+        -------
+        group : <class 'esdm_pav_client.partition.WorkflowGroup'>
+            Returns the group of the parallel experiments and the join
+        """
+        parts, join = self.partition(*args)
+        return WorkflowGroup(parts, join=join)
+
+    @staticmethod
+    def _experiment(document, tasks, suffix):
+        try:
+            from experiment import Experiment
+        except ImportError:
+            from .experiment import Experiment
+
+        data = {k: document[k] for k in document if k != "tasks"}
+        data["name"] = str(document["name"]) + suffix
+        data["tasks"] = tasks
+        return Experiment._from_dict(data)
+
+    @staticmethod
+    def _bins(units, n):
+        # greedy grouping of the units in at most n bins, largest first
+        if len(units) <= n:
+            return units
+        bins = [[] for _ in range(n)]
+        for unit in sorted(units, key=len, reverse=True):
+            min(bins, key=len).extend(unit)
+        return [sorted(b) for b in bins if b]
+
+    @staticmethod
+    def _loop_tasks(document, split, values):
+        tasks = []
+        for i in split["loop"]:
+            task = copy.deepcopy(document["tasks"][i])
+            if i == split["for"]:
+                task["arguments"] = [
+                    a for a in task["arguments"] if not a.startswith("values=")
+                ] + ["values=" + "|".join(values)]
+            tasks.append(task)
+        return tasks
+
+    @staticmethod
+    def _loop_split(graph, component, args):
+        try:
+            from dag import control_operator, substitute_args, task_arguments
+        except ImportError:
+            from .dag import control_operator, substitute_args, task_arguments
+
+        blocks = graph.blocks()
+        for opener in component:
+            task = graph.tasks[opener]
+            if control_operator(task) != "for" or graph.predecessors[opener]:
+                continue
+            block = blocks[opener]
+            arguments = task_arguments(task)
+            if block["end"] is None or arguments.get("parallel", "no").lower() != "yes":
+                continue
+            values = substitute_args(arguments.get("values", ""), args)
+            if not values or re.search(r"\$\d|@\{", values):
+                continue
+            values = values.split("|")
+            end = block["end"]
+            if len(values) < 2 or any(graph.argument(end, j) for j in graph.successors[end]):
+                continue
+            loop = set([opener] + block["body"])
+            join = set(graph.descendants(end))
+            if loop | join != set(component):
+                continue
+            # the join must not depend on the loop body except via the endfor
+            if any(j in loop and j != end for i in join for j in graph.predecessors[i]):
+                continue
+            return {
+                "for": opener,
+                "values": values,
+                "loop": sorted(loop),
+                "join": sorted(join),
+            }
+        return None
+
+
+class WorkflowGroup:
+    """
+    Aggregated handle of the workflows of a partitioned experiment
+
+    The parts are submitted in parallel; the join experiment, if any, is
+    submitted when all the parts have completed.
+
+    Construction::
+    g1 = WorkflowGroup(parts, join=join)
+
+    Parameters
+    ----------
+    parts : list of <class 'esdm_pav_client.experiment.Experiment'>
+        experiments to be executed in parallel
+    join : <class 'esdm_pav_client.experiment.Experiment'>, optional
+        experiment to be executed after all the parts have completed
+    endpoints : <class 'esdm_pav_client.routing.EndpointPool'>, optional
+        pool of runtimes the parts are balanced across
+    """
+
+    def __init__(self, parts, join=None, endpoints=None):
+        self.parts = parts
+        self.join = join
+        self.endpoints = endpoints
+        self.workflows = []
+        self.join_workflow = None
+        self._args = ()
+        self._server = "127.0.0.1"
+        self._port = "11732"
+        self._lock = threading.Lock()
+
+    @property
+    def workflow_ids(self):
+        """
+        Ids of the submitted workflows, join included
+        """
+        workflows = self.workflows + ([self.join_workflow] if self.join_workflow else [])
+        return [w.workflow_id for w in workflows]
+
+    def submit(self, *args, server="127.0.0.1", port="11732"):
+        """
+        Submit all the parts in parallel
+
+        Parameters
+        ----------
+        args : list
+            list of arguments to be substituted in the workflows
+        server : str, optional
+            ESDM-PAV runtime DNS/IP address, if no pool of runtimes is used
+        port : str, optional
+            ESDM-PAV runtime port, if no pool of runtimes is used
+
+        Returns
+        -------
+        workflow_ids : list
+            Returns the ids of the submitted parts
+        """
+        self._args = args
+        self._server = server
+        self._port = port
+        self.workflows = [self._workflow(e) for e in self.parts]
+        with ThreadPoolExecutor(max_workers=max(1, len(self.workflows))) as executor:
+            list(executor.map(self._submit, self.workflows))
+        return [w.workflow_id for w in self.workflows]
+
+    def status(self):
+        """
+        Return the aggregated status of the group and submit the join
+        experiment once all the parts have completed
+
+        Returns
+        -------
+        workflow_status : <class 'str'>
+            Returns OPH_STATUS_ERROR if a workflow failed, the status of the
+            join if it was submitted, OPH_STATUS_RUNNING while some parts are
+            still running or their status is unknown (None) and
+            OPH_STATUS_COMPLETED at the end
+        """
+        try:
+            from workflow import Workflow
+        except ImportError:
+            from .workflow import Workflow
+
+        with self._lock:
+            if self.join_workflow is not None:
+                status = self._status(self.join_workflow)
+                return status if status is not None else "OPH_STATUS_RUNNING"
+            statuses = [self._status(w) for w in self.workflows]
+            if any(re.match("(?i).*(ERROR|ABORTED)", str(s)) for s in statuses):
+                return "OPH_STATUS_ERROR"
+            if any(s is None or re.match(Workflow.running_statuses, str(s)) for s in statuses):
+                return "OPH_STATUS_RUNNING"
+            if self.join is None:
+                return "OPH_STATUS_COMPLETED"
+            self.join_workflow = self._workflow(self.join)
+            self._submit(self.join_workflow)
+            return "OPH_STATUS_RUNNING"
+
+    def monitor(self, frequency=10, iterative=True):
+        """
+        Monitor the group until all its workflows have ended
+
+        Parameters
+        ----------
+        frequency : int
+            The frequency in seconds to receive the updates
+        iterative: bool
+            True for receiving updates periodically, based on the frequency, or
+            False to receive updates only once
+
+        Returns
+        -------
+        workflow_status : <class 'str'>
+            Returns the aggregated status
+        """
+        import time
+
+        try:
+            from workflow import Workflow
+        except ImportError:
+            from .workflow import Workflow
+
+        while True:
+            status = self.status()
+            if not iterative or not re.match(Workflow.running_statuses, status):
+                return status
+            time.sleep(frequency)
+
+    def cancel(self):
+        """
+        Cancel all the workflows of the group
+        """
+        for w in self.workflows + ([self.join_workflow] if self.join_workflow else []):
+            w.cancel()
+
+    def _workflow(self, experiment):
+        try:
+            from workflow import Workflow
+        except ImportError:
+            from .workflow import Workflow
+
+        return Workflow(experiment, endpoints=self.endpoints)
+
+    def _submit(self, workflow):
+        return workflow.submit(*self._args, server=self._server, port=self._port)
+
+    @staticmethod
+    def _status(workflow):
+        return workflow.status()
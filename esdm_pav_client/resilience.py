@@ -0,0 +1,367 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+
+
+class RuntimeCallError(AttributeError):
+    """
+    Raised when a call to the ESDM-PAV runtime fails
+
+    Parameters
+    ----------
+    message : str
+        error description
+    transient : bool, optional
+        True if the call may succeed when repeated (e.g. connection refused
+        or timed out), False if the runtime rejected the request
+    delivered : bool, optional
+        False only if the request certainly did not reach the runtime
+    """
+
+    def __init__(self, message, transient=True, delivered=True):
+        super().__init__(message)
+        self.transient = transient
+        self.delivered = delivered
+
+
+class CircuitOpenError(RuntimeCallError):
+    """
+    Raised without contacting the runtime while its circuit breaker is open
+    """
+
+    def __init__(self, endpoint):
+        super().__init__(
+            "runtime {0} is unavailable, circuit breaker is open".format(endpoint),
+            transient=False,
+            delivered=False,
+        )
+        self.endpoint = endpoint
+
+
+def classify_error(error):
+    """
+    Classify an error raised by a runtime call
+
+    Parameters
+    ----------
+    error : Exception
+        the error raised by the call
+
+    Returns
+    -------
+    (transient, delivered) : tuple of bool
+        Returns whether the error is transient and whether the request may
+        have reached the runtime
+    """
+    if isinstance(error, RuntimeCallError):
+        return error.transient, error.delivered
+    if isinstance(error, ConnectionRefusedError):
+        return True, False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True, True
+    if isinstance(error, OSError):
+        return True, True
+    return False, True
+
+
+class RetryPolicy:
+    """
+    Retry policy with exponential backoff and full jitter
+
+    Construction::
+    policy = RetryPolicy(max_attempts=4, base_delay=0.5, max_delay=30)
+
+    Parameters
+    ----------
+    max_attempts : int, optional
+        maximum number of attempts of a call, 1 disables the retries
+    base_delay : int or float, optional
+        delay in seconds before the first retry
+    max_delay : int or float, optional
+        upper bound of the delay in seconds between two attempts
+    multiplier : int or float, optional
+        growth factor of the delay after each attempt
+    jitter : bool, optional
+        True to draw each delay uniformly between 0 and its upper bound
+    retry_ambiguous : bool, optional
+        True to retry non-idempotent calls (e.g. wsubmit) even when the
+        failed request may have reached the runtime. This can lead to
+        duplicated submissions.
+
+    Raises
+    ------
+    AttributeError
+        If one of the parameters has the wrong type or value
+    """
+
+    def __init__(
+        self,
+        max_attempts=4,
+        base_delay=0.5,
+        max_delay=30,
+        multiplier=2,
+        jitter=True,
+        retry_ambiguous=False,
+    ):
+        if not isinstance(max_attempts, int) or max_attempts < 1:
+            raise AttributeError("max_attempts must be a positive int")
+        for name, value in [
+            ("base_delay", base_delay),
+            ("max_delay", max_delay),
+            ("multiplier", multiplier),
+        ]:
+            if not isinstance(value, (int, float)) or value < 0:
+                raise AttributeError("{0} must be a non-negative number".format(name))
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retry_ambiguous = retry_ambiguous
+
+    def delay(self, attempt):
+        """
+        Return the delay in seconds to wait after the given failed attempt
+
+        Parameters
+        ----------
+        attempt : int
+            number of the failed attempt, starting from 1
+        """
+        bound = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return random.uniform(0, bound) if self.jitter else bound
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of a single runtime endpoint
+
+    The breaker opens after failure_threshold consecutive failures and
+    rejects the calls until reset_timeout seconds have passed. Then a single
+    trial call is let through: the breaker closes if it succeeds and opens
+    again if it fails.
+
+    Parameters
+    ----------
+    failure_threshold : int, optional
+        number of consecutive failures that opens the breaker
+    reset_timeout : int or float, optional
+        seconds to wait before letting a trial call through
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Return True if a call can be made now
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        """
+        Record a failed call
+
+        Returns
+        -------
+        tripped : bool
+            Returns True if this failure opened the breaker
+        """
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.failures >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.trips += 1
+                return True
+            return False
+
+
+class Resilience:
+    """
+    Retries, backoff and per-endpoint circuit breakers around the calls to
+    the ESDM-PAV runtime (connect, submit, resume and cancel)
+
+    Calls made with an idempotency key are never sent twice: once a call with
+    that key succeeds, its result is returned again instead of repeating the
+    call, and a failure after which the request may have reached the runtime
+    is only retried if the retry policy allows ambiguous retries.
+
+    Construction::
+    resilience = Resilience(policy=RetryPolicy(max_attempts=5),
+                            failure_threshold=5, reset_timeout=30)
+
+    Parameters
+    ----------
+    policy : <class 'esdm_pav_client.resilience.RetryPolicy'>, optional
+        retry policy, the default one if None
+    failure_threshold : int, optional
+        consecutive failures that open the circuit breaker of an endpoint
+    reset_timeout : int or float, optional
+        seconds before an open circuit breaker lets a trial call through
+    max_keys : int, optional
+        number of idempotency keys remembered
+    """
+
+    def __init__(self, policy=None, failure_threshold=5, reset_timeout=30, max_keys=4096):
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_keys = max_keys
+        self.sleep = time.sleep
+        self._breakers = {}
+        self._metrics = {}
+        self._completed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def breaker(self, endpoint):
+        """
+        Return the circuit breaker of the given endpoint
+        """
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(
+                    failure_threshold=self.failure_threshold,
+                    reset_timeout=self.reset_timeout,
+                )
+                self._metrics[endpoint] = {
+                    "calls": 0,
+                    "successes": 0,
+                    "failures": 0,
+                    "retries": 0,
+                    "rejected": 0,
+                    "trips": 0,
+                    "deduplicated": 0,
+                }
+            return self._breakers[endpoint]
+
+    def _count(self, endpoint, metric):
+        with self._lock:
+            self._metrics[endpoint][metric] += 1
+
+    def call(self, endpoint, operation, function, idempotency_key=None):
+        """
+        Call function with retries and circuit breaking
+
+        Parameters
+        ----------
+        endpoint : str
+            ESDM-PAV runtime address, as "server:port"
+        operation : str
+            name of the operation, used in error messages
+        function : callable
+            function without arguments performing the call
+        idempotency_key : str, optional
+            key of a non-idempotent call (e.g. a wsubmit)
+
+        Returns
+        -------
+        result : any
+            Returns the result of function
+
+        Raises
+        ------
+        CircuitOpenError
+            If the circuit breaker of the endpoint is open
+        RuntimeCallError
+            If the call failed and cannot be retried
+        """
+        breaker = self.breaker(endpoint)
+        if idempotency_key is not None:
+            with self._lock:
+                if idempotency_key in self._completed:
+                    self._metrics[endpoint]["deduplicated"] += 1
+                    return self._completed[idempotency_key]
+        attempt = 0
+        while True:
+            attempt += 1
+            if not breaker.allow():
+                self._count(endpoint, "rejected")
+                raise CircuitOpenError(endpoint)
+            self._count(endpoint, "calls")
+            try:
+                result = function()
+            except Exception as e:
+                transient, delivered = classify_error(e)
+                self._count(endpoint, "failures")
+                if not transient:
+                    # the runtime answered: the endpoint is up, and a trial
+                    # call of a half-open breaker must not stay pending
+                    breaker.record_success()
+                elif breaker.record_failure():
+                    self._count(endpoint, "trips")
+                retry = transient and attempt < self.policy.max_attempts
+                if idempotency_key is not None and delivered:
+                    retry = retry and self.policy.retry_ambiguous
+                if not retry:
+                    raise
+                self._count(endpoint, "retries")
+                self.sleep(self.policy.delay(attempt))
+                continue
+            breaker.record_success()
+            self._count(endpoint, "successes")
+            if idempotency_key is not None:
+                with self._lock:
+                    self._completed[idempotency_key] = result
+                    while len(self._completed) > self.max_keys:
+                        self._completed.popitem(last=False)
+            return result
+
+    def metrics(self, endpoint=None):
+        """
+        Return the call metrics
+
+        Parameters
+        ----------
+        endpoint : str, optional
+            endpoint to be reported, all the endpoints if None
+
+        Returns
+        -------
+        metrics : dict
+            Returns calls, successes, failures, retries, rejected calls,
+            circuit breaker trips and deduplicated calls, together with the
+            breaker state, per endpoint
+        """
+        with self._lock:
+            report = {
+                k: dict(self._metrics[k], state=self._breakers[k].state) for k in self._metrics
+            }
+        if endpoint is not None:
+            return report.get(endpoint)
+        return report
+
+
+shared_resilience = Resilience()
@@ -0,0 +1,303 @@
+import itertools
+import json
+import os
+import threading
+
+
+class Endpoint:
+    """
+    Address of an ESDM-PAV runtime
+
+    Parameters
+    ----------
+    server : str
+        ESDM-PAV runtime DNS/IP address
+    port : str, optional
+        ESDM-PAV runtime port
+    weight : int, optional
+        relative share of the workflows routed to the runtime
+    """
+
+    def __init__(self, server, port="11732", weight=1):
+        if not isinstance(server, str) or not server:
+            raise AttributeError("server should be {0}".format(str))
+        if not isinstance(weight, int) or weight < 1:
+            raise AttributeError("weight must be a positive int")
+        self.server = server
+        self.port = str(port)
+        self.weight = weight
+
+    @staticmethod
+    def parse(value):
+        """
+        Build an endpoint from an Endpoint, a "server:port" string, a
+        (server, port[, weight]) tuple or a dict with server, port and weight
+        keys
+        """
+        if isinstance(value, Endpoint):
+            return value
+        if isinstance(value, str):
+            server, _, port = value.partition(":")
+            return Endpoint(server, port or "11732")
+        if isinstance(value, (tuple, list)):
+            return Endpoint(*value)
+        if isinstance(value, dict):
+            return Endpoint(**value)
+        raise AttributeError("Unknown endpoint: {0}".format(value))
+
+    def __str__(self):
+        return "{0}:{1}".format(self.server, self.port)
+
+    def __repr__(self):
+        return "Endpoint({0}, weight={1})".format(str(self), self.weight)
+
+
+class EndpointPool:
+    """
+    Pool of ESDM-PAV runtimes the workflows are balanced across
+
+    The runtime of each submission is chosen with the routing policy:
+
+    - round_robin: the runtimes are used in turn
+    - least_in_flight: the runtime with the fewest running workflows per unit
+      of weight is used
+    - weighted: smooth weighted round robin, each runtime receives a share of
+      the workflows proportional to its weight
+
+    The runtime chosen for each workflow is recorded, and persisted to
+    state_file if any, so that the workflow can later be monitored and
+    cancelled on the right runtime. Each runtime numbers its workflows on its
+    own, so the same workflow id can be assigned to several runtimes. Once
+    there are more than max_assignments of them, the assignments of the
+    ended workflows are forgotten, the oldest first.
+
+    Construction::
+    p1 = EndpointPool(["10.0.0.1:11732", ("10.0.0.2", "11732", 2)],
+                      policy="weighted")
+
+    Parameters
+    ----------
+    endpoints : list
+        runtimes of the pool, see Endpoint.parse for the accepted formats
+    policy : str, optional
+        routing policy: round_robin, least_in_flight or weighted
+    state_file : str, optional
+        path of the JSON file where the workflow assignments are persisted
+    max_assignments : int, optional
+        number of workflow ids whose assignment is kept after they ended
+
+    Raises
+    ------
+    AttributeError
+        If the pool is empty, the policy is unknown or max_assignments is not
+        a positive int
+    """
+
+    policies = ["round_robin", "least_in_flight", "weighted"]
+
+    def __init__(self, endpoints, policy="round_robin", state_file=None, max_assignments=10000):
+        if policy not in self.policies:
+            raise AttributeError("Unknown routing policy: {0}".format(policy))
+        if not isinstance(max_assignments, int) or max_assignments < 1:
+            raise AttributeError("max_assignments must be a positive int")
+        self.endpoints = [Endpoint.parse(e) for e in endpoints]
+        if not self.endpoints:
+            raise AttributeError("endpoints must contain at least one runtime")
+        self.policy = policy
+        self.state_file = state_file
+        self.max_assignments = max_assignments
+        # workflow id -> runtimes, as "server:port", with a workflow of that
+        # id, from the least to the most recently assigned
+        self.assignments = {}
+        self._in_flight = {str(e): 0 for e in self.endpoints}
+        self._current_weights = {str(e): 0 for e in self.endpoints}
+        self._turn = itertools.cycle(self.endpoints)
+        self._lock = threading.Lock()
+        # (workflow id, endpoint) of the running workflows
+        self._running = set()
+        if state_file is not None and os.path.isfile(state_file):
+            with open(state_file, "r") as f:
+                state = json.loads(f.read())
+            self.assignments = state["assignments"]
+            for workflow_id, endpoint in state["in_flight"]:
+                self._running.add((workflow_id, endpoint))
+                if endpoint in self._in_flight:
+                    self._in_flight[endpoint] += 1
+
+    def choose(self, exclude=()):
+        """
+        Choose the runtime of the next submission
+
+        Parameters
+        ----------
+        exclude : list, optional
+            endpoints, as "server:port", that must not be chosen
+
+        Returns
+        -------
+        endpoint : <class 'esdm_pav_client.routing.Endpoint'>
+            Returns the chosen runtime, or None if all of them are excluded
+        """
+        candidates = [e for e in self.endpoints if str(e) not in exclude]
+        if not candidates:
+            return None
+        with self._lock:
+            if self.policy == "round_robin":
+                while True:
+                    endpoint = next(self._turn)
+                    if endpoint in candidates:
+                        return endpoint
+            if self.policy == "least_in_flight":
+                return min(candidates, key=lambda e: self._in_flight[str(e)] / e.weight)
+            total = sum(e.weight for e in candidates)
+            for e in candidates:
+                self._current_weights[str(e)] += e.weight
+            endpoint = max(candidates, key=lambda e: self._current_weights[str(e)])
+            self._current_weights[str(endpoint)] -= total
+            return endpoint
+
+    def assign(self, workflow_id, endpoint):
+        """
+        Record that the workflow runs on the given runtime
+        """
+        key = (str(workflow_id), str(endpoint))
+        with self._lock:
+            endpoints = self.assignments.pop(key[0], [])
+            self.assignments[key[0]] = endpoints
+            if key[1] not in endpoints:
+                endpoints.append(key[1])
+            if key not in self._running and key[1] in self._in_flight:
+                self._running.add(key)
+                self._in_flight[key[1]] += 1
+            self._prune()
+            self._save()
+
+    def release(self, workflow_id, endpoint):
+        """
+        Record that the workflow of the given runtime is no longer running
+        """
+        key = (str(workflow_id), str(endpoint))
+        with self._lock:
+            if key not in self._running:
+                return
+            self._running.discard(key)
+            if key[1] in self._in_flight:
+                self._in_flight[key[1]] -= 1
+            self._prune()
+            self._save()
+
+    def endpoint_for(self, workflow_id):
+        """
+        Return the runtime of the workflow
+
+        Returns
+        -------
+        endpoint : <class 'esdm_pav_client.routing.Endpoint'>
+            Returns the runtime the workflow was submitted to, or None if the
+            workflow is unknown
+
+        Raises
+        ------
+        AttributeError
+            If workflows with this id were submitted to several runtimes
+        """
+        endpoints = self.assignments.get(str(workflow_id), [])
+        if not endpoints:
+            return None
+        if len(endpoints) > 1:
+            raise AttributeError(
+                "Workflow {0} is assigned to several runtimes: {1}".format(
+                    workflow_id, ", ".join(endpoints)
+                )
+            )
+        for e in self.endpoints:
+            if str(e) == endpoints[0]:
+                return e
+        return Endpoint.parse(endpoints[0])
+
+    def in_flight(self):
+        """
+        Return the number of running workflows per runtime
+        """
+        with self._lock:
+            return dict(self._in_flight)
+
+    def _prune(self):
+        # forget the oldest assignments of the ended workflows beyond the limit
+        excess = len(self.assignments) - self.max_assignments
+        if excess <= 0:
+            return
+        running = {workflow_id for workflow_id, _ in self._running}
+        for workflow_id in list(self.assignments):
+            if excess <= 0:
+                return
+            if workflow_id not in running:
+                del self.assignments[workflow_id]
+                excess -= 1
+
+    def _save(self):
+        if self.state_file is None:
+            return
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, "w") as fp:
+            json.dump({"assignments": self.assignments, "in_flight": sorted(self._running)}, fp)
+        os.replace(tmp_file, self.state_file)
+
+    @staticmethod
+    def load(file):
+        """
+        Load a pool from an endpoints file
+
+        The file is either a JSON document like
+        {"policy": "weighted", "endpoints": [{"server": "10.0.0.1",
+        "port": "11732", "weight": 2}], "state_file": "assignments.json",
+        "max_assignments": 10000}
+        or a text file with a "server:port [weight]" line per runtime. The
+        assignments are persisted to state_file, or to the endpoints file
+        path followed by ".state" if not given.
+
+        Parameters
+        ----------
+        file : str
+            The path of the endpoints file
+
+        Returns
+        -------
+        pool : <class 'esdm_pav_client.routing.EndpointPool'>
+            Returns the pool described by the file
+
+        Raises
+        ------
+        IOError
+            Raises IOError if the file does not exist
+
+        Example
+        -------
+        p1 = EndpointPool.load("endpoints.json")
+        """
+        if not os.path.isfile(file):
+            raise IOError("File does not exist")
+        with open(file, "r") as f:
+            content = f.read()
+        state_file = file + ".state"
+        try:
+            data = json.loads(content)
+        except json.decoder.JSONDecodeError:
+            endpoints = []
+            for line in content.splitlines():
+                fields = line.split("#")[0].split()
+                if not fields:
+                    continue
+                endpoint = Endpoint.parse(fields[0])
+                if len(fields) > 1:
+                    endpoint = Endpoint(endpoint.server, endpoint.port, int(fields[1]))
+                endpoints.append(endpoint)
+            return EndpointPool(endpoints, state_file=state_file)
+        if isinstance(data, list):
+            return EndpointPool(data, state_file=state_file)
+        return EndpointPool(
+            data["endpoints"],
+            policy=data.get("policy", "round_robin"),
+            state_file=data.get("state_file", state_file),
+            max_assignments=data.get("max_assignments", 10000),
+        )
@@ -0,0 +1,322 @@
+import heapq
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+
+class SubmissionScheduler:
+    """
+    Client-side admission control for ESDM-PAV experiments
+
+    Experiments are queued with a priority and submitted only while the
+    number of workflows in flight on their runtime is below max_in_flight.
+    Running workflows are monitored and, as they complete, the next pending
+    experiments are released. The queue is persisted to state_file, if any,
+    so that a restarted scheduler resumes the pending and running work. The
+    experiments being submitted are marked as such in state_file: on restart,
+    they are looked up in the history, if any, and only submitted again if no
+    workflow of theirs was recorded since the mark.
+
+    Construction::
+    s1 = SubmissionScheduler(max_in_flight=4, state_file="queue.json")
+
+    Parameters
+    ----------
+    max_in_flight : int, optional
+        maximum number of running workflows per runtime endpoint
+    state_file : str, optional
+        path of the JSON file where the queue is persisted
+    history : <class 'esdm_pav_client.history.HistoryStore'>, optional
+        local history where the submissions are recorded, used to reconcile
+        the experiments interrupted while being submitted; these are
+        submitted again if None
+
+    Raises
+    ------
+    AttributeError
+        If max_in_flight is not a positive int
+
+    Example
+    -------
+    s1 = SubmissionScheduler(max_in_flight=2)
+    s1.enqueue(e1, "2000|2001", priority=1)
+    s1.enqueue(e2, priority=0, server="127.0.0.1", port="11732")
+    results = s1.run(frequency=10)
+    """
+
+    def __init__(self, max_in_flight=4, state_file=None, history=None):
+        if not isinstance(max_in_flight, int) or max_in_flight < 1:
+            raise AttributeError("max_in_flight must be a positive int")
+        self.max_in_flight = max_in_flight
+        self.state_file = state_file
+        self.history = history
+        self.results = {}
+        self._pending = []
+        self._running = {}
+        self._sequence = 0
+        self._lock = threading.RLock()
+        if state_file is not None and os.path.isfile(state_file):
+            self._restore()
+
+    @property
+    def pending(self):
+        """
+        Keys of the pending experiments, in submission order
+        """
+        with self._lock:
+            return [entry["key"] for _, _, entry in sorted(self._pending)]
+
+    @property
+    def running(self):
+        """
+        Dict of the running workflows, key -> workflow id
+        """
+        with self._lock:
+            return {k: e["workflow_id"] for k, e in self._running.items()}
+
+    def in_flight(self, server="127.0.0.1", port="11732"):
+        """
+        Return the number of running workflows on the given runtime
+        """
+        endpoint = "{0}:{1}".format(server, port)
+        with self._lock:
+            return len([e for e in self._running.values() if self._endpoint(e) == endpoint])
+
+    def enqueue(self, experiment, *args, priority=0, server="127.0.0.1", port="11732"):
+        """
+        Queue an experiment for submission
+
+        Parameters
+        ----------
+        experiment : <class 'esdm_pav_client.experiment.Experiment'>
+            experiment to be submitted
+        args : list
+            list of arguments to be substituted in the workflow
+        priority : int, optional
+            experiments with higher priority are submitted first, experiments
+            with the same priority in the order they were queued
+        server : str, optional
+            ESDM-PAV runtime DNS/IP address
+        port : str, optional
+            ESDM-PAV runtime port
+
+        Returns
+        -------
+        key : str
+            Returns the key identifying the queued experiment
+
+        Raises
+        ------
+        AttributeError
+            If one of the parameters has the wrong type
+        """
+        try:
+            from workflow import Workflow
+        except ImportError:
+            from .workflow import Workflow
+
+        if not isinstance(priority, int):
+            raise AttributeError("priority should be {0}".format(int))
+        entry = {
+            "key": str(uuid.uuid4()),
+            "priority": priority,
+            "document": Workflow(experiment).workflow_to_json(),
+            "args": [str(a) for a in args],
+            "server": server,
+            "port": port,
+        }
+        with self._lock:
+            self._push(entry)
+            self._save()
+        return entry["key"]
+
+    def poll(self):
+        """
+        Check the running workflows and submit the pending experiments that
+        fit within the in-flight limits
+
+        Returns
+        -------
+        submitted : dict
+            Returns the experiments submitted by this call, key -> workflow id
+        """
+        try:
+            from workflow import Workflow
+        except ImportError:
+            from .workflow import Workflow
+
+        with self._lock:
+            running = [e for e in self._running.values() if e.get("workflow_id") is not None]
+        for entry in running:
+            try:
+                status = self._status(entry)
+            except AttributeError:
+                continue
+            # an unknown status is not terminal: the workflow is polled again
+            if status is None:
+                continue
+            if not re.match(Workflow.running_statuses, str(status)):
+                with self._lock:
+                    del self._running[entry["key"]]
+                    self.results[entry["key"]] = status
+                    self._save()
+
+        submitted = {}
+        while True:
+            entry = self._reserve()
+            if entry is None:
+                return submitted
+            try:
+                workflow_id = self._submit(entry)
+            except AttributeError as e:
+                with self._lock:
+                    del self._running[entry["key"]]
+                    self.results[entry["key"]] = "ERROR: {0}".format(e)
+                    self._save()
+                continue
+            with self._lock:
+                entry["workflow_id"] = workflow_id
+                del entry["submitting"]
+                self._save()
+            submitted[entry["key"]] = workflow_id
+
+    def run(self, frequency=10):
+        """
+        Poll until all the queued experiments have completed
+
+        Parameters
+        ----------
+        frequency : int, optional
+            seconds between two polls
+
+        Returns
+        -------
+        results : dict
+            Returns the final status of each experiment, key -> status
+        """
+        while True:
+            self.poll()
+            with self._lock:
+                if not self._pending and not self._running:
+                    return dict(self.results)
+            time.sleep(frequency)
+
+    def _submit(self, entry):
+        try:
+            from experiment import Experiment
+            from workflow import Workflow
+        except ImportError:
+            from .experiment import Experiment
+            from .workflow import Workflow
+
+        w1 = Workflow(Experiment._from_dict(dict(entry["document"])), history=self.history)
+        return w1.submit(
+            *entry["args"], server=entry["server"], port=entry["port"], idempotency_key=entry["key"]
+        )
+
+    def _status(self, entry):
+        try:
+            from workflow import Workflow
+        except ImportError:
+            from .workflow import Workflow
+
+        w1 = Workflow(int(entry["workflow_id"]))
+        w1.server = entry["server"]
+        w1.port = entry["port"]
+        return w1.status()
+
+    def _reconcile(self, entry):
+        # return the id of the workflow recorded in the history for an entry
+        # interrupted while being submitted, None if it was not submitted
+        try:
+            from experiment import Experiment
+            from fingerprint import fingerprint
+        except ImportError:
+            from .experiment import Experiment
+            from .fingerprint import fingerprint
+
+        if self.history is None:
+            return None
+        claimed = [
+            e["workflow_id"]
+            for e in self._running.values()
+            if self._endpoint(e) == self._endpoint(entry)
+        ]
+        submissions = self.history.query(
+            since=entry["submitting"],
+            endpoint=self._endpoint(entry),
+            fingerprint=fingerprint(Experiment._from_dict(dict(entry["document"])), entry["args"]),
+        )
+        for submission in reversed(submissions):
+            if submission["workflow_id"] not in claimed:
+                return submission["workflow_id"]
+        return None
+
+    def _reserve(self):
+        # pop the first pending experiment whose runtime has a free slot and
+        # count it as running while it is being submitted
+        with self._lock:
+            held = []
+            entry = None
+            while self._pending:
+                item = heapq.heappop(self._pending)
+                if self.in_flight(item[2]["server"], item[2]["port"]) < self.max_in_flight:
+                    entry = item[2]
+                    entry["workflow_id"] = None
+                    entry["submitting"] = time.time()
+                    self._running[entry["key"]] = entry
+                    break
+                held.append(item)
+            for item in held:
+                heapq.heappush(self._pending, item)
+            self._save()
+            return entry
+
+    @staticmethod
+    def _endpoint(entry):
+        return "{0}:{1}".format(entry["server"], entry["port"])
+
+    def _push(self, entry):
+        self._sequence += 1
+        heapq.heappush(self._pending, (-entry["priority"], self._sequence, entry))
+
+    def _save(self):
+        if self.state_file is None:
+            return
+        state = {
+            "version": 1,
+            "pending": [entry for _, _, entry in sorted(self._pending)],
+            "running": list(self._running.values()),
+        }
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, "w") as fp:
+            json.dump(state, fp)
+        os.replace(tmp_file, self.state_file)
+
+    def _restore(self):
+        try:
+            with open(self.state_file, "r") as f:
+                state = json.loads(f.read())
+        except json.decoder.JSONDecodeError:
+            raise ValueError("File is not a valid JSON")
+        for entry in state["pending"]:
+            self._push(entry)
+        interrupted = []
+        for entry in state["running"]:
+            if entry.get("workflow_id") is None:
+                interrupted.append(entry)
+            else:
+                self._running[entry["key"]] = entry
+        for entry in interrupted:
+            # interrupted while being submitted: the workflow may have reached
+            # the runtime before the scheduler stopped
+            if "submitting" in entry:
+                entry["workflow_id"] = self._reconcile(entry)
+                del entry["submitting"]
+            if entry["workflow_id"] is None:
+                self._push(entry)
+            else:
+                self._running[entry["key"]] = entry
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+
+
+def _shard_name(path, i):
+    return "{0}.{1}.json".format(os.path.basename(path)[: -len(".json")], i)
+
+
+def save_shards(data, path, shards):
+    """
+    Save the dict of a PAV document as a manifest in path and up to shards
+    files with consecutive chunks of its tasks, next to the manifest
+
+    The shards are written before the manifest, so that a manifest never
+    refers to a missing shard.
+
+    Parameters
+    ----------
+    data : dict
+        PAV document, as returned by Experiment.wokrflow_to_json
+    path : str
+        path of the manifest, ending with .json
+    shards : int
+        maximum number of shards
+
+    Returns
+    -------
+    manifest : dict
+        Returns the manifest written in path
+    """
+    tasks = data.get("tasks", [])
+    size = max(1, -(-len(tasks) // shards))
+    directory = os.path.dirname(path)
+    entries = []
+    for i, start in enumerate(range(0, len(tasks), size)):
+        content = json.dumps(tasks[start : start + size]).encode("utf-8")
+        name = _shard_name(path, i)
+        with open(os.path.join(directory, name), "wb") as fp:
+            fp.write(content)
+        entries.append(
+            {
+                "file": name,
+                "sha256": hashlib.sha256(content).hexdigest(),
+                "tasks": len(tasks[start : start + size]),
+            }
+        )
+    manifest = {k: v for k, v in data.items() if k != "tasks"}
+    manifest["task_shards"] = entries
+    with open(path, "w") as fp:
+        json.dump(manifest, fp, indent=4)
+    return manifest
+
+
+# minimum size of the shards parsed by each worker process: below it,
+# starting the workers and sending the tasks back to the calling process
+# costs more than the parsing saved
+parallel_bytes = 4 * 2**20
+
+
+def read_shard(path, digest):
+    """
+    Read a shard, check it against its hash and parse its tasks
+
+    Returns
+    -------
+    tasks : list of dict
+        Returns the dicts of the tasks of the shard, in order
+
+    Raises
+    ------
+    IOError
+        If the shard does not exist
+    ValueError
+        If the shard does not match its hash or is not a valid JSON
+    """
+    if not os.path.isfile(path):
+        raise IOError("Shard {0} does not exist".format(path))
+    with open(path, "rb") as fp:
+        content = fp.read()
+    if hashlib.sha256(content).hexdigest() != digest:
+        raise ValueError("Shard {0} does not match its hash".format(path))
+    try:
+        return json.loads(content)
+    except json.decoder.JSONDecodeError:
+        raise ValueError("Shard {0} is not a valid JSON".format(path))
+
+
+def parse_shard(path, digest):
+    """
+    Read, check and parse a shard in a worker process of load_shards
+
+    The tasks are sent back as the plain lists of their attributes (see
+    Experiment._task_columns) encoded by marshal, which the calling process
+    decodes and turns into tasks faster than Task objects or dicts.
+
+    Returns
+    -------
+    columns : bytes
+        Returns the attributes of the tasks of the shard, in order
+    """
+    import marshal
+
+    try:
+        from experiment import Experiment
+    except ImportError:
+        from .experiment import Experiment
+
+    return marshal.dumps(Experiment._task_columns(read_shard(path, digest)))
+
+
+def load_shards(manifest, directory, processes=None):
+    """
+    Build an experiment from a manifest written by save_shards, reading,
+    checking and parsing the shards in parallel over a process pool
+
+    The tasks are built from the parsed shards in the calling process, in a
+    bulk build of the experiment (see Experiment.bulk), so they are validated
+    once all of them are added. A worker process is only started per
+    parallel_bytes of shards, and at most one per CPU: the calling process
+    still decodes the result of the workers and builds the tasks, so the
+    pool only pays off for large experiments on several CPUs.
+
+    Parameters
+    ----------
+    manifest : dict
+        manifest of the experiment
+    directory : str
+        directory of the manifest, the shard files are relative to it
+    processes : int, optional
+        maximum number of worker processes, the number of CPUs if None; the
+        shards are parsed in the calling process if 1
+
+    Returns
+    -------
+    experiment : <class 'esdm_pav_client.experiment.Experiment'>
+        Returns the experiment with the tasks of all the shards
+
+    Raises
+    ------
+    AttributeError
+        If processes is not a positive int or the manifest has no name
+    """
+    try:
+        from experiment import Experiment
+    except ImportError:
+        from .experiment import Experiment
+
+    if processes is not None and (not isinstance(processes, int) or processes < 1):
+        raise AttributeError("processes must be a positive int")
+    if "name" not in manifest.keys():
+        raise AttributeError("experiment doesn't have a key")
+    entries = manifest["task_shards"]
+    paths = [os.path.join(directory, e["file"]) for e in entries]
+    digests = [e["sha256"] for e in entries]
+    size = sum(os.path.getsize(p) for p in paths if os.path.isfile(p))
+    cpus = os.cpu_count() or 1
+    workers = min(processes or cpus, cpus, len(entries), size // parallel_bytes)
+    experiment = Experiment(name=manifest["name"])
+    experiment.__dict__.update(
+        {k: v for k, v in manifest.items() if k not in ["name", "task_shards"]}
+    )
+    with experiment.bulk():
+        if workers > 1:
+            import marshal
+            from concurrent.futures import ProcessPoolExecutor
+
+            # the tasks of a shard are built while the next ones are parsed
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for chunk in executor.map(parse_shard, paths, digests):
+                    for task in Experiment._tasks_from_columns(marshal.loads(chunk)):
+                        experiment.addTask(task)
+        else:
+            for path, digest in zip(paths, digests):
+                for task in Experiment._tasks_from_dicts(read_shard(path, digest)):
+                    experiment.addTask(task)
+    return experiment
@@ -0,0 +1,155 @@
+import json
+import re
+
+# task statuses in the order of the bits of the status_filter argument of
+# oph_resume
+filter_statuses = [
+    "PENDING",
+    "WAITING",
+    "RUNNING",
+    "COMPLETED",
+    "ERROR",
+    "ABORTED",
+    "SKIPPED",
+    "UNSELECTED",
+]
+
+# runtimes ("server:port") that rejected the status_filter argument, whose
+# statuses are filtered by the client only
+unsupported_filters = set()
+
+_decoder = json.JSONDecoder()
+_space = re.compile(r"[ \t\n\r]*")
+
+
+def _skip(text, i):
+    return _space.match(text, i).end()
+
+
+def _value(text, objkey, key):
+    # position of the value of key in the object of objkey, None if the
+    # layout is not the usual one (objkey before the content of the object)
+    match = re.search(r'"objkey"\s*:\s*"{0}"'.format(re.escape(objkey)), text)
+    if match is None:
+        return None
+    end = text.find('"objkey"', match.end())
+    i = text.find('"{0}"'.format(key), match.end(), end if end != -1 else len(text))
+    if i == -1:
+        return None
+    i = _skip(text, i + len(key) + 2)
+    if text[i : i + 1] != ":":
+        return None
+    return _skip(text, i + 1)
+
+
+def _parsed(text, objkey):
+    for res in json.loads(text).get("response", []):
+        if res.get("objkey") == objkey and res.get("objcontent"):
+            return res["objcontent"][0]
+    return {}
+
+
+def stream_message(text, objkey="workflow_status"):
+    """
+    Return the message of objkey in the text of a runtime response, without
+    parsing the rest of the response
+    """
+    i = _value(text, objkey, "message")
+    if i is None:
+        return _parsed(text, objkey).get("message")
+    return _decoder.raw_decode(text, i)[0]
+
+
+def stream_grid(text, objkey="workflow_list", lazy=True):
+    """
+    Return the row keys of the grid objkey in the text of a runtime response
+    and an iterator over its rows, without parsing the other objects of the
+    response; the response is parsed as a whole only if its layout is not
+    the usual one
+
+    Parameters
+    ----------
+    text : str
+        text of the runtime response
+    objkey : str, optional
+        objkey of the grid
+    lazy : bool, optional
+        True to decode the rows one at a time, so that the iteration can stop
+        early without decoding the following rows, False to decode them at
+        once (faster when all the rows are needed)
+
+    Returns
+    -------
+    (rowkeys, rows) : tuple
+        Returns the row keys, None if the response has no such grid, and the
+        iterator over the row values
+    """
+    keys = _value(text, objkey, "rowkeys")
+    values = _value(text, objkey, "rowvalues")
+    if keys is None or values is None or text[values : values + 1] != "[":
+        content = _parsed(text, objkey)
+        return content.get("rowkeys"), iter(content.get("rowvalues", []))
+
+    def _rows(i):
+        i = _skip(text, i + 1)
+        if text[i : i + 1] == "]":
+            return
+        while True:
+            row, i = _decoder.raw_decode(text, i)
+            yield row
+            i = _skip(text, i)
+            if text[i : i + 1] != ",":
+                return
+            i = _skip(text, i + 1)
+
+    rowkeys = _decoder.raw_decode(text, keys)[0]
+    if not lazy:
+        return rowkeys, iter(_decoder.raw_decode(text, values)[0])
+    return rowkeys, _rows(values)
+
+
+def status_filter(states):
+    """
+    Return the status_filter bitmap of oph_resume selecting the given task
+    states (e.g. "RUNNING" or "OPH_STATUS_RUNNING"), None if a state has no bit
+    """
+    bits = ["0"] * len(filter_statuses)
+    for state in states:
+        for n, name in enumerate(filter_statuses):
+            if str(state).upper().endswith(name):
+                bits[n] = "1"
+                break
+        else:
+            return None
+    return "".join(bits)
+
+
+class TaskStatusPage:
+    """
+    Task statuses returned by Workflow.task_statuses
+
+    Attributes
+    ----------
+    workflow_status : str
+        status of the workflow
+    tasks : dict
+        task name -> task status of the selected tasks, in the order of the
+        runtime
+    marker : int
+        marker of the query, to ask for the changes since it
+    next_offset : int
+        offset of the next page, None if this is the last page
+    filtered : bool
+        True if the runtime filtered the tasks by status, False if only the
+        client did
+    """
+
+    def __init__(self, workflow_status, tasks, marker, next_offset=None, filtered=False):
+        self.workflow_status = workflow_status
+        self.tasks = tasks
+        self.marker = marker
+        self.next_offset = next_offset
+        self.filtered = filtered
+
+    def __repr__(self):
+        return "<TaskStatusPage: {0}, {1} tasks>".format(self.workflow_status, len(self.tasks))
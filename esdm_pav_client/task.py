@@ -1,3 +1,9 @@
+try:
+    from dependencies import DependencyList
+except ImportError:
+    from .dependencies import DependencyList
+
+
 class Task:
     """
     Creates a Task object that can be embedded in a ESDM-PAV experiment
@@ -32,7 +38,7 @@ class Task:
         self.name = name
         self.operator = operator
         self.arguments = ["{0}={1}".format(k, arguments[k]) for k in arguments.keys()]
-        self.dependencies = []
+        self.dependencies = DependencyList()
         self.__dict__.update(kwargs)
 
     def deinit(self):
@@ -74,11 +80,40 @@ class Task:
                 raise AttributeError("task must be Task object")
 
         parameter_check(task, argument)
-        dependency_dict = {}
-        if argument:
-            dependency_dict["argument"] = argument
-        dependency_dict["task"] = task.__dict__["name"]
-        self.dependencies.append(dependency_dict)
+        self._dependency_list().extend_names([task.__dict__["name"]], argument)
+        self._changed()
+
+    def addDependencies(self, tasks, argument=None):
+        """
+        Adds all the tasks as dependencies of the current one, with the same
+        argument, e.g. for a task gathering the outputs of many others
+
+        Parameters
+        ----------
+        tasks : list of <class 'esdm_pav_client.task.Task'>
+            tasks the current one depends on
+        argument : str, optional
+            argument to be set with the outputs of the tasks
+
+        Raises
+        ------
+        AttributeError
+            When one of the parameters has the wrong type
+
+        Example
+        -------
+        t4 = Task(name="Merge", operator='oph_mergecubes2',
+                    arguments={'dim': 'new_dim'})
+        t4.addDependencies([t1, t2, t3], "cubes")
+        """
+        if argument is not None and not isinstance(argument, str):
+            raise AttributeError("argument must be string")
+        tasks = list(tasks)
+        for task in tasks:
+            if not isinstance(task, Task):
+                raise AttributeError("task must be Task object")
+        self._dependency_list().extend_names([t.__dict__["name"] for t in tasks], argument)
+        self._changed()
 
     def copyDependency(self, dependency):
         """
@@ -90,7 +125,20 @@ class Task:
         dependency : dict
             Copy a dependency to a task
         """
-        self.dependencies.append(dependency)
+        self._dependency_list().append(dependency)
+        self._changed()
+
+    def _dependency_list(self):
+        # dependencies assigned as a list of dicts are converted back
+        if not isinstance(self.dependencies, DependencyList):
+            self.dependencies = DependencyList(self.dependencies)
+        return self.dependencies
+
+    def _changed(self):
+        # drop the cached graph of the experiment the task belongs to
+        experiment = self.__dict__.get("_experiment")
+        if experiment is not None:
+            experiment.invalidate()
 
     def reverted_arguments(self):
         """
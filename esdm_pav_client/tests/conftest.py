@@ -0,0 +1,71 @@
+from esdm_pav_client import ConnectionPool
+import itertools
+import json
+import pytest
+
+"""Fake runtime shared by the tests: the clients of its connection pool
+   simulate PyOphidia, so that no runtime is needed"""
+
+
+class FakeClient:
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.last_jobid = None
+        self.last_response = None
+        self.last_return_value = 0
+
+    def wsubmit(self, document, *args):
+        self.runtime.documents.append(document)
+        self.last_return_value = 0
+        self.last_response = "{}"
+        self.last_jobid = "https://host/ophidia?{0}#".format(next(self.runtime.ids))
+
+    def submit(self, query):
+        response = self.runtime.respond(query)
+        self.runtime.queries.append(query)
+        if response is None:
+            self.last_return_value = 1
+            response = {"response": [{"objkey": "error"}]}
+        else:
+            self.last_return_value = 0
+        self.last_response = response if isinstance(response, str) else json.dumps(response)
+
+
+class FakeRuntime(ConnectionPool):
+    """
+    Connection pool whose clients simulate a runtime
+
+    Parameters
+    ----------
+    respond : function, optional
+        function answering a query with the response (a dict or its JSON
+        text), None for an error, or raising to simulate a connection failure;
+        every query is answered with an error if None
+    first_id : int, optional
+        id of the first submitted workflow, the next ones are consecutive
+    down : bool, optional
+        True if the runtime cannot be connected to
+    max_idle : int, optional
+        maximum number of idle clients kept by the pool
+    """
+
+    def __init__(self, respond=None, first_id=1, down=False, max_idle=8):
+        super().__init__(max_idle=max_idle)
+        self.respond = respond if respond is not None else lambda query: None
+        self.ids = itertools.count(first_id)
+        self.down = down
+        self.documents = []
+        self.queries = []
+
+    def _connect(self, username, password, server, port, project):
+        if self.down:
+            raise AttributeError("runtime down")
+        return FakeClient(self)
+
+
+@pytest.fixture
+def fake_runtime():
+    """
+    Factory of FakeRuntime connection pools
+    """
+    return FakeRuntime
@@ -0,0 +1,154 @@
+from esdm_pav_client import Experiment
+from esdm_pav_client.batch import WorkflowBatch
+from esdm_pav_client.cli.client import run
+from esdm_pav_client.connections import ConnectionPool
+from click.testing import CliRunner
+import json
+import pytest
+
+
+@pytest.fixture
+def documents(tmp_path):
+    for n in range(3):
+        e1 = Experiment(name="Batch {0}".format(n), author="Author_name", abstract="Batch")
+        t1 = e1.newTask(name="Import", operator="oph_importnc", arguments={"input": "$1"})
+        e1.newTask(name="Reduce", operator="oph_reduce", arguments={}, dependencies={t1: "cube"})
+        e1.save(str(tmp_path / "experiment_{0}.json".format(n)))
+    with open(str(tmp_path / "experiment_3.json"), "w") as f:
+        json.dump(
+            {
+                "name": "Broken",
+                "tasks": [
+                    {"name": "A", "operator": "oph_list", "arguments": [], "dependencies": []},
+                    {
+                        "name": "B",
+                        "operator": "oph_list",
+                        "arguments": [],
+                        "dependencies": [{"task": "C"}],
+                    },
+                ],
+            },
+            f,
+        )
+    return tmp_path
+
+
+class SimulatedBatch(WorkflowBatch):
+    statuses = {}
+
+    def _submit(self, workflow, args, server, port):
+        workflow.workflow_id = str(id(workflow))
+
+    def _status(self, workflow):
+        status = self.statuses.get(workflow.workflow_id, "OPH_STATUS_COMPLETED")
+        if isinstance(status, Exception):
+            raise status
+        return status
+
+
+def test_directory(documents):
+    b1 = SimulatedBatch.from_directory(str(documents), concurrency=2)
+    b1.submit()
+    assert [e.status for e in b1.entries] == ["OPH_STATUS_RUNNING"] * 3 + ["FAILED"]
+    assert b1.entries[3].error == "dependency not fulfilled"
+    b1.statuses = {b1.entries[0].workflow_id: "OPH_STATUS_RUNNING"}
+    assert b1.status() == 1
+    b1.statuses = {b1.entries[0].workflow_id: ConnectionRefusedError("refused")}
+    assert b1.status() == 1
+    assert (b1.entries[0].status, b1.entries[0].error) == ("OPH_STATUS_RUNNING", "refused")
+    b1.statuses = {b1.entries[0].workflow_id: None}
+    assert b1.status() == 1
+    assert (b1.entries[0].status, b1.entries[0].error) == ("OPH_STATUS_RUNNING", "unknown status")
+    assert len(b1.failed) == 1
+    b1.statuses = {b1.entries[0].workflow_id: "OPH_STATUS_ERROR"}
+    b1.monitor(frequency=0)
+    assert [e.document for e in b1.failed] == [b1.entries[0].document, b1.entries[3].document]
+    assert b1.entries[1].workflow_id in b1.table()
+
+
+def test_manifest(documents):
+    with open(str(documents / "manifest.txt"), "w") as f:
+        f.write("# experiments\nexperiment_0.json a.nc\n\nexperiment_1.json 'b c.nc'\n")
+    b1 = SimulatedBatch.from_manifest(str(documents / "manifest.txt"))
+    assert [e.args for e in b1.entries] == [["a.nc"], ["b c.nc"]]
+    b1.submit()
+    assert not b1.failed
+
+
+def test_cli_batch(documents):
+    runner = CliRunner()
+    result = runner.invoke(run, ["batch", "--dir", str(documents), "-n", "2"])
+    assert result.exit_code == 1
+    assert "FAILED" in result.output
+    assert "DOCUMENT" in result.output
+    result = runner.invoke(run, ["--help"])
+    assert "--workflow" in result.output
+
+
+class SimulatedPool(ConnectionPool):
+    def _connect(self, username, password, server, port, project):
+        return object()
+
+
+def test_connection_pool():
+    c1 = SimulatedPool(max_idle=1)
+    with c1.connection("user", "pass", "host", "11732") as lease:
+        first = lease.client
+    with c1.connection("user", "pass", "host", "11732") as lease:
+        assert lease.client is first
+        with c1.connection("user", "pass", "host", "11732") as other:
+            assert other.client is not first
+    assert (c1.opened, c1.reused, c1.idle()) == (2, 1, 1)
+    with pytest.raises(ValueError):
+        with c1.connection("user", "pass", "host", "11732"):
+            raise ValueError()
+    assert c1.idle() == 0
+
+
+@pytest.fixture
+def sweep(tmp_path):
+    e1 = Experiment(name="Sweep", author="Author_name", abstract="Sweep")
+    t1 = e1.newTask(name="Import", operator="oph_importnc", arguments={"input": "$1"})
+    e1.newTask(
+        name="Reduce",
+        operator="oph_reduce",
+        arguments={"operation": "$2"},
+        dependencies={t1: "cube"},
+    )
+    e1.save(str(tmp_path / "sweep.json"))
+    with open(str(tmp_path / "args.csv"), "w") as f:
+        f.write("# input,operation\na.nc,avg\nb.nc,max\n\nc.nc,\n")
+    return tmp_path
+
+
+def test_sweep(sweep):
+    rows = WorkflowBatch.read_sweep(str(sweep / "args.csv"))
+    assert rows == [["a.nc", "avg"], ["b.nc", "max"], ["c.nc", ""]]
+    with pytest.raises(AttributeError, match=r"missing in the sets 3"):
+        SimulatedBatch.from_sweep(str(sweep / "sweep.json"), rows)
+    b1 = SimulatedBatch.from_sweep(str(sweep / "sweep.json"), rows, product=True, rate=1000)
+    assert [e.args for e in b1.entries] == [
+        [i, o] for i in ["a.nc", "b.nc", "c.nc"] for o in ["avg", "max"]
+    ]
+    b1.submit()
+    assert not b1.failed
+    assert len(set(id(e.workflow.experiment_object) for e in b1.entries)) == 1
+
+
+def test_sweep_shared(sweep, fake_runtime):
+    runtime = fake_runtime()
+    rows = [["a.nc", "avg"], ["b.nc", "max"]]
+    b1 = WorkflowBatch.from_sweep(str(sweep / "sweep.json"), rows, connections=runtime)
+    document = b1.entries[0].experiment.wokrflow_to_json()
+    b1.submit(server="host", port="11732")
+    assert sorted(e.workflow_id for e in b1.entries) == ["1", "2"]
+    assert [json.loads(d)["exec_mode"] for d in runtime.documents] == ["async", "async"]
+    assert b1.entries[1].experiment.wokrflow_to_json() == document
+
+
+def test_cli_sweep(sweep):
+    result = CliRunner().invoke(
+        run, ["-w", str(sweep / "sweep.json"), "--sweep", str(sweep / "args.csv")]
+    )
+    assert result.exit_code == 1
+    assert "$1, $2 required" in result.output
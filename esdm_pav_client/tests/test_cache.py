@@ -0,0 +1,111 @@
+from esdm_pav_client import StatusCache, Workflow, Resilience, RetryPolicy
+import threading
+import time
+import pytest
+
+"""Status cache tests: the loader stands for an oph_resume round-trip"""
+key1 = StatusCache.key("127.0.0.1:11732", 10, level=None)
+key2 = StatusCache.key("127.0.0.1:11732", 10, level=3)
+
+
+def test_hit_and_miss():
+    c1 = StatusCache(ttl=60)
+    calls = []
+    for _ in range(3):
+        c1.get(key1, lambda: calls.append(1) or {"response": []})
+    assert len(calls) == 1
+    assert c1.stats()["hits"] == 2
+    assert c1.stats()["misses"] == 1
+    c1.get(key2, lambda: {"response": []})
+    assert c1.stats()["misses"] == 2
+
+
+def test_ttl_expiry():
+    c1 = StatusCache(ttl=0.01)
+    c1.get(key1, lambda: 1)
+    time.sleep(0.02)
+    assert c1.get(key1, lambda: 2) == 2
+
+
+def test_size_bound():
+    c1 = StatusCache(max_entries=2, ttl=60)
+    for i in range(5):
+        c1.get(StatusCache.key("127.0.0.1:11732", i), lambda: i)
+    assert len(c1) == 2
+    c1.invalidate(workflow_id=4)
+    assert len(c1) == 1
+
+
+def test_coalescing():
+    c1 = StatusCache(ttl=60)
+    calls = []
+    release = threading.Event()
+
+    def _loader():
+        calls.append(1)
+        release.wait(5)
+        return "status"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(c1.get(key1, _loader))) for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    while c1.coalesced < 7:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert results == ["status"] * 8
+    assert c1.hit_rate == pytest.approx(7 / 8)
+
+
+def test_loader_error():
+    c1 = StatusCache(ttl=60)
+
+    def _loader():
+        raise AttributeError("failed to connect to the runtime")
+
+    with pytest.raises(AttributeError):
+        c1.get(key1, _loader)
+    assert c1.get(key1, lambda: 1) == 1
+
+
+def test_users():
+    c1 = StatusCache(ttl=60)
+    assert c1.get(StatusCache.key("127.0.0.1:11732", 10, None, "oph-user"), lambda: 1) == 1
+    assert c1.get(StatusCache.key("127.0.0.1:11732", 10, None, "other"), lambda: 2) == 2
+    assert c1.get(StatusCache.key("127.0.0.1:11732", 10, None, "oph-user", "p1"), lambda: 3) == 3
+    assert c1.get(StatusCache.key("127.0.0.1:11732", 10, None, "oph-user"), lambda: 4) == 1
+
+
+def test_cancel(fake_runtime):
+    status = ["OPH_STATUS_RUNNING"]
+
+    def _respond(query):
+        if query.startswith("oph_cancel"):
+            status[0] = "OPH_STATUS_ABORTED"
+            return {"response": []}
+        content = [{"message": status[0]}]
+        return {"response": [{"objkey": "workflow_status", "objcontent": content}]}
+
+    runtime = fake_runtime(_respond)
+    w1 = Workflow(
+        7,
+        connections=runtime,
+        status_cache=StatusCache(ttl=60),
+        resilience=Resilience(RetryPolicy(max_attempts=1)),
+    )
+    assert w1.status() == "OPH_STATUS_RUNNING"
+    assert w1.status() == "OPH_STATUS_RUNNING"
+    w1.cancel()
+    assert w1.status() == "OPH_STATUS_ABORTED"
+    assert len(runtime.queries) == 3
+
+
+@pytest.mark.parametrize(("max_entries", "ttl"), [(0, 1), ("10", 1), (10, -1)])
+def test_wrong_parameters(max_entries, ttl):
+    with pytest.raises(AttributeError):
+        StatusCache(max_entries=max_entries, ttl=ttl)
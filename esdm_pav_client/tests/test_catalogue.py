@@ -0,0 +1,155 @@
+from esdm_pav_client import Experiment
+from esdm_pav_client.batch import WorkflowBatch
+from esdm_pav_client.catalogue import OperatorCatalogue, parse_arguments
+import json
+import time
+import pytest
+
+_rowkeys = ["NAME", "TYPE", "MANDATORY", "DEFAULT", "MINVALUE", "MAXVALUE", "VALUES"]
+
+_man = {
+    "oph_importnc": [
+        ["src_path", "string", "yes", "", "", "", ""],
+        ["measure", "string", "yes", "", "", "", ""],
+        ["nfrag", "int", "no", "0", "0", "", ""],
+    ],
+    "oph_reduce": [
+        ["cube", "string", "yes", "", "", "", ""],
+        ["operation", "string", "yes", "", "", "", "count|max|min|avg|sum"],
+        ["order", "real", "no", "2", "0", "", ""],
+    ],
+}
+
+
+def _respond(query):
+    if query == "oph_operators_list":
+        grid = {"rowkeys": ["OPERATOR NAME"], "rowvalues": [[k.upper()] for k in _man]}
+        objkey = "operators_list"
+    else:
+        grid = {"rowkeys": _rowkeys, "rowvalues": _man[query[len("oph_man function=") : -1]]}
+        objkey = "man_args"
+    return {"response": [{"objkey": objkey, "objcontent": [grid]}]}
+
+
+@pytest.fixture
+def runtime(fake_runtime):
+    return fake_runtime(_respond)
+
+
+def _catalogue(tmp_path, runtime, **kwargs):
+    return OperatorCatalogue(
+        server="host", path=str(tmp_path / "operators.json"), connections=runtime, **kwargs
+    )
+
+
+def _experiment():
+    e1 = Experiment(name="Catalogue", author="Author_name", abstract="Catalogue")
+    t1 = e1.newTask(
+        name="Import", operator="oph_importnc", arguments={"src_path": "$1", "measure": "tos"}
+    )
+    e1.newTask(
+        name="Reduce",
+        operator="oph_reduce",
+        arguments={"operation": "avg"},
+        dependencies={t1: "cube"},
+    )
+    e1.newTask(name="Wait", type="control", operator="wait", arguments={"anything": "1"})
+    return e1
+
+
+def test_parse_arguments():
+    response = {"response": [{"objkey": "man_args", "objcontent": [{"rowkeys": _rowkeys}]}]}
+    response["response"][0]["objcontent"][0]["rowvalues"] = _man["oph_reduce"]
+    arguments = parse_arguments(response)
+    assert arguments[1]["values"] == ["count", "max", "min", "avg", "sum"]
+    assert arguments[2]["default"] == "2" and not arguments[2]["mandatory"]
+    assert parse_arguments({"response": []}) is None
+
+
+def test_cache(tmp_path, runtime):
+    c1 = _catalogue(tmp_path, runtime)
+    assert sorted(c1.operators) == ["oph_importnc", "oph_reduce"]
+    assert len(runtime.queries) == 3
+    c2 = _catalogue(tmp_path, runtime)
+    assert c2.operators == c1.operators
+    assert len(runtime.queries) == 3
+    with open(str(tmp_path / "operators.json")) as fp:
+        data = json.load(fp)
+    assert (data["version"], data["runtime"]) == (OperatorCatalogue.version, "host:11732")
+    data["version"] = 0
+    with open(str(tmp_path / "operators.json"), "w") as fp:
+        json.dump(data, fp)
+    assert _catalogue(tmp_path, runtime).operators
+    assert len(runtime.queries) == 6
+
+
+def test_expiry(tmp_path, runtime, fake_runtime):
+    c1 = _catalogue(tmp_path, runtime, max_age="1d")
+    c1.update({"oph_reduce": None}, now=time.time() - 2 * 86400)
+    c1.connections.down = True
+    assert c1.expired()
+    assert c1.operators == {"oph_reduce": None}
+    assert runtime.queries == []
+    c1.connections.down = False
+    c1.retry_interval = 0
+    assert "oph_importnc" in c1.operators
+    assert not c1.expired()
+    with pytest.raises(AttributeError):
+        OperatorCatalogue(
+            path=str(tmp_path / "missing.json"), connections=fake_runtime(down=True)
+        ).operators
+
+
+def test_validate(tmp_path, runtime):
+    c1 = _catalogue(tmp_path, runtime)
+    e1 = _experiment()
+    assert c1.validate(e1).valid
+    assert e1.check(visual=False, catalogue=c1)
+    e1.newTask(name="Max", operator="oph_reduce", arguments={"operation": "median", "order": "x"})
+    e1.newTask(name="Count", operator="oph_reduce", arguments={"operation": "count", "level": "1"})
+    e1.newTask(name="Other", operator="oph_unknown", arguments={})
+    e1.newTask(name="Frag", operator="oph_importnc", arguments={"measure": "tos", "nfrag": "-1"})
+    errors = c1.validate(e1).errors
+    assert errors == [
+        "task Max: missing argument cube",
+        "task Max: invalid value median of argument operation",
+        "task Max: argument order should be real",
+        "task Count: unknown argument level",
+        "task Count: missing argument cube",
+        "task Other: unknown operator oph_unknown",
+        "task Frag: missing argument src_path",
+        "task Frag: argument nfrag out of range: -1",
+    ]
+    assert not e1.check(visual=False, catalogue=c1)
+
+
+def test_speed(tmp_path, runtime):
+    c1 = _catalogue(tmp_path, runtime)
+    e1 = _experiment()
+    with e1.bulk():
+        for i in range(5000):
+            e1.newTask(
+                name="Reduce {0}".format(i),
+                operator="oph_reduce",
+                arguments={"operation": "max", "order": "@{i}"},
+                dependencies={e1.tasks[0]: "cube"},
+            )
+    c1.operators
+    start = time.perf_counter()
+    assert c1.validate(e1).valid
+    assert (time.perf_counter() - start) / len(e1.tasks) < 1e-4
+
+
+def test_batch(tmp_path, runtime):
+    e1 = _experiment()
+    e1.tasks[1].arguments = ["operation=median"]
+    e1.save(str(tmp_path / "bad.json"))
+    b1 = WorkflowBatch([str(tmp_path / "bad.json")], catalogue=_catalogue(tmp_path, runtime))
+    b1.submit(server="host")
+    assert b1.entries[0].status == "FAILED"
+    assert "invalid value median" in b1.entries[0].error
+    with pytest.raises(AttributeError):
+        WorkflowBatch.from_sweep(
+            str(tmp_path / "bad.json"), [["a.nc"]], catalogue=_catalogue(tmp_path, runtime)
+        )
+    assert len(runtime.queries) == 3
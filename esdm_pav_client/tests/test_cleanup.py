@@ -0,0 +1,65 @@
+from esdm_pav_client import Experiment
+from esdm_pav_client.cleanup import peak_live_cubes
+import copy
+
+"""Cleanup tests, based on the in-memory pipeline of esdm_wait_example.py
+   run inside a loop"""
+e1 = Experiment(
+    name="Sample_Workflow",
+    author="Author_name",
+    abstract="Example workflow for testing",
+)
+t1 = e1.newTask(
+    name="Start loop",
+    type="control",
+    operator="for",
+    arguments={"key": "index", "values": "$1", "parallel": "yes"},
+)
+t2 = e1.newTask(
+    name="Import",
+    operator="oph_importesdm",
+    arguments={"measure": "tos", "input": "esdm://tos_@{index}", "ioserver": "ophidiaio_memory"},
+    dependencies={t1: None},
+)
+t3 = e1.newTask(
+    name="Reduce",
+    operator="oph_reduce",
+    arguments={"operation": "avg"},
+    dependencies={t2: "cube"},
+)
+t4 = e1.newTask(
+    name="Aggregate",
+    operator="oph_aggregate",
+    arguments={"operation": "avg"},
+    dependencies={t3: "cube"},
+)
+t5 = e1.newTask(
+    name="Export",
+    operator="oph_exportesdm",
+    arguments={"output": "esdm://tos_avg_@{index}"},
+    dependencies={t4: "cube"},
+)
+t6 = e1.newTask(name="End loop", type="control", operator="endfor", dependencies={t5: None})
+
+
+def test_cleanup():
+    e2 = copy.deepcopy(e1)
+    report = e2.cleanup(args=["1|2|3"])
+    assert report.released == ["Import", "Reduce"]
+    assert report.exempted == {"Aggregate": "exported"}
+    assert [t.__dict__.get("on_exit") for t in e2.tasks[1:4]] == ["oph_delete", "oph_delete", None]
+    assert report.peak_before == 9
+    assert report.peak_after < report.peak_before
+
+
+def test_keep():
+    e2 = copy.deepcopy(e1)
+    e2.tasks[2].on_exit = "nop"
+    report = e2.cleanup(keep=["Import"])
+    assert report.released == []
+    assert report.exempted["Import"] == "kept"
+    assert report.exempted["Reduce"] == "on_exit already set"
+
+
+def test_peak_without_loop_values():
+    assert peak_live_cubes(e1.tasks) == 3
@@ -0,0 +1,168 @@
+from esdm_pav_client import Experiment, Workflow, ConnectionPool
+from esdm_pav_client.cache import StatusCache
+from esdm_pav_client.resilience import Resilience
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
+import threading
+import time
+import pytest
+
+
+class RacyClient:
+    """
+    Client keeping the response of its last call only, like PyOphidia, and
+    yielding to the other threads in the middle of each call
+    """
+
+    def __init__(self, documents=None, ids=None):
+        self.last_jobid = None
+        self.last_response = None
+        self.last_return_value = 0
+        self.documents = documents if documents is not None else []
+        self.ids = ids if ids is not None else itertools.count(1)
+        self.active = 0
+        self.overlaps = 0
+
+    def _enter(self):
+        self.active += 1
+        if self.active > 1:
+            self.overlaps += 1
+
+    def submit(self, query):
+        self._enter()
+        if query.startswith("oph_resume"):
+            objkey, message = "workflow_status", "OPH_STATUS_RUNNING"
+        else:
+            objkey, message = "cancel", "cancelled"
+        self.last_response = json.dumps(
+            {"response": [{"objkey": objkey, "objcontent": [{"message": message}]}]}
+        )
+        time.sleep(0.0005)
+        self.last_jobid = "https://host/ophidia?7#"
+        self.active -= 1
+
+    def wsubmit(self, document, *args):
+        self._enter()
+        self.documents.append(json.loads(document))
+        self.last_response = "{}"
+        time.sleep(0.0005)
+        self.last_jobid = "https://host/ophidia?{0}#".format(next(self.ids))
+        self.active -= 1
+
+
+class RacyPool(ConnectionPool):
+    def __init__(self, documents):
+        super().__init__(max_idle=16)
+        self.documents = documents
+        self.ids = itertools.count(1)
+
+    def _connect(self, username, password, server, port, project):
+        return RacyClient(self.documents, self.ids)
+
+
+def _experiment():
+    e1 = Experiment(name="Concurrency", author="Author_name", abstract="Concurrency")
+    e1.newTask(name="Reduce", operator="oph_reduce", arguments={"operation": "avg"})
+    return e1
+
+
+def test_shared_client():
+    w1 = Workflow(7, status_cache=StatusCache(ttl=0), resilience=Resilience())
+    w1.pyophidia_client = client = RacyClient()
+
+    def _use(n):
+        if n % 2:
+            return w1.cancel()
+        return w1.status()
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(_use, range(400)))
+    assert client.overlaps == 0
+    assert results[::2] == ["OPH_STATUS_RUNNING"] * 200
+
+
+def test_concurrent_submit():
+    e1 = _experiment()
+    documents = []
+    w1 = Workflow(e1, connections=RacyPool(documents), resilience=Resilience())
+    barrier = threading.Barrier(16)
+
+    def _submit(n):
+        barrier.wait()
+        try:
+            return w1.submit(server="host")
+        except AttributeError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(_submit, range(16)))
+    assert len(documents) == 1
+    assert [r for r in results if r is not None] == ["1"]
+    assert w1.workflow_id == "1"
+
+
+def test_shared_experiment():
+    e1 = _experiment()
+    documents = []
+    pool = RacyPool(documents)
+    done = threading.Event()
+    modes = set()
+
+    def _observe():
+        while not done.is_set():
+            modes.add(e1.exec_mode)
+
+    observer = threading.Thread(target=_observe)
+    observer.start()
+    try:
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            workflows = [Workflow(e1, connections=pool, resilience=Resilience()) for _ in range(64)]
+            ids = list(executor.map(lambda w: w.submit(server="host"), workflows))
+    finally:
+        done.set()
+        observer.join()
+    assert modes == {"sync"}
+    assert len(set(ids)) == 64
+    assert [d["exec_mode"] for d in documents] == ["async"] * 64
+    assert all(d["tasks"] == documents[0]["tasks"] for d in documents)
+    assert not [k for d in documents for k in d if k.startswith("_")]
+
+
+@pytest.mark.parametrize("checkpoint", ["all", "Reduce"])
+def test_exec_mode_untouched(checkpoint):
+    documents = []
+    w1 = Workflow(
+        _experiment() if checkpoint == "all" else 7,
+        connections=RacyPool(documents),
+        resilience=Resilience(),
+    )
+    w1.submit(server="host", checkpoint=checkpoint)
+    if checkpoint == "all":
+        assert w1.experiment_object.exec_mode == "sync"
+        assert documents[0]["exec_mode"] == "async"
+
+
+def test_failover_endpoint():
+    from esdm_pav_client.resilience import RetryPolicy, RuntimeCallError
+    from esdm_pav_client.routing import EndpointPool
+
+    seen = []
+
+    class FailoverPool(RacyPool):
+        def _connect(self, username, password, server, port, project):
+            # the endpoint seen by another thread while the submission is
+            # tried on each runtime
+            seen.append(w1._endpoint())
+            if server == "down":
+                raise RuntimeCallError("connection refused", delivered=False)
+            return super()._connect(username, password, server, port, project)
+
+    w1 = Workflow(
+        _experiment(),
+        connections=FailoverPool([]),
+        resilience=Resilience(RetryPolicy(max_attempts=1)),
+    )
+    w1.submit(endpoints=EndpointPool(["down:11732", "up:11732"]))
+    assert seen and all(e == "127.0.0.1:11732" for e in seen)
+    assert (w1._endpoint(), w1.workflow_id) == ("up:11732", "1")
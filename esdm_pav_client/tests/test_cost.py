@@ -0,0 +1,77 @@
+from esdm_pav_client import Experiment
+from esdm_pav_client.cost import CostModel, CostProfile
+import pytest
+
+"""Cost model tests: a parallel loop of import and reduce followed by a merge"""
+e1 = Experiment(
+    name="Sample_Workflow",
+    author="Author_name",
+    abstract="Example workflow for testing",
+)
+t1 = e1.newTask(
+    name="Start loop",
+    type="control",
+    operator="for",
+    arguments={"key": "index", "values": "$1", "parallel": "yes"},
+)
+t2 = e1.newTask(
+    name="Import",
+    operator="oph_importnc",
+    arguments={"measure": "tasmax", "input": "tasmax_@{index}.nc", "nfrag": "16"},
+    dependencies={t1: None},
+)
+t3 = e1.newTask(
+    name="Reduce",
+    operator="oph_reduce",
+    arguments={"operation": "avg"},
+    dependencies={t2: "cube"},
+)
+t4 = e1.newTask(name="End loop", type="control", operator="endfor", dependencies={t3: "cube"})
+t5 = e1.newTask(
+    name="Merge",
+    operator="oph_mergecubes2",
+    arguments={"dim": "new_dim"},
+    dependencies={t4: "cubes"},
+)
+m1 = CostModel(
+    profiles={
+        "oph_importnc": {"serial": 10, "parallel": 0},
+        "oph_reduce": {"serial": 2, "parallel": 64},
+        "oph_mergecubes2": 5,
+    }
+)
+
+
+def test_estimate():
+    estimate = m1.estimate(e1, "1|2|3|4")
+    assert estimate.makespan == pytest.approx(10 + 66 + 5)
+    assert estimate.critical_path == ["Start loop", "Import", "Reduce", "End loop", "Merge"]
+    assert estimate.peak_concurrency == 4
+    assert estimate.work == pytest.approx(4 * 76 + 5)
+
+
+def test_sequential_loop():
+    t1.arguments = ["key=index", "values=$1", "parallel=no"]
+    try:
+        estimate = m1.estimate(e1, "1|2|3|4")
+    finally:
+        t1.arguments = ["key=index", "values=$1", "parallel=yes"]
+    assert estimate.makespan == pytest.approx(4 * 76 + 5)
+    assert estimate.peak_concurrency == 1
+
+
+def test_suggest():
+    settings = m1.suggest(e1, "1|2", deadline=40)
+    assert settings["deadline_met"]
+    assert settings["makespan"] <= 40
+    assert settings["ncores"] * settings["nthreads"] == 4
+    assert not m1.suggest(e1, "1|2", deadline=1)["deadline_met"]
+
+
+def test_record():
+    m2 = CostModel()
+    for ncores, seconds in [(1, 66), (2, 34), (4, 18)]:
+        m2.record("oph_reduce", seconds, ncores=ncores)
+    assert m2.profile("oph_reduce").serial == pytest.approx(2)
+    assert m2.profile("oph_reduce").parallel == pytest.approx(64)
+    assert isinstance(m2.profile("oph_apply"), CostProfile)
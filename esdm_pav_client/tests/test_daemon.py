@@ -0,0 +1,113 @@
+from esdm_pav_client import Experiment
+from esdm_pav_client import daemon
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import pytest
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    d1 = daemon.ClientDaemon(socket_path=str(tmp_path / "daemon.sock"))
+    thread = threading.Thread(target=d1.serve_forever, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if daemon.ping(d1.socket_path) is not None:
+            break
+        thread.join(0.05)
+    yield d1.socket_path
+    daemon.stop(d1.socket_path)
+    thread.join(5)
+
+
+def test_forward(socket_path, tmp_path):
+    e1 = Experiment(name="Daemon", author="Author_name", abstract="Daemon")
+    e1.newTask(name="Import", operator="oph_importnc", arguments={"input": "$1"})
+    directories = []
+    for n in range(2):
+        directory = tmp_path / "docs_{0}".format(n)
+        directory.mkdir()
+        e1.save(str(directory / "experiment_{0}.json".format(n)))
+        directories.append(str(directory))
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        responses = list(
+            executor.map(lambda d: daemon.forward(["batch", "--dir", d], socket_path), directories)
+        )
+    for n, response in enumerate(responses):
+        assert response["exit_code"] == 1
+        assert "experiment_{0}.json".format(n) in response["output"]
+        assert "experiment_{0}.json".format(1 - n) not in response["output"]
+    assert daemon.ping(socket_path)["requests"] >= 3
+
+
+def test_not_running(tmp_path):
+    assert daemon.forward(["--help"], str(tmp_path / "missing.sock")) is None
+    (tmp_path / "file.sock").write_text("")
+    assert daemon.forward(["--help"], str(tmp_path / "file.sock")) is None
+    assert daemon.ping(str(tmp_path / "missing.sock")) is None
+    assert not daemon.stop(str(tmp_path / "missing.sock"))
+
+
+@pytest.mark.parametrize(
+    "argv, local",
+    [
+        (["-w", "exp.json", "1"], False),
+        (["-w", "exp.json", "-m"], True),
+        (["-sm", "-w", "exp.json"], True),
+        (["--monitor", "-i", "3"], True),
+        (["-s", "-w", "exp.json", "1"], True),
+        (["-vs", "-w", "exp.json"], True),
+        (["-i", "3", "-p", "checkpoint", "--sync_mode"], True),
+        (["-wsample.json", "1"], False),
+        (["-s", "-w", "exp.json", "--sweep", "args.csv"], False),
+        (["batch", "--dir", "docs", "--monitor"], False),
+        (["history", "--db", "h.sqlite"], False),
+        (["daemon", "status"], True),
+    ],
+)
+def test_local_only(argv, local):
+    assert daemon.local_only(argv) is local
+
+
+def test_paths(tmp_path, monkeypatch):
+    import os
+
+    monkeypatch.chdir(tmp_path)
+    argv = ["-vw=exp.json", "-E", "new.txt", "--sweep", "=args.csv", "a.nc", "-S", "host"]
+    assert daemon._scan(argv)[1] == [
+        "-vw=" + str(tmp_path / "exp.json"),
+        "-E",
+        str(tmp_path / "new.txt"),
+        "--sweep",
+        "=" + str(tmp_path / "args.csv"),
+        "a.nc",
+        "-S",
+        "host",
+    ]
+    assert daemon._scan(["history", "--db=h.sqlite"])[1][1] == "--db=" + str(tmp_path / "h.sqlite")
+    assert daemon._scan(["memo", "--db", "h.sqlite"])[1][2] == os.path.join(
+        str(tmp_path), "h.sqlite"
+    )
+
+
+def test_environment(socket_path, monkeypatch):
+    assert daemon.forward(["--help"], socket_path)["exit_code"] == 0
+    monkeypatch.setenv("ESDM_PAV_CLIENT_HISTORY", "other.sqlite")
+    assert daemon.forward(["--help"], socket_path) is None
+
+
+def test_other_user(socket_path, monkeypatch):
+    import os
+
+    uid = os.getuid()
+    monkeypatch.setattr(os, "getuid", lambda: uid + 1)
+    assert daemon.forward(["--help"], socket_path) is None
+
+
+def test_thin_import():
+    import subprocess
+    import sys
+
+    code = "import sys, esdm_pav_client.cli.launcher, esdm_pav_client.daemon; "
+    code += "print(sorted(m for m in sys.modules if m.startswith('esdm_pav_client')))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True).stdout
+    assert "esdm_pav_client.workflow" not in output and "esdm_pav_client.daemon" in output
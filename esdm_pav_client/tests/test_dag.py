@@ -0,0 +1,66 @@
+from esdm_pav_client import Experiment, Workflow
+import copy
+
+
+def _experiment():
+    e1 = Experiment(name="Graph", author="Author_name", abstract="Graph")
+    t1 = e1.newTask(name="Import", operator="oph_importnc", arguments={"input": "$1"})
+    t2 = e1.newTask(
+        name="Loop",
+        operator="oph_for",
+        arguments={"key": "i", "values": "1|2"},
+        dependencies={t1: "cube"},
+    )
+    t3 = e1.newTask(
+        name="Check", operator="oph_if", arguments={"condition": "@i"}, dependencies={t2: "cube"}
+    )
+    t4 = e1.newTask(name="Reduce", operator="oph_reduce", arguments={}, dependencies={t3: "cube"})
+    t5 = e1.newTask(name="EndIf", operator="oph_endif", arguments={}, dependencies={t4: "cube"})
+    e1.newTask(name="EndLoop", operator="oph_endfor", arguments={}, dependencies={t5: "cube"})
+    return e1
+
+
+def test_graph():
+    e1 = _experiment()
+    g = e1.graph
+    assert g.topological_order() == [0, 1, 2, 3, 4, 5]
+    assert g.levels() == [0, 1, 2, 3, 4, 5]
+    assert [g.enclosing_block(i) for i in range(len(g))] == [None, None, 1, 2, 2, 1]
+    assert g.blocks()[2] == {"end": 4, "parent": 1, "body": [3, 4]}
+    assert g.ancestors(3) == {0, 1, 2}
+    assert g.descendants(3) == {4, 5}
+
+
+def test_graph_invalidation():
+    e1 = _experiment()
+    g = e1.graph
+    assert e1.graph is g
+    t7 = e1.newTask(name="Export", operator="oph_exportnc2", arguments={}, dependencies={})
+    assert e1.graph is not g
+    g = e1.graph
+    t7.addDependency(e1.tasks[0], "cube")
+    assert e1.graph is not g
+    assert e1.graph.predecessors[6] == [0]
+    assert e1.graph.levels()[6] == 1
+    g = e1.graph
+    e1.optimize()
+    assert e1.graph is not g
+    g = e1.graph
+    e1.tasks[6].dependencies.append({"task": "EndLoop"})
+    e1.invalidate()
+    assert e1.graph.levels()[6] == 6
+    g = e1.graph
+    e2 = copy.deepcopy(e1)
+    assert e2.graph.tasks is e2.tasks
+    e2.tasks[6].addDependency(e2.tasks[1])
+    assert e2.graph.predecessors[6] == [0, 5, 1]
+    assert e1.graph is g
+
+
+def test_private_attributes():
+    e1 = _experiment()
+    e1.graph
+    document = Workflow._to_json(e1)
+    assert not [k for k in document if k.startswith("_")]
+    assert not [k for t in document["tasks"] for k in t if k.startswith("_")]
+    assert not [k for t in e1.wokrflow_to_json()["tasks"] for k in t if k.startswith("_")]
@@ -0,0 +1,80 @@
+from esdm_pav_client import Experiment, Workflow, Task
+from esdm_pav_client.dependencies import DependencyList, edges
+import copy
+import json
+import pickle
+import pytest
+
+
+def _experiment(n=100):
+    e1 = Experiment(name="FanIn", author="Author_name", abstract="FanIn")
+    imports = [
+        e1.newTask(
+            name="Import {0}".format(i),
+            operator="oph_importnc",
+            arguments={"input": "{0}.nc".format(i)},
+        )
+        for i in range(n)
+    ]
+    t1 = e1.newTask(name="Merge", operator="oph_mergecubes2", arguments={"dim": "new_dim"})
+    t1.addDependencies(imports, "cubes")
+    e1.newTask(name="Export", operator="oph_exportnc2", arguments={}, dependencies={t1: "cube"})
+    return e1
+
+
+def test_compact():
+    e1 = _experiment()
+    dependencies = e1.tasks[-2].dependencies
+    assert isinstance(dependencies, DependencyList)
+    assert len(dependencies) == 100
+    assert dependencies[3] == {"argument": "cubes", "task": "Import 3"}
+    assert dependencies[3]["task"] is e1.tasks[3].name
+    assert all(a is dependencies._arguments[0] for a in dependencies._arguments)
+    assert list(edges(dependencies))[:2] == [("Import 0", "cubes"), ("Import 1", "cubes")]
+
+
+def test_list_behaviour():
+    d1 = DependencyList([{"task": "a"}, {"task": "b", "argument": "cube"}])
+    assert d1 == [{"task": "a"}, {"argument": "cube", "task": "b"}]
+    d1.append({"task": "c", "argument": "cube", "other": 1})
+    assert d1[-1] == {"task": "c", "argument": "cube", "other": 1}
+    d1[:] = [d for d in d1 if d["task"] != "b"]
+    assert [t for t, _ in d1.edges()] == ["a", "c"]
+    del d1[0]
+    assert len(d1) == 1 and d1 != []
+    with pytest.raises(AttributeError):
+        d1.append({"argument": "cube"})
+    assert copy.deepcopy(d1) == d1
+    assert pickle.loads(pickle.dumps(d1)) == d1
+
+
+def test_add_dependencies():
+    t1 = Task(name="Merge", operator="oph_mergecubes2", arguments={})
+    with pytest.raises(AttributeError):
+        t1.addDependencies(["Import"], "cubes")
+    with pytest.raises(AttributeError):
+        t1.addDependencies([t1], 1)
+    assert len(t1.dependencies) == 0
+    t1.dependencies = [{"task": "Import"}]
+    t1.addDependencies([Task(name="Other", operator="oph_importnc", arguments={})])
+    assert t1.dependencies == [{"task": "Import"}, {"task": "Other"}]
+
+
+def test_runtime_format(tmp_path):
+    e1 = _experiment()
+    document = json.loads(json.dumps(e1.wokrflow_to_json()))
+    assert document["tasks"][-2]["dependencies"][0] == {"argument": "cubes", "task": "Import 0"}
+    assert json.loads(json.dumps(Workflow._to_json(e1)))["tasks"] == document["tasks"]
+    e1.save(str(tmp_path / "fanin.json"))
+    e2 = Experiment.load(str(tmp_path / "fanin.json"))
+    assert isinstance(e2.tasks[-2].dependencies, DependencyList)
+    assert e2.wokrflow_to_json()["tasks"] == document["tasks"]
+
+
+def test_graph():
+    e1 = _experiment()
+    graph = e1.graph
+    assert graph.predecessors[100] == list(range(100))
+    assert graph.levels()[101] == 2
+    e1.tasks[-2].addDependencies([e1.tasks[-1]])
+    assert not e1.validate().valid
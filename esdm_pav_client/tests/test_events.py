@@ -0,0 +1,100 @@
+from esdm_pav_client import Experiment, Workflow, Resilience, RetryPolicy
+from esdm_pav_client.batch import WorkflowBatch, BatchEntry
+from esdm_pav_client.events import EventQueue
+import threading
+import pytest
+
+
+def _input(waiting, broken=()):
+    # acknowledge oph_input for the (workflow id, task) pairs in waiting
+    def respond(query):
+        fields = dict(f.split("=", 1) for f in query[len("oph_input ") :].split(";") if f)
+        if fields["id"] in broken:
+            raise ConnectionError("reset")
+        if (fields["id"], fields["taskname"]) in waiting:
+            return {"response": [{"objkey": "input"}]}
+        return None
+
+    return respond
+
+
+def _resilience():
+    return Resilience(RetryPolicy(max_attempts=1))
+
+
+def _workflow(workflow_id, pool, server="host"):
+    w1 = Workflow(workflow_id, connections=pool, resilience=_resilience())
+    w1.server = server
+    return w1
+
+
+def test_notify(fake_runtime):
+    pool = fake_runtime(_input({("7", "Wait")}))
+    w1 = _workflow(7, pool)
+    event = w1.notify("Wait", {"year": 2002, "file": "tos.nc"})
+    assert event.acknowledged
+    assert pool.queries == [
+        "oph_input id=7;taskname=Wait;action=continue;key=year|file;value=2002|tos.nc;"
+    ]
+    with pytest.raises(AttributeError):
+        w1.notify("Other")
+    with pytest.raises(AttributeError):
+        w1.notify("Wait", action="release")
+    with pytest.raises(AttributeError):
+        w1.notify("Wait", {"file": "a;b"})
+    with pytest.raises(AttributeError):
+        Workflow(Experiment(name="Events")).notify("Wait")
+
+
+def test_queue(fake_runtime):
+    waiting = set((str(i), "Wait") for i in range(0, 500, 2))
+    pool = fake_runtime(_input(waiting), max_idle=16)
+    q1 = EventQueue(connections=pool, concurrency=4, batch_size=50, resilience=_resilience())
+    workflows = [_workflow(i, pool, "host{0}".format(i % 2)) for i in range(500)]
+    threads = [
+        threading.Thread(target=lambda ws: [w.notify("Wait", queue=q1) for w in ws], args=(ws,))
+        for ws in [workflows[:250], workflows[250:]]
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(q1) == 500
+    events = q1.flush()
+    assert len(q1) == 0
+    assert len(pool.queries) == 500
+    assert sorted(int(e.workflow.workflow_id) for e in events if e.acknowledged) == list(
+        range(0, 500, 2)
+    )
+    assert all(e.error and e.response is None for e in events if not e.acknowledged)
+    # rejected events do not discard the client of their batch
+    assert pool.opened <= 10
+
+
+def test_batch(fake_runtime):
+    pool = fake_runtime(_input({("1", "Wait"), ("2", "Wait")}))
+    b1 = WorkflowBatch([], connections=pool)
+    for i, status in enumerate(
+        ["OPH_STATUS_RUNNING", "OPH_STATUS_WAITING", "OPH_STATUS_COMPLETED"]
+    ):
+        entry = BatchEntry("doc{0}.json".format(i))
+        entry.workflow = _workflow(i + 1, pool)
+        entry.status = status
+        b1.entries.append(entry)
+    failed = BatchEntry("failed.json")
+    failed.status = "FAILED"
+    b1.entries.append(failed)
+    events = b1.notify("Wait", {"n": 1})
+    assert [(e.workflow.workflow_id, e.acknowledged) for e in events] == [(1, True), (2, True)]
+    assert pool.opened == 1
+
+
+def test_broken_client(fake_runtime):
+    pool = fake_runtime(_input(set((str(i), "Wait") for i in range(6)), broken={"3"}))
+    q1 = EventQueue(connections=pool, resilience=_resilience())
+    for i in range(6):
+        q1.put(_workflow(i, pool), "Wait")
+    events = q1.flush()
+    assert [e.acknowledged for e in events] == [True, True, True, False, True, True]
+    assert pool.opened == 2
+    assert pool.idle() == 1
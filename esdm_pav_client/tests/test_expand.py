@@ -0,0 +1,120 @@
+from esdm_pav_client import Experiment, Workflow
+from esdm_pav_client.dag import unroll
+from esdm_pav_client.expand import ExpansionLimitError
+from esdm_pav_client.cli.client import run
+from click.testing import CliRunner
+import itertools
+import json
+import pytest
+
+
+def _experiment(values="$2"):
+    e1 = Experiment(name="Expand", author="Author_name", abstract="Expand")
+    t1 = e1.newTask(name="Import", operator="oph_importnc", arguments={"input": "$1"})
+    t2 = e1.newTask(
+        name="Outer",
+        operator="oph_for",
+        arguments={"key": "i", "values": values, "parallel": "yes"},
+        dependencies={t1: "cube"},
+    )
+    t3 = e1.newTask(
+        name="Inner",
+        operator="oph_for",
+        arguments={"key": "j", "values": "x|y"},
+        dependencies={t2: "cube"},
+    )
+    t4 = e1.newTask(
+        name="Reduce",
+        operator="oph_reduce",
+        arguments={"operation": "@{j}", "description": "@{i}"},
+        dependencies={t3: "cube"},
+    )
+    t5 = e1.newTask(name="EndInner", operator="oph_endfor", arguments={}, dependencies={t4: "cube"})
+    e1.newTask(name="EndOuter", operator="oph_endfor", arguments={}, dependencies={t5: "cube"})
+    return e1
+
+
+def _document(e1, instances):
+    document = e1.wokrflow_to_json()
+    tasks = document.pop("tasks")
+    document["tasks"] = []
+    for instance in instances:
+        task = {k: v for k, v in tasks[instance["position"]].items()}
+        task["name"] = instance["name"]
+        task["arguments"] = ["{0}={1}".format(k, v) for k, v in instance["arguments"].items()]
+        task["dependencies"] = [
+            (
+                {"task": instances[j]["name"], "argument": a}
+                if a is not None
+                else {"task": instances[j]["name"]}
+            )
+            for j, a in instance["dependencies"]
+        ]
+        document["tasks"].append(task)
+    return document
+
+
+def test_expand():
+    e1 = _experiment()
+    x1 = e1.expand(["a.nc", "1|2|3"])
+    instances = list(x1)
+    assert instances == unroll(e1.tasks, ["a.nc", "1|2|3"])
+    assert len(instances) == 15
+    assert instances[4]["name"] == "Reduce (1,2)"
+    assert instances[4]["arguments"] == {"operation": "y", "description": "1"}
+    report = x1.report()
+    assert (report.instances, report.loops, report.unknown) == (15, {"Outer": 3, "Inner": 6}, [])
+    assert report.complete
+    assert report.document_size == len(json.dumps(_document(e1, instances)))
+    assert "loop Inner: 6" in str(report)
+
+
+def test_unknown_values():
+    e1 = _experiment()
+    with pytest.raises(AttributeError):
+        list(e1.expand(["a.nc"]))
+    report = e1.expand(["a.nc"]).report()
+    assert report.unknown == ["Outer"]
+    assert report.loops == {"Outer": 1, "Inner": 2}
+    assert report.instances == 7
+
+
+def test_limits():
+    e1 = _experiment("|".join(str(n) for n in range(10**6)))
+    x1 = e1.expand(["a.nc"])
+    assert [i["name"] for i in itertools.islice(x1, 4)] == [
+        "Import",
+        "Outer",
+        "Inner (1)",
+        "Reduce (1,1)",
+    ]
+    with pytest.raises(ExpansionLimitError) as error:
+        x1.report(max_instances=1000)
+    assert isinstance(error.value, AttributeError)
+    assert error.value.report.instances == 1001
+    assert not error.value.report.complete
+    with pytest.raises(ExpansionLimitError) as error:
+        x1.report(max_size=50000)
+    assert error.value.report.document_size > 50000
+
+
+def test_workflow(fake_runtime):
+    w1 = Workflow(_experiment(), connections=fake_runtime(first_id=12))
+    w1.max_instances = 10
+    with pytest.raises(ExpansionLimitError):
+        w1.submit("a.nc", "1|2|3", server="host")
+    assert w1.workflow_id is None
+    w1.max_instances = 100
+    assert w1.submit("a.nc", "1|2|3", server="host") == "12"
+    assert w1.expansion_report.instances == 15
+    assert Workflow.max_instances is None
+
+
+def test_cli(tmp_path):
+    e1 = _experiment()
+    e1.save(str(tmp_path / "expand.json"))
+    result = CliRunner().invoke(
+        run, ["-w", str(tmp_path / "expand.json"), "--max-instances", "10", "a.nc", "1|2|3"]
+    )
+    assert result.exit_code == 1
+    assert "exceeds 10 task instances" in result.output
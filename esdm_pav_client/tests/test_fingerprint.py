@@ -0,0 +1,111 @@
+from esdm_pav_client import Experiment, Workflow, HistoryStore
+from esdm_pav_client import Resilience, RetryPolicy
+from esdm_pav_client.fingerprint import fingerprint, fingerprints
+from esdm_pav_client.history import experiment_hash
+import pytest
+
+
+def _experiment(reverse=False, exec_mode="sync"):
+    e1 = Experiment(name="Fingerprint", author="Author_name", abstract="Fingerprint")
+    e1.exec_mode = exec_mode
+    arguments = [("input", "$1"), ("measure", "tos"), ("nfrag", "4")]
+    if reverse:
+        arguments.reverse()
+        t2 = e1.newTask(name="Reduce", operator="oph_reduce", arguments={"operation": "max"})
+        t1 = e1.newTask(name="Import", operator="oph_importnc", arguments=dict(arguments))
+        t2.addDependency(t1, "cube")
+    else:
+        t1 = e1.newTask(name="Import", operator="oph_importnc", arguments=dict(arguments))
+        e1.newTask(
+            name="Reduce",
+            operator="oph_reduce",
+            arguments={"operation": "max"},
+            dependencies={t1: "cube"},
+        )
+    return e1
+
+
+def _resume(statuses):
+    # answer oph_resume with the status of the workflow in statuses (None if
+    # unreachable), running if missing
+    def respond(query):
+        status = statuses.get(query.split("id=")[1].split(";")[0], "OPH_STATUS_RUNNING")
+        if status is None:
+            raise ConnectionRefusedError()
+        return {"response": [{"objkey": "workflow_status", "objcontent": [{"message": status}]}]}
+
+    return respond
+
+
+class SimulatedWorkflow(Workflow):
+    deduplication_frequency = 0
+    statuses = []
+
+    def status(self):
+        return self.statuses.pop(0)
+
+
+def test_fingerprint():
+    assert fingerprint(_experiment()) == fingerprint(_experiment(reverse=True))
+    assert fingerprint(_experiment()) == fingerprint(_experiment(exec_mode="async"))
+    assert fingerprint(_experiment(), ["a.nc"]) == fingerprint(_experiment(), ("a.nc",))
+    assert fingerprint(_experiment(), ["a.nc"]) != fingerprint(_experiment(), ["b.nc"])
+    assert fingerprint(_experiment(), ["a", "b"]) != fingerprint(_experiment(), ["b", "a"])
+    assert fingerprint(_experiment(), options={"optimize": False}) == fingerprint(_experiment())
+    assert fingerprint(_experiment(), options={"optimize": True}) != fingerprint(_experiment())
+    e1 = _experiment()
+    e1.tasks[1].arguments.append("operation=avg")
+    assert fingerprint(e1) != fingerprint(_experiment())
+    assert fingerprints(_experiment(), ["a.nc"]) == (
+        experiment_hash(_experiment()),
+        fingerprint(_experiment(), ["a.nc"]),
+    )
+
+
+def test_deduplicate(tmp_path, fake_runtime):
+    h1 = HistoryStore(str(tmp_path / "history.sqlite"))
+    statuses = {}
+    pool = fake_runtime(_resume(statuses))
+
+    def _submit(experiment, *args, port="11732", deduplicate=True):
+        w1 = Workflow(
+            experiment,
+            connections=pool,
+            history=h1,
+            resilience=Resilience(RetryPolicy(max_attempts=1)),
+        )
+        w1.submit(*args, server="host", port=port, deduplicate=deduplicate)
+        return w1
+
+    first = _submit(_experiment(), "a.nc")
+    assert (first.workflow_id, first.deduplicated) == ("1", False)
+    second = _submit(_experiment(reverse=True), "a.nc")
+    assert (second.workflow_id, second.deduplicated) == ("1", True)
+    assert _submit(_experiment(), "b.nc").workflow_id == "2"
+    assert _submit(_experiment(), "a.nc", port="11733").workflow_id == "3"
+    assert _submit(_experiment(), "a.nc", deduplicate=False).workflow_id == "4"
+    h1.record_status("1", "host:11732", "OPH_STATUS_ERROR")
+    h1.record_status("4", "host:11732", "OPH_STATUS_ABORTED")
+    assert _submit(_experiment(), "a.nc").workflow_id == "5"
+    assert len(pool.documents) == 5
+    # pending in the history, but failed or unreachable on the runtime
+    statuses["5"] = "OPH_STATUS_ERROR"
+    assert _submit(_experiment(), "a.nc").workflow_id == "6"
+    assert h1.query(status="ERROR", endpoint="host:11732")[0]["workflow_id"] == "5"
+    statuses["6"] = None
+    assert _submit(_experiment(), "a.nc").workflow_id == "7"
+    assert _submit(_experiment(), "a.nc").deduplicated
+    assert len(pool.documents) == 7
+    with pytest.raises(AttributeError):
+        _submit(_experiment(), "a.nc", deduplicate="always")
+    h1.close()
+
+
+def test_deduplicate_wait(tmp_path, fake_runtime):
+    h1 = HistoryStore(str(tmp_path / "history.sqlite"))
+    h1.record_submission("7", "host:11732", _experiment(), ["a.nc"])
+    w1 = SimulatedWorkflow(_experiment(), history=h1, connections=fake_runtime(_resume({})))
+    w1.statuses = ["OPH_STATUS_PENDING", "OPH_STATUS_RUNNING", "OPH_STATUS_COMPLETED"]
+    assert w1.submit("a.nc", server="host", deduplicate="wait") == "7"
+    assert w1.statuses == []
+    h1.close()
@@ -0,0 +1,106 @@
+from esdm_pav_client import Experiment, Workflow
+from esdm_pav_client.history import HistoryStore, experiment_hash, parse_since
+from esdm_pav_client.cli.client import run
+from click.testing import CliRunner
+import pytest
+
+
+def _response(status, tasks):
+    return {
+        "response": [
+            {"objkey": "workflow_status", "objcontent": [{"message": status}]},
+            {
+                "objkey": "workflow_list",
+                "objcontent": [
+                    {
+                        "rowkeys": ["TASK NAME", "EXIT STATUS"],
+                        "rowvalues": [[name, s] for name, s in tasks.items()],
+                    }
+                ],
+            },
+        ]
+    }
+
+
+class SimulatedWorkflow(Workflow):
+    responses = []
+
+    def _resume(self, level=None, document_type=None):
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def experiment():
+    e1 = Experiment(name="History", author="Author_name", abstract="History")
+    e1.newTask(name="Import", operator="oph_importnc", arguments={"input": "$1"})
+    return e1
+
+
+def test_record_and_query(tmp_path, experiment):
+    h1 = HistoryStore(str(tmp_path / "history.sqlite"))
+    h1.record_submission("1", "host:11732", experiment, ["a.nc"], now=1000)
+    h1.record_submission("2", "host:11732", experiment, ["b.nc"], now=2000)
+    h1.record_submission("3", "other:11732", None, [], now=3000)
+    h1.record_status("1", "host:11732", "OPH_STATUS_COMPLETED", now=1500)
+    h1.record_status("2", "host:11732", "OPH_STATUS_ERROR", now=2100)
+    h1.record_status("4", "host:11732", "OPH_STATUS_ERROR", now=2100)
+    assert [s["workflow_id"] for s in h1.query()] == ["3", "2", "1"]
+    failed = h1.query(failed=True)
+    assert [s["workflow_id"] for s in failed] == ["2"]
+    assert failed[0]["args"] == ["b.nc"]
+    assert failed[0]["duration"] == 100
+    assert failed[0]["experiment_name"] == "History"
+    assert [s["workflow_id"] for s in h1.query(since=1500, until=3000)] == ["2"]
+    assert [s["workflow_id"] for s in h1.query(endpoint="other:11732")] == ["3"]
+    assert len(h1.query(experiment_hash=experiment_hash(experiment))) == 2
+    assert len(h1.query(limit=1)) == 1
+    assert h1.prune(2500) == 2
+    assert [s["workflow_id"] for s in h1.query()] == ["3"]
+    h1.close()
+
+
+def test_parse_since():
+    assert parse_since("2d", now=200000) == 200000 - 2 * 86400
+    assert parse_since("90", now=100) == 10
+    assert parse_since("2023-02-23") > 0
+    with pytest.raises(AttributeError):
+        parse_since("yesterday")
+
+
+def test_workflow_status(tmp_path, experiment):
+    h1 = HistoryStore(str(tmp_path / "history.sqlite"))
+    w1 = SimulatedWorkflow(7, history=h1)
+    w1.server, w1.port = "host", "11732"
+    h1.record_submission(7, w1._endpoint(), experiment, ["a.nc"])
+    w1.responses = [
+        _response("OPH_STATUS_RUNNING", {"Import": "OPH_STATUS_RUNNING", "Reduce": "PENDING"}),
+        _response("OPH_STATUS_COMPLETED", {"Import": "OPH_STATUS_COMPLETED", "Reduce": "ERROR"}),
+    ]
+    assert w1.status() == "OPH_STATUS_RUNNING"
+    assert h1.query()[0]["ended"] is None
+    assert w1.status() == "OPH_STATUS_COMPLETED"
+    assert h1.query()[0]["status"] == "OPH_STATUS_COMPLETED"
+    tasks = {t["name"]: t for t in h1.tasks(7)}
+    assert tasks["Import"]["status"] == "OPH_STATUS_COMPLETED"
+    assert tasks["Import"]["duration"] is not None
+    assert tasks["Reduce"]["started"] is not None
+    assert tasks["Reduce"]["duration"] is not None
+    h1.close()
+
+
+def test_cli_history(tmp_path, experiment):
+    db = str(tmp_path / "history.sqlite")
+    h1 = HistoryStore(db)
+    h1.record_submission("1", "host:11732", experiment, ["a.nc"])
+    h1.record_submission("2", "host:11732", experiment, ["b.nc"])
+    h1.record_status("2", "host:11732", "OPH_STATUS_ERROR", {"Import": "OPH_STATUS_ERROR"})
+    h1.close()
+    result = CliRunner().invoke(run, ["history", "--db", db, "--failed", "--since", "2d"])
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert lines[0].startswith("WORKFLOW ID")
+    assert len(lines) == 2 and "b.nc" in lines[1] and "OPH_STATUS_ERROR" in lines[1]
+    result = CliRunner().invoke(run, ["history", "--db", db, "--id", "2"])
+    assert "Import" in result.output
+    result = CliRunner().invoke(run, ["history", "--db", db, "--since", "yesterday"])
+    assert result.exit_code == 1
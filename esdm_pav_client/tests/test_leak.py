@@ -0,0 +1,66 @@
+from esdm_pav_client import Experiment, Workflow
+import gc
+import tracemalloc
+
+
+def _build():
+    e1 = Experiment(name="Leak", author="Author_name", abstract="Leak", on_error="skip", ncores=1)
+    e1.newTask(name="Reduce", operator="oph_reduce", arguments={"operation": "avg"})
+    return e1
+
+
+def test_class_state():
+    Experiment(name="Leak", on_error="skip", ncores=1)
+    e1 = Experiment(name="Leak")
+    e1.deinit()
+    assert Experiment.active_attributes == ("name", "author", "abstract")
+    assert "task_name_counter" not in Experiment.__dict__
+    assert "pyophidia_client" not in Workflow.__dict__
+    assert Workflow(e1).pyophidia_client is None
+    e2 = _build()
+    e2.newTask(operator="oph_reduce", arguments={})
+    assert e2.tasks[-1].name == "Leak_2"
+    assert _build().task_name_counter == 2
+    assert "task_name_counter" not in Workflow._to_json(e2)
+    assert not [k for k in e2.wokrflow_to_json() if k.startswith("_")]
+
+
+def test_deinit_state():
+    def _loop(n):
+        for _ in range(n):
+            Experiment(name="Leak", author="Author_name", on_error="skip", ncores=1).deinit()
+
+    _loop(10)
+    attributes = dict(vars(Experiment))
+    tracemalloc.start()
+    try:
+        _loop(1000)
+        gc.collect()
+        baseline = tracemalloc.get_traced_memory()[0]
+        _loop(1000)
+        gc.collect()
+        growth = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    assert dict(vars(Experiment)) == attributes
+    assert Experiment.active_attributes == ("name", "author", "abstract")
+    assert growth < 16 * 1024
+
+
+def test_memory():
+    def _loop(n):
+        for _ in range(n):
+            w1 = Workflow(_build())
+            w1.experiment_object.deinit()
+
+    tracemalloc.start()
+    try:
+        _loop(1000)
+        gc.collect()
+        baseline = tracemalloc.get_traced_memory()[0]
+        _loop(500)
+        gc.collect()
+        growth = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    assert growth < 16 * 1024
@@ -0,0 +1,123 @@
+from esdm_pav_client import Experiment
+from esdm_pav_client.local import LocalExecutor, evaluate_condition
+import pytest
+
+
+class EchoBackend:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, operator, arguments):
+        self.calls.append((operator, arguments))
+        return "cube_{0}".format(len(self.calls))
+
+
+def _loop_experiment(operator="echo", parallel="yes", on_error=None):
+    e1 = Experiment(name="Local", author="Author_name", abstract="Local execution")
+    t1 = e1.newTask(
+        name="Start loop",
+        type="control",
+        operator="for",
+        arguments={"key": "index", "values": "$1", "parallel": parallel},
+    )
+    kwargs = {"on_error": on_error} if on_error else {}
+    t2 = e1.newTask(
+        name="Echo",
+        type="shell",
+        operator=operator,
+        arguments={"args": "value_@{index}"},
+        dependencies={t1: None},
+        **kwargs
+    )
+    t3 = e1.newTask(name="End loop", type="control", operator="endfor", dependencies={t2: "cube"})
+    e1.newTask(
+        name="Gather",
+        type="shell",
+        operator="echo",
+        arguments={},
+        dependencies={t3: "args"},
+    )
+    return e1
+
+
+@pytest.mark.parametrize("parallel", ["yes", "no"])
+def test_loop(parallel):
+    responses = []
+    x1 = LocalExecutor(
+        _loop_experiment(parallel=parallel), max_workers=2, listener=responses.append
+    )
+    assert x1.run("a|b|c") == "OPH_STATUS_COMPLETED"
+    names = [i["name"] for i in x1.instances]
+    assert names == ["Start loop", "Echo (1)", "Echo (2)", "Echo (3)", "End loop", "Gather"]
+    assert x1.outputs[names.index("Gather")] == "value_a value_b value_c"
+    rows = responses[-1]["response"][1]["objcontent"][0]["rowvalues"]
+    assert all(row[2] == "OPH_STATUS_COMPLETED" for row in rows)
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_listener_error():
+    def _listener(response):
+        rows = response["response"][1]["objcontent"][0]["rowvalues"]
+        if any(row[2] == "OPH_STATUS_RUNNING" for row in rows):
+            raise RuntimeError("listener failed")
+
+    x1 = LocalExecutor(_loop_experiment(), max_workers=1, listener=_listener)
+    assert x1.run("a") == "OPH_STATUS_ERROR"
+    assert x1.statuses[-1] == "OPH_STATUS_ABORTED"
+
+
+@pytest.mark.parametrize(
+    "on_error, workflow_status, echo_status, gather_status",
+    [
+        (None, "OPH_STATUS_ERROR", "OPH_STATUS_ERROR", "OPH_STATUS_ABORTED"),
+        ("skip", "OPH_STATUS_COMPLETED", "OPH_STATUS_SKIPPED", "OPH_STATUS_SKIPPED"),
+        ("continue", "OPH_STATUS_COMPLETED", "OPH_STATUS_COMPLETED", "OPH_STATUS_COMPLETED"),
+        ("repeat 2", "OPH_STATUS_ERROR", "OPH_STATUS_ERROR", "OPH_STATUS_ABORTED"),
+    ],
+)
+def test_on_error(on_error, workflow_status, echo_status, gather_status):
+    x1 = LocalExecutor(_loop_experiment("false", on_error=on_error), max_workers=1)
+    assert x1.run("a") == workflow_status
+    assert x1.statuses[1] == echo_status
+    assert x1.statuses[-1] == gather_status
+
+
+@pytest.mark.parametrize("condition, selected", [("$1 > 2", "Then"), ("$1 > 5", "Else")])
+def test_if(condition, selected):
+    e1 = Experiment(name="Branches", author="Author_name", abstract="Local execution")
+    t1 = e1.newTask(name="If", type="control", operator="if", arguments={"condition": condition})
+    t2 = e1.newTask(name="Then", operator="oph_reduce", arguments={}, dependencies={t1: None})
+    t3 = e1.newTask(name="Else", type="control", operator="else", dependencies={t1: None})
+    t4 = e1.newTask(name="Other", operator="oph_aggregate", arguments={}, dependencies={t3: None})
+    e1.newTask(name="End if", type="control", operator="endif", dependencies={t2: "", t4: ""})
+    backend = EchoBackend()
+    x1 = LocalExecutor(e1, backend=backend)
+    assert x1.run("4") == "OPH_STATUS_COMPLETED"
+    statuses = dict(zip([i["name"] for i in x1.instances], x1.statuses))
+    assert len(backend.calls) == 1
+    if selected == "Then":
+        assert backend.calls[0][0] == "oph_reduce"
+        assert statuses["Else"] == statuses["Other"] == "OPH_STATUS_UNSELECTED"
+    else:
+        assert backend.calls[0][0] == "oph_aggregate"
+        assert statuses["Then"] == "OPH_STATUS_UNSELECTED"
+    assert statuses["End if"] == "OPH_STATUS_COMPLETED"
+
+
+def test_backend():
+    e1 = Experiment(name="Backend", author="Author_name", abstract="Local execution")
+    t1 = e1.newTask(name="Import", operator="oph_importnc", arguments={"measure": "tasmax"})
+    e1.newTask(name="Reduce", operator="oph_reduce", arguments={}, dependencies={t1: "cube"})
+    backend = EchoBackend()
+    assert LocalExecutor(e1, backend=backend).run() == "OPH_STATUS_COMPLETED"
+    assert backend.calls[1] == ("oph_reduce", {"cube": "cube_1"})
+    assert LocalExecutor(e1).run() == "OPH_STATUS_ERROR"
+
+
+@pytest.mark.parametrize(
+    "condition, result", [("", True), ("1 == 1 and not 0", True), ("2 * 3 < 5", False)]
+)
+def test_evaluate_condition(condition, result):
+    assert evaluate_condition(condition) is result
+    with pytest.raises(AttributeError):
+        evaluate_condition("__import__('os')")
@@ -0,0 +1,179 @@
+from esdm_pav_client import Experiment, Workflow
+from esdm_pav_client.memo import MemoStore, exported_outputs, task_hashes
+from esdm_pav_client.cli.client import run
+from click.testing import CliRunner
+import pytest
+
+
+def _experiment(operation="max", export="esdm://tos_max", ncores="1"):
+    e1 = Experiment(name="Memo", author="Author_name", abstract="Memo")
+    t1 = e1.newTask(
+        name="Import",
+        operator="oph_importesdm",
+        arguments={"input": "$1", "measure": "tos", "ncores": ncores},
+    )
+    t2 = e1.newTask(
+        name="Reduce",
+        operator="oph_reduce",
+        arguments={"operation": operation},
+        dependencies={t1: "cube"},
+    )
+    e1.newTask(
+        name="Export",
+        operator="oph_exportesdm",
+        arguments={"output": export},
+        dependencies={t2: "cube"},
+    )
+    return e1
+
+
+def _record(store, experiment, args):
+    for export in exported_outputs(experiment.tasks, args).values():
+        store.record(export["hash"], export["output"], export["operator"], export["arguments"])
+
+
+class SimulatedWorkflow(Workflow):
+    def _resume(self, level=None, document_type=None):
+        rows = [[name, "OPH_STATUS_COMPLETED"] for name in ["Import", "Reduce", "Export"]]
+        return {
+            "response": [
+                {"objkey": "workflow_status", "objcontent": [{"message": "OPH_STATUS_COMPLETED"}]},
+                {
+                    "objkey": "workflow_list",
+                    "objcontent": [{"rowkeys": ["TASK NAME", "EXIT STATUS"], "rowvalues": rows}],
+                },
+            ]
+        }
+
+
+@pytest.fixture
+def store(tmp_path):
+    m1 = MemoStore(str(tmp_path / "memo.sqlite"))
+    yield m1
+    m1.close()
+
+
+def test_task_hashes():
+    a = task_hashes(_experiment().tasks, ["a.nc"])
+    assert a[:2] == task_hashes(_experiment(ncores="4").tasks, ["a.nc"])[:2]
+    assert a[0] != task_hashes(_experiment().tasks, ["b.nc"])[0]
+    assert a[0] == task_hashes(_experiment(operation="min").tasks, ["a.nc"])[0]
+    assert a[1] != task_hashes(_experiment(operation="min").tasks, ["a.nc"])[1]
+    assert a[2] is None
+    assert task_hashes(_experiment().tasks)[:2] == [None, None]
+    e1 = _experiment()
+    t1 = e1.newTask(name="Loop", operator="oph_for", arguments={"key": "i", "values": "1|2"})
+    t2 = e1.newTask(
+        name="Body", operator="oph_reduce", arguments={"operation": "avg"}, dependencies={t1: ""}
+    )
+    e1.newTask(name="End", operator="oph_endfor", arguments={}, dependencies={t2: ""})
+    assert task_hashes(e1.tasks, ["a.nc"])[3:] == [None, None, None]
+    hashes = []
+    for pid in ["http://h/1/5", "http://h/1/6"]:
+        e2 = Experiment(name="Memo", author="Author_name", abstract="Memo")
+        e2.newTask(
+            name="Reduce", operator="oph_reduce", arguments={"cube": pid, "operation": "max"}
+        )
+        hashes += task_hashes(e2.tasks)
+    assert None not in hashes and hashes[0] != hashes[1]
+
+
+def test_rewrite(store):
+    _record(store, _experiment(), ["a.nc"])
+    e1 = _experiment(operation="max", export="esdm://tos_max_copy")
+    t3 = e1.newTask(
+        name="Subset",
+        operator="oph_subset",
+        arguments={"subset_dims": "lat"},
+        dependencies={e1.tasks[0]: "cube"},
+    )
+    report = e1.memoize(store, args=["a.nc"])
+    assert report.replaced == [("Reduce", "esdm://tos_max")]
+    assert report.removed == []
+    reduce = e1.tasks[1]
+    assert (reduce.operator, reduce.arguments, reduce.dependencies) == (
+        "oph_importesdm",
+        ["input=esdm://tos_max"],
+        [],
+    )
+    assert t3.dependencies == [{"task": "Import", "argument": "cube"}]
+    e2 = _experiment(export="esdm://other")
+    report = e2.memoize(store, args=["a.nc"])
+    assert report.removed == ["Import"]
+    assert [t.name for t in e2.tasks] == ["Reduce", "Export"]
+    assert not _experiment().memoize(store, args=["b.nc"]).changed
+    assert store.entries()[0]["hits"] == 2
+
+
+def test_rewrite_same_output(store):
+    _record(store, _experiment(), ["a.nc"])
+    e1 = _experiment()
+    t4 = e1.newTask(name="Wait", type="control", operator="wait", arguments={})
+    t4.addDependency(e1.tasks[2])
+    report = e1.memoize(store, args=["a.nc"])
+    assert report.replaced == [("Reduce", "esdm://tos_max")]
+    assert report.removed == ["Import", "Export"]
+    assert [t.name for t in e1.tasks] == ["Reduce", "Wait"]
+    assert e1.tasks[0].arguments == ["input=esdm://tos_max"]
+    assert [d["task"] for d in t4.dependencies] == ["Reduce"]
+
+
+def test_store(store):
+    store.record("a", "esdm://a", "oph_importesdm", {"input": "esdm://a"}, "1", now=100)
+    store.record("b", "esdm://b", "oph_importesdm", {"input": "esdm://b"}, "2", now=200)
+    store.record("c", "esdm://c", "oph_importesdm", {"input": "esdm://c"}, "2", now=300)
+    assert store.lookup("a", now=400)["output"] == "esdm://a"
+    assert store.lookup("d") is None
+    assert store.invalidate(workflow_id="2") == 2
+    assert [e["hash"] for e in store.entries()] == ["a"]
+    assert store.invalidate(output="esdm://a") == 1
+    with pytest.raises(AttributeError):
+        store.invalidate()
+    store.max_entries = 2
+    store.max_age = 1000
+    for n, digest in enumerate(["a", "b", "c"]):
+        store.record(digest, digest, "oph_importesdm", {}, now=1000 + n)
+    assert sorted(e["hash"] for e in store.entries()) == ["b", "c"]
+    store.lookup("b", now=1010)
+    store.record("d", "d", "oph_importesdm", {}, now=1020)
+    assert sorted(e["hash"] for e in store.entries()) == ["b", "d"]
+    assert store.lookup("b", now=2500) is None
+    assert store.evict(now=3000) == 1
+    with pytest.raises(AttributeError):
+        MemoStore(":memory:", max_entries=0)
+
+
+def test_workflow(store, fake_runtime):
+    runtime = fake_runtime(first_id=11)
+    w1 = SimulatedWorkflow(_experiment(), connections=runtime, memo=store)
+    w1.submit("a.nc", server="host", memoize=True)
+    assert not w1.memoization_report.changed
+    assert store.entries() == []
+    assert w1.status() == "OPH_STATUS_COMPLETED"
+    assert [e["output"] for e in store.entries()] == ["esdm://tos_max"]
+    assert store.entries()[0]["workflow_id"] == "11"
+    w2 = SimulatedWorkflow(_experiment(export="esdm://other"), connections=runtime, memo=store)
+    w2.submit("a.nc", server="host", memoize=True)
+    assert w2.memoization_report.replaced == [("Reduce", "esdm://tos_max")]
+    assert len(w2.experiment_object.tasks) == 3
+
+
+def test_cli_memo(store):
+    store.record("a" * 64, "esdm://a", "oph_importesdm", {"input": "esdm://a"}, "7")
+    result = CliRunner().invoke(run, ["memo", "--db", store.path])
+    assert result.exit_code == 0
+    assert "esdm://a" in result.output.splitlines()[1]
+    result = CliRunner().invoke(run, ["memo", "--db", store.path, "--invalidate", "7"])
+    assert "1 outputs forgotten" in result.output
+    assert store.entries() == []
+
+
+@pytest.mark.parametrize("memoize", [False, True])
+def test_cli_memoize(tmp_path, monkeypatch, memoize):
+    opened = []
+    monkeypatch.setattr("esdm_pav_client.cli.client.default_memo", lambda: opened.append(1))
+    _experiment().save(str(tmp_path / "memo.json"))
+    argv = ["-w", str(tmp_path / "memo.json"), "--max-instances", "1", "a.nc"]
+    result = CliRunner().invoke(run, argv + (["--memoize"] if memoize else []))
+    assert result.exit_code == 1
+    assert len(opened) == int(memoize)
@@ -0,0 +1,98 @@
+from esdm_pav_client import Experiment
+import copy
+
+"""Optimizer tests: redundant dependencies, oph_apply chains and dead tasks"""
+e1 = Experiment(
+    name="Sample_Workflow",
+    author="Author_name",
+    abstract="Example workflow for testing",
+)
+t1 = e1.newTask(
+    name="Import", operator="oph_importnc", arguments={"measure": "tos", "input": "tos.nc"}
+)
+t2 = e1.newTask(
+    name="Scale",
+    operator="oph_apply",
+    arguments={"query": "oph_mul_scalar('OPH_FLOAT','OPH_FLOAT',measure,2)"},
+    dependencies={t1: "cube"},
+    on_exit="oph_delete",
+)
+t3 = e1.newTask(
+    name="Shift",
+    operator="oph_apply",
+    arguments={"query": "oph_sum_scalar('OPH_FLOAT','OPH_FLOAT',measure,1)"},
+    dependencies={t2: "cube"},
+)
+t4 = e1.newTask(
+    name="Reduce",
+    operator="oph_reduce",
+    arguments={"operation": "avg"},
+    dependencies={t3: "cube", t1: None},
+)
+t5 = e1.newTask(
+    name="Unused",
+    operator="oph_aggregate",
+    arguments={"operation": "max"},
+    dependencies={t4: "cube"},
+    on_exit="oph_delete",
+)
+t6 = e1.newTask(
+    name="Export",
+    operator="oph_exportnc",
+    arguments={"output": "tos_out.nc"},
+    dependencies={t4: "cube"},
+)
+
+
+def test_optimize():
+    e2 = copy.deepcopy(e1)
+    report = e2.optimize()
+    assert report.removed_dependencies == [("Import", "Reduce")]
+    assert report.fused == [("Scale", "Shift")]
+    assert report.eliminated == ["Unused"]
+    assert [t.name for t in e2.tasks] == ["Import", "Shift", "Reduce", "Export"]
+    shift = e2.tasks[1]
+    assert shift.arguments == [
+        "query=oph_sum_scalar('OPH_FLOAT','OPH_FLOAT',"
+        "oph_mul_scalar('OPH_FLOAT','OPH_FLOAT',measure,2),1)"
+    ]
+    assert shift.dependencies == [{"argument": "cube", "task": "Import"}]
+    assert len(e1.tasks) == 6
+
+
+def test_no_changes():
+    e2 = copy.deepcopy(e1)
+    report = e2.optimize(reduce=False, fuse=False, eliminate=False)
+    assert not report.changed
+    e2.optimize()
+    assert not e2.optimize().changed
+
+
+def test_incompatible_apply():
+    e2 = copy.deepcopy(e1)
+    e2.tasks[1].on_error = "skip"
+    report = e2.optimize(reduce=False, eliminate=False)
+    assert report.fused == []
+    e2 = copy.deepcopy(e1)
+    e2.tasks[1].on_exit = None
+    assert e2.optimize(reduce=False, eliminate=False).fused == []
+
+
+def test_large():
+    e2 = Experiment(name="Large", author="Author_name", abstract="Large")
+    previous = e2.newTask(name="Import", operator="oph_importnc", arguments={"measure": "tos"})
+    first = previous
+    with e2.bulk():
+        for i in range(5000):
+            previous = e2.newTask(
+                name="Apply {0}".format(i),
+                operator="oph_apply",
+                arguments={"query": "oph_sum_scalar('OPH_FLOAT','OPH_FLOAT',measure,1)"},
+                dependencies={previous: "cube", first: None},
+                on_exit="oph_delete",
+            )
+    report = e2.optimize(eliminate=False)
+    assert len(report.removed_dependencies) == 4999
+    assert len(report.fused) == 4999
+    assert [t.name for t in e2.tasks] == ["Import", "Apply 4999"]
+    assert e2.tasks[1].arguments[0].count("oph_sum_scalar") == 5000
@@ -0,0 +1,107 @@
+from esdm_pav_client import Experiment
+from esdm_pav_client.partition import Partitioner, WorkflowGroup
+import pytest
+
+"""Partitioning tests: a parallel loop exporting its results followed by a
+   join task, plus an independent branch"""
+e1 = Experiment(
+    name="Sample_Workflow",
+    author="Author_name",
+    abstract="Example workflow for testing",
+)
+t1 = e1.newTask(
+    name="Start loop",
+    type="control",
+    operator="for",
+    arguments={"key": "index", "values": "$1", "parallel": "yes"},
+)
+t2 = e1.newTask(
+    name="Import",
+    operator="oph_importnc",
+    arguments={"measure": "tasmax", "input": "tasmax_@{index}.nc"},
+    dependencies={t1: None},
+)
+t3 = e1.newTask(
+    name="Export",
+    operator="oph_exportnc",
+    arguments={"output": "tasmax_@{index}_out.nc"},
+    dependencies={t2: "cube"},
+)
+t4 = e1.newTask(name="End loop", type="control", operator="endfor", dependencies={t3: None})
+t5 = e1.newTask(
+    name="Report",
+    operator="oph_script",
+    arguments={"script": "report.sh"},
+    dependencies={t4: None},
+)
+t6 = e1.newTask(name="Independent", operator="oph_list", arguments={"level": "2"})
+
+
+def _values(experiment):
+    for t in experiment.tasks:
+        if t.operator == "for":
+            return [a for a in t.arguments if a.startswith("values=")][0][7:]
+
+
+def test_loop_split():
+    parts, join = Partitioner(e1, max_parts=3).partition("1|2|3|4|5")
+    assert len(parts) == 3
+    assert [_values(p) for p in parts[:2]] == ["1|3|5", "2|4"]
+    assert [t.name for t in parts[2].tasks] == ["Independent"]
+    assert [t.name for t in join.tasks] == ["Report"]
+    assert join.tasks[0].dependencies == []
+    assert parts[0].name == "Sample_Workflow (part 1)"
+
+
+def test_unresolved_loop():
+    parts, join = Partitioner(e1, max_parts=3).partition()
+    assert join is None
+    assert sorted(len(p.tasks) for p in parts) == [1, 5]
+
+
+def test_components_binning():
+    parts, join = Partitioner(e1, max_parts=1).partition()
+    assert len(parts) == 1
+    assert len(parts[0].tasks) == len(e1.tasks)
+
+
+class SimulatedGroup(WorkflowGroup):
+    def _submit(self, workflow):
+        workflow.workflow_id = str(id(workflow))
+
+    def _status(self, workflow):
+        return self.statuses.get(workflow.workflow_id, "OPH_STATUS_COMPLETED")
+
+
+def test_group_join():
+    parts, join = Partitioner(e1, max_parts=3).partition("1|2")
+    g1 = SimulatedGroup(parts, join=join)
+    g1.statuses = {}
+    g1.submit("1|2")
+    g1.statuses[g1.workflow_ids[0]] = "OPH_STATUS_RUNNING"
+    assert g1.status() == "OPH_STATUS_RUNNING"
+    assert g1.join_workflow is None
+    g1.statuses = {}
+    assert g1.status() == "OPH_STATUS_RUNNING"
+    assert g1.join_workflow is not None
+    assert g1.monitor(frequency=0) == "OPH_STATUS_COMPLETED"
+
+
+def test_group_unknown_status():
+    parts, join = Partitioner(e1, max_parts=3).partition("1|2")
+    g1 = SimulatedGroup(parts, join=join)
+    g1.statuses = {}
+    g1.submit("1|2")
+    g1.statuses[g1.workflow_ids[0]] = None
+    assert g1.status() == "OPH_STATUS_RUNNING"
+    assert g1.join_workflow is None
+    g1.statuses = {}
+    g1.status()
+    g1.statuses[g1.join_workflow.workflow_id] = None
+    assert g1.status() == "OPH_STATUS_RUNNING"
+
+
+@pytest.mark.parametrize(("max_parts"), [(0), ("2")])
+def test_wrong_max_parts(max_parts):
+    with pytest.raises(AttributeError):
+        Partitioner(e1, max_parts=max_parts)
@@ -0,0 +1,105 @@
+from esdm_pav_client.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    Resilience,
+    RetryPolicy,
+    RuntimeCallError,
+)
+import pytest
+
+"""Resilience layer tests: the called functions stand for runtime calls"""
+endpoint = "127.0.0.1:11732"
+
+
+def _flaky(failures, error):
+    calls = []
+
+    def _call():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return "ok"
+
+    return _call, calls
+
+
+def _resilience(**kwargs):
+    r = Resilience(**kwargs)
+    r.sleep = lambda seconds: None
+    return r
+
+
+def test_retry_transient():
+    r = _resilience(policy=RetryPolicy(max_attempts=3))
+    call, calls = _flaky(2, ConnectionRefusedError())
+    assert r.call(endpoint, "submit", call) == "ok"
+    assert len(calls) == 3
+    assert r.metrics(endpoint)["retries"] == 2
+
+
+def test_no_retry_permanent():
+    r = _resilience()
+    call, calls = _flaky(1, RuntimeCallError("rejected", transient=False))
+    with pytest.raises(RuntimeCallError):
+        r.call(endpoint, "submit", call)
+    assert len(calls) == 1
+
+
+def test_idempotent_submission():
+    r = _resilience(policy=RetryPolicy(max_attempts=5))
+    call, calls = _flaky(1, TimeoutError())
+    with pytest.raises(TimeoutError):
+        r.call(endpoint, "wsubmit", call, idempotency_key="k1")
+    assert len(calls) == 1
+    call, calls = _flaky(1, ConnectionRefusedError())
+    assert r.call(endpoint, "wsubmit", call, idempotency_key="k2") == "ok"
+    assert r.call(endpoint, "wsubmit", call, idempotency_key="k2") == "ok"
+    assert len(calls) == 2
+    assert r.metrics(endpoint)["deduplicated"] == 1
+
+
+def test_circuit_breaker():
+    r = _resilience(policy=RetryPolicy(max_attempts=1), failure_threshold=2, reset_timeout=60)
+    call, calls = _flaky(10, ConnectionRefusedError())
+    for _ in range(2):
+        with pytest.raises(ConnectionRefusedError):
+            r.call(endpoint, "submit", call)
+    with pytest.raises(CircuitOpenError):
+        r.call(endpoint, "submit", call)
+    assert len(calls) == 2
+    assert r.metrics(endpoint)["trips"] == 1
+    assert r.metrics(endpoint)["state"] == CircuitBreaker.OPEN
+    assert r.call("127.0.0.2:11732", "submit", lambda: "ok") == "ok"
+
+
+def test_half_open_rejected():
+    r = _resilience(policy=RetryPolicy(max_attempts=1), failure_threshold=1, reset_timeout=0)
+    with pytest.raises(ConnectionRefusedError):
+        r.call(endpoint, "submit", _flaky(1, ConnectionRefusedError())[0])
+    assert r.metrics(endpoint)["state"] == CircuitBreaker.OPEN
+    with pytest.raises(RuntimeCallError):
+        r.call(endpoint, "submit", _flaky(1, RuntimeCallError("rejected", transient=False))[0])
+    assert r.metrics(endpoint)["state"] == CircuitBreaker.CLOSED
+    assert r.call(endpoint, "submit", lambda: "ok") == "ok"
+
+
+def test_half_open():
+    b = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    assert b.record_failure()
+    assert b.allow()
+    assert not b.allow()
+    b.record_success()
+    assert b.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.parametrize(("max_attempts", "base_delay"), [(0, 1), ("3", 1), (3, -1)])
+def test_wrong_policy(max_attempts, base_delay):
+    with pytest.raises(AttributeError):
+        RetryPolicy(max_attempts=max_attempts, base_delay=base_delay)
+
+
+def test_backoff_bound():
+    p = RetryPolicy(base_delay=1, max_delay=5, jitter=False)
+    assert [p.delay(a) for a in range(1, 5)] == [1, 2, 4, 5]
+    p = RetryPolicy(base_delay=1, max_delay=5)
+    assert all(0 <= p.delay(a) <= 5 for a in range(1, 10))
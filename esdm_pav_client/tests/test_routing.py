@@ -0,0 +1,89 @@
+from esdm_pav_client import Workflow, Experiment
+from esdm_pav_client.routing import Endpoint, EndpointPool
+import pytest
+
+"""Routing tests: no submission is performed, only the runtime choice"""
+endpoints = ["10.0.0.1:11732", ("10.0.0.2", "11732", 3), {"server": "10.0.0.3"}]
+
+
+def test_round_robin():
+    p1 = EndpointPool(endpoints)
+    chosen = [str(p1.choose()) for _ in range(4)]
+    assert chosen == [
+        "10.0.0.1:11732",
+        "10.0.0.2:11732",
+        "10.0.0.3:11732",
+        "10.0.0.1:11732",
+    ]
+    assert str(p1.choose(exclude=["10.0.0.2:11732"])) == "10.0.0.3:11732"
+
+
+def test_weighted():
+    p1 = EndpointPool(endpoints, policy="weighted")
+    chosen = [str(p1.choose()) for _ in range(10)]
+    assert chosen.count("10.0.0.2:11732") == 6
+    assert chosen.count("10.0.0.1:11732") == 2
+
+
+def test_least_in_flight():
+    p1 = EndpointPool(endpoints[:2], policy="least_in_flight")
+    p1.assign(1, p1.choose())
+    assert str(p1.choose()) == "10.0.0.2:11732"
+    for i in range(2, 5):
+        p1.assign(i, "10.0.0.2:11732")
+    assert str(p1.choose()) == "10.0.0.1:11732"
+    p1.release(1, "10.0.0.1:11732")
+    assert p1.in_flight()["10.0.0.1:11732"] == 0
+
+
+def test_assignments(tmp_path):
+    endpoints_file = tmp_path / "endpoints.txt"
+    endpoints_file.write_text("# runtimes\n10.0.0.1:11732\n10.0.0.2:11733 2\n")
+    p1 = EndpointPool.load(str(endpoints_file))
+    assert p1.endpoints[1].weight == 2
+    p1.assign(42, p1.endpoints[1])
+    p2 = EndpointPool.load(str(endpoints_file))
+    assert p2.in_flight()["10.0.0.2:11733"] == 1
+    w1 = Workflow(42, endpoints=p2)
+    assert (w1.server, w1.port) == ("10.0.0.2", "11733")
+    w1._track_status("OPH_STATUS_COMPLETED")
+    assert p2.in_flight()["10.0.0.2:11733"] == 0
+
+
+def test_same_id():
+    p1 = EndpointPool(endpoints[:2])
+    p1.assign(7, "10.0.0.1:11732")
+    p1.assign(7, "10.0.0.2:11732")
+    assert p1.in_flight() == {"10.0.0.1:11732": 1, "10.0.0.2:11732": 1}
+    with pytest.raises(AttributeError):
+        p1.endpoint_for(7)
+    w1 = Workflow(8, endpoints=p1)
+    w1.workflow_id, w1.server, w1.port = 7, "10.0.0.2", "11732"
+    w1._track_status("OPH_STATUS_COMPLETED")
+    assert p1.in_flight() == {"10.0.0.1:11732": 1, "10.0.0.2:11732": 0}
+
+
+def test_pruning(tmp_path):
+    state_file = str(tmp_path / "assignments.json")
+    p1 = EndpointPool(endpoints[:2], state_file=state_file, max_assignments=2)
+    for i in range(4):
+        p1.assign(i, "10.0.0.1:11732")
+    assert list(p1.assignments) == ["0", "1", "2", "3"]
+    p1.release(1, "10.0.0.1:11732")
+    p1.release(2, "10.0.0.1:11732")
+    assert list(p1.assignments) == ["0", "3"]
+    p1.release(0, "10.0.0.1:11732")
+    p1.assign(2, "10.0.0.2:11732")
+    assert list(p1.assignments) == ["3", "2"]
+    p2 = EndpointPool(endpoints[:2], state_file=state_file, max_assignments=2)
+    assert str(p2.endpoint_for(3)) == "10.0.0.1:11732"
+    assert p2.endpoint_for(0) is None
+
+
+@pytest.mark.parametrize(
+    ("pool", "policy"),
+    [([], "round_robin"), (endpoints, "random"), ([("10.0.0.1", "1", 0)], "weighted")],
+)
+def test_wrong_pool(pool, policy):
+    with pytest.raises(AttributeError):
+        EndpointPool(pool, policy=policy)
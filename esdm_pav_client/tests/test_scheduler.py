@@ -0,0 +1,136 @@
+from esdm_pav_client import Experiment
+from esdm_pav_client.history import HistoryStore
+from esdm_pav_client.scheduler import SubmissionScheduler
+import pytest
+
+"""Scheduler tests: submissions and status queries are simulated, so that no
+   runtime is needed"""
+e1 = Experiment(
+    name="Sample_Workflow",
+    author="Author_name",
+    abstract="Example workflow for testing",
+)
+t1 = e1.newTask(
+    name="mytask1",
+    operator="oph_script",
+    arguments={"script": "sleep.sh"},
+    dependencies={},
+)
+
+
+class SimulatedScheduler(SubmissionScheduler):
+    statuses = {}
+    initial_status = "OPH_STATUS_RUNNING"
+
+    def _submit(self, entry):
+        workflow_id = str(len(self.statuses) + 1)
+        self.statuses[workflow_id] = self.initial_status
+        self.order.append(entry["priority"])
+        return workflow_id
+
+    def _status(self, entry):
+        return self.statuses[entry["workflow_id"]]
+
+
+def _scheduler(**kwargs):
+    s = SimulatedScheduler(**kwargs)
+    s.statuses = {}
+    s.order = []
+    return s
+
+
+def test_admission_and_priority():
+    s1 = _scheduler(max_in_flight=2)
+    for priority in [0, 5, 1, 3]:
+        s1.enqueue(e1, "1", priority=priority)
+    assert len(s1.poll()) == 2
+    assert s1.order == [5, 3]
+    assert len(s1.pending) == 2
+    assert s1.poll() == {}
+    s1.statuses["1"] = "OPH_STATUS_COMPLETED"
+    assert len(s1.poll()) == 1
+    assert s1.order == [5, 3, 1]
+    assert "OPH_STATUS_COMPLETED" in s1.results.values()
+
+
+def test_unknown_status():
+    s1 = _scheduler(max_in_flight=1)
+    k1 = s1.enqueue(e1, "1")
+    s1.enqueue(e1, "2")
+    s1.poll()
+    s1.statuses["1"] = None
+    assert s1.poll() == {}
+    assert list(s1.running) == [k1]
+    assert s1.results == {}
+    s1.statuses["1"] = "OPH_STATUS_COMPLETED"
+    assert len(s1.poll()) == 1
+    assert s1.results == {k1: "OPH_STATUS_COMPLETED"}
+
+
+def test_per_endpoint_limit():
+    s1 = _scheduler(max_in_flight=1)
+    s1.enqueue(e1, server="10.0.0.1")
+    s1.enqueue(e1, server="10.0.0.1")
+    s1.enqueue(e1, server="10.0.0.2")
+    assert len(s1.poll()) == 2
+    assert s1.in_flight(server="10.0.0.1") == 1
+    assert s1.in_flight(server="10.0.0.2") == 1
+
+
+def test_persistence(tmp_path):
+    state_file = str(tmp_path / "queue.json")
+    s1 = _scheduler(max_in_flight=1, state_file=state_file)
+    k1 = s1.enqueue(e1, "1", priority=1)
+    k2 = s1.enqueue(e1, "2")
+    s1.poll()
+    s2 = _scheduler(max_in_flight=1, state_file=state_file)
+    assert s2.pending == [k2]
+    assert list(s2.running) == [k1]
+    s2.statuses = {"1": "OPH_STATUS_ERROR"}
+    s2.initial_status = "OPH_STATUS_COMPLETED"
+    results = s2.run(frequency=0)
+    assert results == {k1: "OPH_STATUS_ERROR", k2: "OPH_STATUS_COMPLETED"}
+
+
+class InterruptedScheduler(SimulatedScheduler):
+    # the workflow reaches the runtime (and the history, if recorded) but the
+    # scheduler stops before saving its id
+    recorded = True
+
+    def _submit(self, entry):
+        workflow_id = super()._submit(entry)
+        if self.recorded:
+            self.history.record_submission(
+                workflow_id,
+                self._endpoint(entry),
+                Experiment._from_dict(dict(entry["document"])),
+                entry["args"],
+            )
+        raise KeyboardInterrupt
+
+
+@pytest.mark.parametrize(("recorded"), [(True), (False)])
+def test_interrupted_submission(tmp_path, recorded):
+    state_file = str(tmp_path / "queue.json")
+    h1 = HistoryStore(str(tmp_path / "history.sqlite"))
+    s1 = InterruptedScheduler(state_file=state_file, history=h1)
+    s1.statuses = {}
+    s1.order = []
+    s1.recorded = recorded
+    k1 = s1.enqueue(e1, "1")
+    with pytest.raises(KeyboardInterrupt):
+        s1.poll()
+    s2 = _scheduler(state_file=state_file, history=h1)
+    if recorded:
+        assert s2.running == {k1: "1"}
+        assert s2.pending == []
+    else:
+        assert s2.running == {}
+        assert s2.pending == [k1]
+    h1.close()
+
+
+@pytest.mark.parametrize(("max_in_flight"), [(0), ("4"), (None)])
+def test_wrong_limit(max_in_flight):
+    with pytest.raises(AttributeError):
+        SubmissionScheduler(max_in_flight=max_in_flight)
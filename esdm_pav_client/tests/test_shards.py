@@ -0,0 +1,94 @@
+from esdm_pav_client import Experiment, Workflow
+from esdm_pav_client import shards
+import json
+import pytest
+
+
+def _experiment(n=50):
+    e1 = Experiment(name="Shards", author="Author_name", abstract="Shards", on_error="skip")
+    t1 = e1.newTask(name="Import", operator="oph_importnc", arguments={"input": "$1"})
+    for i in range(n):
+        e1.newTask(
+            name="Reduce {0}".format(i),
+            operator="oph_reduce",
+            arguments={"operation": "avg", "description": "a=b"},
+            dependencies={t1: "cube"},
+            on_error="continue",
+        )
+    return e1
+
+
+@pytest.mark.parametrize("processes", [1, 3, None])
+def test_roundtrip(tmp_path, monkeypatch, processes):
+    # parsed by the workers however small the shards and the host
+    monkeypatch.setattr(shards, "parallel_bytes", 1)
+    monkeypatch.setattr(shards.os, "cpu_count", lambda: 4)
+    e1 = _experiment()
+    e1.save(str(tmp_path / "large"), shards=4)
+    manifest = json.loads((tmp_path / "large.json").read_text())
+    assert "tasks" not in manifest
+    assert [s["file"] for s in manifest["task_shards"]] == [
+        "large.{0}.json".format(i) for i in range(4)
+    ]
+    assert sum(s["tasks"] for s in manifest["task_shards"]) == 51
+    e2 = Experiment.load(str(tmp_path / "large.json"), processes=processes)
+    assert Workflow._to_json(e2) == Workflow._to_json(e1)
+    assert e2.validate().valid
+    assert e2.tasks[0]._experiment is e2
+    e2.newTask(
+        name="Export", operator="oph_exportnc2", arguments={}, dependencies={e2.tasks[5]: "cube"}
+    )
+
+
+def test_few_tasks(tmp_path):
+    e1 = _experiment(n=1)
+    e1.save(str(tmp_path / "small.json"), shards=8)
+    assert len(json.loads((tmp_path / "small.json").read_text())["task_shards"]) == 2
+    assert Workflow._to_json(Experiment.load(str(tmp_path / "small.json"))) == Workflow._to_json(e1)
+    e2 = Experiment(name="Empty")
+    e2.save(str(tmp_path / "empty"), shards=2)
+    assert Experiment.load(str(tmp_path / "empty.json")).tasks == []
+
+
+def test_small(tmp_path, monkeypatch):
+    import concurrent.futures
+
+    def _pool(*args, **kwargs):
+        raise AssertionError("process pool started for a small experiment")
+
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", _pool)
+    e1 = _experiment()
+    e1.save(str(tmp_path / "large"), shards=4)
+    e2 = Experiment.load(str(tmp_path / "large.json"), processes=4)
+    assert Workflow._to_json(e2) == Workflow._to_json(e1)
+
+
+def test_worker_result(tmp_path):
+    import marshal
+
+    e1 = _experiment(n=3)
+    manifest = shards.save_shards(e1.wokrflow_to_json(), str(tmp_path / "large.json"), 2)
+    chunk = shards.parse_shard(str(tmp_path / "large.0.json"), manifest["task_shards"][0]["sha256"])
+    assert isinstance(chunk, bytes)
+    tasks = Experiment._tasks_from_columns(marshal.loads(chunk))
+    assert [t.name for t in tasks] == ["Import", "Reduce 0"]
+    assert tasks[1].dependencies == [{"task": "Import", "argument": "cube"}]
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_errors(tmp_path, monkeypatch, processes):
+    monkeypatch.setattr(shards, "parallel_bytes", 1)
+    monkeypatch.setattr(shards.os, "cpu_count", lambda: 4)
+    e1 = _experiment()
+    with pytest.raises(AttributeError):
+        e1.save(str(tmp_path / "large"), shards=0)
+    e1.save(str(tmp_path / "large"), shards=2)
+    with pytest.raises(AttributeError):
+        Experiment.load(str(tmp_path / "large.json"), processes=0)
+    shard = tmp_path / "large.1.json"
+    shard.write_text(shard.read_text().replace("avg", "max"))
+    with pytest.raises(ValueError):
+        Experiment.load(str(tmp_path / "large.json"), processes=processes)
+    shard.unlink()
+    with pytest.raises(IOError):
+        Experiment.load(str(tmp_path / "large.json"), processes=processes)
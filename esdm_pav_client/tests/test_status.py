@@ -0,0 +1,186 @@
+from esdm_pav_client import Workflow, Resilience, RetryPolicy, StatusCache
+from esdm_pav_client.status import filter_statuses, status_filter, unsupported_filters
+from esdm_pav_client.status import stream_grid, stream_message
+import json
+import re
+import pytest
+
+_statuses = ["OPH_STATUS_COMPLETED", "OPH_STATUS_RUNNING", "OPH_STATUS_PENDING", "OPH_STATUS_ERROR"]
+
+
+def _response(rows, status="OPH_STATUS_RUNNING", objcontent_first=False):
+    workflow_list = {
+        "objclass": "grid",
+        "objkey": "workflow_list",
+        "objcontent": [
+            {
+                "title": "Workflow",
+                "rowkeys": ["MARKER ID", "TASK NAME", "EXIT STATUS"],
+                "rowvalues": [[str(i), name, s] for i, (name, s) in enumerate(rows)],
+            }
+        ],
+    }
+    if objcontent_first:
+        workflow_list = {k: workflow_list[k] for k in ["objcontent", "objclass", "objkey"]}
+    return json.dumps(
+        {
+            "response": [
+                {
+                    "objclass": "text",
+                    "objkey": "workflow_status",
+                    "objcontent": [{"message": status}],
+                },
+                workflow_list,
+            ]
+        }
+    )
+
+
+def _resume(runtime, query):
+    # answer oph_resume with the rows and the status of the runtime, and an
+    # error for the status filters of the runtimes that do not support them
+    match = re.search("status_filter=([01]+);", query)
+    if match and not runtime.filters:
+        return None
+    rows = runtime.rows
+    if match:
+        bits = match.group(1)
+        rows = [
+            (n, s)
+            for n, s in rows
+            if any(b == "1" and s.endswith(k) for b, k in zip(bits, filter_statuses))
+        ]
+    return _response(rows, runtime.status)
+
+
+@pytest.fixture
+def runtime_of(fake_runtime):
+    def _runtime(rows, filters=True):
+        runtime = fake_runtime(lambda query: _resume(runtime, query))
+        runtime.rows = rows
+        runtime.filters = filters
+        runtime.status = "OPH_STATUS_RUNNING"
+        return runtime
+
+    return _runtime
+
+
+def _workflow(runtime, server="host"):
+    w1 = Workflow(
+        7,
+        connections=runtime,
+        status_cache=StatusCache(ttl=0),
+        resilience=Resilience(RetryPolicy(max_attempts=1)),
+    )
+    w1.server = server
+    return w1
+
+
+def _rows(n):
+    return [("Task ({0})".format(i), _statuses[i % 4]) for i in range(n)]
+
+
+def test_stream():
+    rows = _rows(10)
+    for layout in [False, True]:
+        text = _response(rows, objcontent_first=layout)
+        rowkeys, values = stream_grid(text)
+        assert rowkeys == ["MARKER ID", "TASK NAME", "EXIT STATUS"]
+        assert list(values) == json.loads(text)["response"][1]["objcontent"][0]["rowvalues"]
+        assert list(stream_grid(text, lazy=False)[1]) == list(stream_grid(text)[1])
+        assert stream_message(text) == "OPH_STATUS_RUNNING"
+    rowkeys, values = stream_grid(_response([]))
+    assert list(values) == []
+    assert stream_grid(json.dumps({"response": []}))[0] is None
+    assert status_filter(["RUNNING", "OPH_STATUS_ERROR"]) == "00101000"
+    assert status_filter(["OTHER"]) is None
+
+
+def test_filters(runtime_of):
+    runtime = runtime_of(_rows(100))
+    w1 = _workflow(runtime)
+    page = w1.task_statuses(states=["ERROR"])
+    assert page.filtered
+    assert list(page.tasks) == ["Task ({0})".format(i) for i in range(3, 100, 4)]
+    assert page.workflow_status == "OPH_STATUS_RUNNING"
+    assert runtime.queries == ["oph_resume status_filter=00001000;id=7;"]
+    unfiltered = runtime_of(_rows(100), filters=False)
+    w2 = _workflow(unfiltered, "old")
+    assert w2.task_statuses(states=["ERROR"]).tasks == page.tasks
+    assert "old:11732" in unsupported_filters
+    page = w2.task_statuses(states=["ERROR"])
+    assert not page.filtered
+    assert page.tasks == w1.task_statuses(states=["ERROR"]).tasks
+    assert len(unfiltered.queries) == 3
+
+
+def test_pages(runtime_of):
+    w1 = _workflow(runtime_of(_rows(1000)))
+    names = []
+    offset = 0
+    while offset is not None:
+        page = w1.task_statuses(states=["RUNNING", "PENDING"], offset=offset, limit=100)
+        names += list(page.tasks)
+        offset = page.next_offset
+    assert len(names) == 500 and len(set(names)) == 500
+    # the rows after a page are recorded too
+    assert w1.task_statuses(since=w1.task_statuses(limit=10).marker).tasks == {}
+    with pytest.raises(AttributeError):
+        w1.task_statuses(limit=0)
+
+
+def test_since(runtime_of):
+    runtime = runtime_of(_rows(1000))
+    w1 = _workflow(runtime)
+    page = w1.task_statuses()
+    assert len(page.tasks) == 1000
+    assert w1.task_statuses(since=page.marker).tasks == {}
+    runtime.rows[5] = ("Task (5)", "OPH_STATUS_COMPLETED")
+    runtime.rows[6] = ("Task (6)", "OPH_STATUS_ERROR")
+    changes = w1.task_statuses(since=page.marker)
+    assert changes.tasks == {"Task (5)": "OPH_STATUS_COMPLETED", "Task (6)": "OPH_STATUS_ERROR"}
+    assert w1.task_statuses(since=page.marker, states=["ERROR"]).tasks == {
+        "Task (6)": "OPH_STATUS_ERROR"
+    }
+    assert w1.task_statuses(since=changes.marker).tasks == {}
+
+
+def test_monitor(capsys, runtime_of):
+    runtime = runtime_of(_rows(8))
+
+    class MonitoredWorkflow(Workflow):
+        polls = 0
+
+        def _resume(self, level=None, document_type=None):
+            return {
+                "response": [
+                    {
+                        "objkey": "resume",
+                        "objcontent": [
+                            {
+                                "rowkeys": ["COMMAND"],
+                                "rowvalues": [[json.dumps({"name": "Monitor", "tasks": []})]],
+                            }
+                        ],
+                    }
+                ]
+            }
+
+        def _record_status(self, workflow_status, response=None, tasks=None):
+            self.recorded.append(dict(tasks))
+            self.polls += 1
+            runtime.rows[self.polls] = (runtime.rows[self.polls][0], "OPH_STATUS_COMPLETED")
+            if self.polls == 3:
+                runtime.status = "OPH_STATUS_COMPLETED"
+
+    w1 = MonitoredWorkflow(
+        7,
+        connections=runtime,
+        status_cache=StatusCache(ttl=0),
+        resilience=Resilience(RetryPolicy(max_attempts=1)),
+    )
+    w1.server = "host"
+    w1.recorded = []
+    assert w1.monitor(frequency=0, visual_mode=False) == "OPH_STATUS_COMPLETED"
+    assert [len(r) for r in w1.recorded] == [8, 1, 1, 8]
+    assert w1.recorded[1] == {"Task (1)": "OPH_STATUS_COMPLETED"}
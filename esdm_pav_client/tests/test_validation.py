@@ -0,0 +1,67 @@
+from esdm_pav_client import Experiment
+from esdm_pav_client.validation import ExperimentValidationError
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+
+def test_bulk_threads():
+    e1 = Experiment(name="Bulk", author="Author_name", abstract="Bulk")
+
+    def _add(n):
+        t1 = e1.newTask(name="Reduce {0}".format(n), operator="oph_reduce", arguments={})
+        t1.copyDependency({"task": "Import {0}".format(n), "argument": "cube"})
+        e1.newTask(name="Import {0}".format(n), operator="oph_importnc", arguments={})
+        e1.newTask(operator="oph_list", arguments={})
+
+    with e1.bulk() as report:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(_add, range(50)))
+    assert report.valid
+    assert len(e1.tasks) == 150
+    assert len(set(t.name for t in e1.tasks)) == 150
+    position = {t.name: i for i, t in enumerate(e1.tasks)}
+    for n in range(50):
+        assert position["Import {0}".format(n)] < position["Reduce {0}".format(n)]
+    assert e1.validate().valid
+    assert e1.graph.levels()[position["Reduce 7"]] == 1
+
+
+def test_bulk_errors():
+    e1 = Experiment(name="Bulk", author="Author_name", abstract="Bulk")
+    with pytest.raises(ExperimentValidationError) as error:
+        with e1.bulk():
+            t1 = e1.newTask(name="A", operator="oph_reduce", arguments={})
+            t2 = e1.newTask(name="B", operator="oph_reduce", arguments={}, dependencies={t1: ""})
+            t1.addDependency(t2)
+            e1.newTask(name="C", operator="oph_reduce", arguments={})
+            e1.newTask(name="C", operator="oph_reduce", arguments={})
+            e1.tasks[-1].copyDependency({"task": "D"})
+    errors = error.value.report.errors
+    assert errors == [
+        "duplicate task name: C",
+        "task C depends on unknown task D",
+        "dependency cycle among the tasks: A, B",
+    ]
+    assert isinstance(error.value, AttributeError)
+    assert [t.name for t in e1.tasks] == ["A", "B", "C", "C"]
+    with pytest.raises(AttributeError):
+        e1.newTask(name="A", operator="oph_reduce", arguments={})
+    e2 = Experiment(name="Bulk", author="Author_name", abstract="Bulk")
+    with e2.bulk(strict=False) as report:
+        e2.newTask(name="A", operator="oph_reduce", arguments={}).copyDependency({"task": "B"})
+    assert not report.valid
+    assert str(e2.validate()) == "task A depends on unknown task B"
+
+
+def test_bulk_exception():
+    e1 = Experiment(name="Bulk", author="Author_name", abstract="Bulk")
+    with pytest.raises(ValueError):
+        with e1.bulk():
+            e1.newTask(name="A", operator="oph_reduce", arguments={}).copyDependency({"task": "B"})
+            raise ValueError()
+    with e1.bulk():
+        with pytest.raises(AttributeError):
+            with e1.bulk():
+                pass
+        e1.newTask(name="B", operator="oph_reduce", arguments={})
+    assert [t.name for t in e1.tasks] == ["B", "A"]
@@ -0,0 +1,134 @@
+import threading
+
+try:
+    from dependencies import edges
+except ImportError:
+    from .dependencies import edges
+
+
+class ValidationReport:
+    """
+    Errors found in the tasks of an experiment by Experiment.validate or at
+    the end of Experiment.bulk
+
+    Attributes
+    ----------
+    errors : list of str
+        description of each error
+    """
+
+    def __init__(self):
+        self.errors = []
+
+    @property
+    def valid(self):
+        return not self.errors
+
+    def __str__(self):
+        return "\n".join(self.errors) if self.errors else "experiment is valid"
+
+    def __repr__(self):
+        return "<ValidationReport: {0} errors>".format(len(self.errors))
+
+
+class ExperimentValidationError(AttributeError):
+    """
+    Raised at the end of Experiment.bulk when the tasks are not valid; the
+    report attribute lists all the errors
+    """
+
+    def __init__(self, report):
+        super().__init__(
+            "{0} errors in the experiment:\n{1}".format(len(report.errors), str(report))
+        )
+        self.report = report
+
+
+def validate_tasks(tasks, report=None):
+    """
+    Check the tasks of an experiment in a single pass: duplicate names,
+    dependencies on unknown tasks and dependency cycles
+
+    Parameters
+    ----------
+    tasks : list of <class 'esdm_pav_client.task.Task'>
+        tasks of the experiment
+    report : <class 'esdm_pav_client.validation.ValidationReport'>, optional
+        report the errors are added to, a new one if None
+
+    Returns
+    -------
+    (report, order) : tuple
+        Returns the report and the task positions in topological order (ties
+        broken by position), None if the tasks are not valid
+    """
+    import heapq
+
+    if report is None:
+        report = ValidationReport()
+    index = {}
+    duplicates = set()
+    for i, task in enumerate(tasks):
+        if task.name in index:
+            duplicates.add(task.name)
+        index.setdefault(task.name, i)
+    for name in sorted(duplicates, key=str):
+        report.errors.append("duplicate task name: {0}".format(name))
+    successors = [[] for _ in tasks]
+    indegree = [0] * len(tasks)
+    for i, task in enumerate(tasks):
+        for name, _ in edges(task.dependencies):
+            j = index.get(name)
+            if j is None:
+                report.errors.append("task {0} depends on unknown task {1}".format(task.name, name))
+                continue
+            successors[j].append(i)
+            indegree[i] += 1
+    ready = [i for i, n in enumerate(indegree) if n == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        i = heapq.heappop(ready)
+        order.append(i)
+        for j in successors[i]:
+            indegree[j] -= 1
+            if indegree[j] == 0:
+                heapq.heappush(ready, j)
+    if len(order) != len(tasks):
+        cycle = [tasks[i].name for i, n in enumerate(indegree) if n > 0]
+        report.errors.append(
+            "dependency cycle among the tasks: {0}".format(", ".join(str(n) for n in cycle))
+        )
+    return report, (order if report.valid else None)
+
+
+class BulkBuild:
+    """
+    Bulk build mode of an experiment, see Experiment.bulk
+    """
+
+    def __init__(self, experiment, strict=True):
+        self.experiment = experiment
+        self.strict = strict
+        self.report = ValidationReport()
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        if self.experiment.__dict__.get("_bulk") is not None:
+            raise AttributeError("a bulk build of the experiment is already in progress")
+        self.experiment._bulk = self
+        return self.report
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        experiment = self.experiment
+        experiment._bulk = None
+        if exc_type is not None:
+            experiment.invalidate()
+            return False
+        report, order = validate_tasks(experiment.tasks, self.report)
+        if order is not None:
+            experiment.tasks[:] = [experiment.tasks[i] for i in order]
+        experiment.invalidate()
+        if order is None and self.strict:
+            raise ExperimentValidationError(report)
+        return False
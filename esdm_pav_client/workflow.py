@@ -9,27 +9,81 @@ class Workflow:
     ----------
     experiment: int or <class 'esdm_pav_client.experiment.Experiment'>
         Id of a running experiment or Experiment object
+    status_cache: <class 'esdm_pav_client.cache.StatusCache'>, optional
+        cache of the status responses used by monitor, shared by all the
+        workflows by default
+    resilience: <class 'esdm_pav_client.resilience.Resilience'>, optional
+        retry and circuit breaker settings of the runtime calls, shared by all
+        the workflows by default
+    endpoints: <class 'esdm_pav_client.routing.EndpointPool'>, optional
+        pool of runtimes used by submit; for a running experiment id, the
+        runtime recorded in the pool is used for monitor and cancel
+    connections: <class 'esdm_pav_client.connections.ConnectionPool'>, optional
+        pool of PyOphidia clients shared with other workflows; a client owned
+        by the workflow is used if None
+    history: <class 'esdm_pav_client.history.HistoryStore'>, optional
+        local history where the submission and the statuses seen by status
+        and monitor are recorded; nothing is recorded if None
+    memo: <class 'esdm_pav_client.memo.MemoStore'>, optional
+        store where the outputs exported by the workflow are recorded once
+        seen completed by status and monitor, and looked up by the memoize
+        argument of submit
 
     Raises
     ------
     ValueError
         Raises ValueError if the provided parameter is not int or an Experiment
         object
+
+    Notes
+    -----
+    A workflow can be shared by several threads, for instance one monitoring
+    it while another cancels it. Concurrent submit calls are serialized, so
+    only the first one submits the experiment. Each runtime call reads its
+    response and job id while it holds its PyOphidia client: the calls on the
+    client owned by the workflow are serialized, while with a ConnectionPool
+    each call leases a client of its own and they run concurrently. The
+    experiment is never modified by submit (the optimize, memoize and
+    cleanup arguments work on a copy), so it can be submitted by several
+    workflows at once, as long as it is not modified meanwhile.
     """
 
-    pyophidia_client = None
     username = "oph-test"
     password = "abcd"
     server = "127.0.0.1"
     port = "11732"
     project = None
     experiment_name = None
+    running_statuses = "(?i).*(RUNNING|PENDING|WAITING)"
+    # duplicate submissions are looked up among the workflows submitted in
+    # this window and, with deduplicate="wait", polled at this frequency
+    deduplication_window = "7d"
+    deduplication_frequency = 10
+    # submissions whose loops expand into more task instances, or into a
+    # larger runtime document (in bytes), are refused; no limit if None
+    max_instances = None
+    max_document_size = None
 
-    def __init__(self, experiment):
+    def __init__(
+        self,
+        experiment,
+        status_cache=None,
+        resilience=None,
+        endpoints=None,
+        connections=None,
+        history=None,
+        memo=None,
+    ):
         try:
             from experiment import Experiment
+            from cache import shared_status_cache
+            from resilience import shared_resilience
         except ImportError:
             from .experiment import Experiment
+            from .cache import shared_status_cache
+            from .resilience import shared_resilience
+        import threading
+
         if isinstance(experiment, int):
             self.workflow_id = experiment
             self.experiment_object = None
@@ -38,6 +92,27 @@ class Workflow:
             self.workflow_id = None
         else:
             raise ValueError("experiment argument must be int or experiment")
+        self.status_cache = status_cache if status_cache is not None else shared_status_cache
+        self.resilience = resilience if resilience is not None else shared_resilience
+        self.endpoints = endpoints
+        self.connections = connections
+        self.pyophidia_client = None
+        self._client_endpoint = None
+        self.history = history
+        self.memo = memo
+        self.deduplicated = False
+        self._exports = {}
+        self._submit_lock = threading.RLock()
+        self._client_lock = threading.Lock()
+        # task name -> (status, marker of the query that saw it change)
+        self._status_log = {}
+        self._status_marker = 0
+        self._status_lock = threading.Lock()
+        if endpoints is not None and self.workflow_id is not None:
+            endpoint = endpoints.endpoint_for(self.workflow_id)
+            if endpoint is not None:
+                self.server = endpoint.server
+                self.port = endpoint.port
 
     def deinit(self):
         """
@@ -66,12 +141,71 @@ class Workflow:
         """
         if self.workflow_id is None:
             raise AttributeError("Cancel requires workflow_id")
-        self.__runtime_connect()
-        self.pyophidia_client.submit(
-            query="oph_cancel id={0};exec_mode=async;".format(self.workflow_id)
-        )
+        self.__runtime_call("submit", "oph_cancel id={0};exec_mode=async;".format(self.workflow_id))
+        # the cached responses still report the workflow as running
+        self.status_cache.invalidate(self._endpoint(), self.workflow_id)
 
-    def submit(self, *args, server="127.0.0.1", port="11732", checkpoint="all"):
+    def notify(self, task, inputs=None, action="continue", queue=None):
+        """
+        Send an input event to a task of the running PAV experiment waiting
+        for it (e.g. a wait task), with oph_input
+
+        Parameters
+        ----------
+        task : str
+            name of the waiting task
+        inputs : dict, optional
+            key -> value inputs set in the workflow
+        action : str, optional
+            "continue" to release the task, "abort" to stop it
+        queue : <class 'esdm_pav_client.events.EventQueue'>, optional
+            queue the event is added to, delivered with the other events of
+            the queue by its flush method; sent at once if None
+
+        Returns
+        -------
+        event : <class 'esdm_pav_client.events.InputEvent'>
+            Returns the event, acknowledged if sent at once
+
+        Raises
+        ------
+        AttributeError
+            If the workflow was not submitted, if the event is not valid or,
+            when sent at once, if the runtime rejected it
+
+        Example
+        -------
+        w1 = Workflow(e1)
+        w1.submit()
+        w1.notify("Check ESDM data")
+        """
+        try:
+            from events import InputEvent
+        except ImportError:
+            from .events import InputEvent
+
+        if queue is not None:
+            return queue.put(self, task, inputs, action)
+        event = InputEvent(self, task, action, inputs)
+        event.response = self.__runtime_call(
+            "submit", event.query(), idempotency_key=event.idempotency_key
+        )[0]
+        event.acknowledged = True
+        return event
+
+    def submit(
+        self,
+        *args,
+        server="127.0.0.1",
+        port="11732",
+        checkpoint="all",
+        idempotency_key=None,
+        endpoints=None,
+        optimize=False,
+        cleanup=False,
+        deduplicate=False,
+        memoize=False
+    ):
         """
         Submit the PAV experiment on the ESDM-PAV runtime
 
@@ -85,13 +219,55 @@ class Workflow:
             list of arguments to be substituted in the workflow
         checkpoint : str, optional
             name of the checkpoint which the execution has to start from
-
+        idempotency_key : str, optional
+            key of the submission: submitting again with the same key returns
+            the workflow id of the first submission instead of submitting a
+            new workflow. A random key is used if None.
+        endpoints : <class 'esdm_pav_client.routing.EndpointPool'>, optional
+            pool of runtimes to choose the runtime from, in place of server
+            and port; the pool given to the constructor is used if None. If
+            the chosen runtime cannot be reached, the next one is tried.
+        optimize : bool, optional
+            True to submit a copy of the experiment optimized with
+            Experiment.optimize; the changes are reported in the
+            optimization_report attribute
+        cleanup : bool, optional
+            True to submit a copy of the experiment where the intermediate
+            cubes are deleted on exit, see Experiment.cleanup; the changes are
+            reported in the cleanup_report attribute
+        deduplicate : bool or str, optional
+            True (or "return") to look up the history for a workflow of the
+            same experiment with the same arguments (see
+            esdm_pav_client.fingerprint) submitted in the last
+            deduplication_window on the same runtime(s), pending, running or
+            completed, and return its id instead of submitting a duplicate
+            (the status of a workflow whose end was not seen is asked to the
+            runtime first, and the experiment is submitted again if that
+            workflow failed or its status is unknown);
+            "wait" to also wait for that workflow to end. The deduplicated
+            attribute tells whether a workflow was reused. The history given
+            to the constructor is used, the default one if None
+        memoize : bool, optional
+            True to submit a copy of the experiment where the tasks whose
+            output was exported by a completed workflow are replaced by the
+            import of that output, see Experiment.memoize; the changes are
+            reported in the memoization_report attribute. The memo store
+            given to the constructor is used, the default one if None
 
         Raises
         ------
         AttributeError
             Raises AttributeError in case of failure to connect to the PAV
             runtime
+        RuntimeCallError
+            Raises RuntimeCallError (an AttributeError) if the submission
+            failed after the retries allowed by the resilience settings
+        ExpansionLimitError
+            Raises ExpansionLimitError (an AttributeError) if the loops of the
+            experiment expand beyond max_instances task instances or a
+            runtime document of max_document_size bytes (see
+            Experiment.expand); the report is kept in expansion_report
+            otherwise
 
 
         Example
@@ -99,12 +275,108 @@ class Workflow:
         w1.submit(server="127.0.0.1", port="11732", "test")
         """
 
-        self.server = server
-        self.port = port
-        self.__runtime_connect()
+        import uuid
+
+        try:
+            from resilience import RuntimeCallError
+            from fingerprint import fingerprints
+            from history import default_history
+            from memo import default_memo
+        except ImportError:
+            from .resilience import RuntimeCallError
+            from .fingerprint import fingerprints
+            from .history import default_history
+            from .memo import default_memo
+
+        if deduplicate not in [False, True, "return", "wait"]:
+            raise AttributeError('deduplicate must be a bool, "return" or "wait"')
+        with self._submit_lock:
+            if idempotency_key is None:
+                idempotency_key = str(uuid.uuid4())
+            if endpoints is None:
+                endpoints = self.endpoints
+            if memoize and self.memo is None:
+                self.memo = default_memo()
+            hashes = None
+            if checkpoint == "all" and self.workflow_id is None:
+                if deduplicate and self.history is None:
+                    self.history = default_history()
+                if self.history is not None:
+                    # (experiment hash, fingerprint) of the submission
+                    hashes = fingerprints(
+                        self.experiment_object, args, {"optimize": optimize, "cleanup": cleanup}
+                    )
+                if deduplicate:
+                    if endpoints is None:
+                        candidates = ["{0}:{1}".format(server, port)]
+                    else:
+                        candidates = [str(e) for e in endpoints.endpoints]
+                    duplicate = self.history.duplicate(
+                        hashes[1], candidates, since=self.deduplication_window
+                    )
+                    if duplicate is not None and self._reusable(duplicate):
+                        return self._reuse(duplicate, endpoints, wait=deduplicate == "wait")
+            # server and port are only set once the workflow is submitted, so
+            # that the other threads never reach a runtime it was not
+            # submitted to
+            if endpoints is None:
+                return self.__submit(
+                    server,
+                    port,
+                    args,
+                    checkpoint,
+                    idempotency_key,
+                    optimize,
+                    cleanup,
+                    memoize,
+                    hashes,
+                )
+
+            failed = []
+            while True:
+                endpoint = endpoints.choose(exclude=failed)
+                if endpoint is None:
+                    raise error
+                try:
+                    workflow_id = self.__submit(
+                        endpoint.server,
+                        endpoint.port,
+                        args,
+                        checkpoint,
+                        idempotency_key,
+                        optimize,
+                        cleanup,
+                        memoize,
+                        hashes,
+                    )
+                except RuntimeCallError as e:
+                    if e.delivered:
+                        raise
+                    error = e
+                    failed.append(str(endpoint))
+                    continue
+                self.endpoints = endpoints
+                endpoints.assign(workflow_id, endpoint)
+                return workflow_id
 
-        exec_mode = self.experiment_object.exec_mode
-        self.experiment_object.exec_mode = "async"
+    def __submit(
+        self,
+        server,
+        port,
+        args,
+        checkpoint,
+        idempotency_key,
+        optimize,
+        cleanup,
+        memoize=False,
+        hashes=None,
+    ):
+        import copy
+
+        try:
+            from memo import exported_outputs
+        except ImportError:
+            from .memo import exported_outputs
 
         if checkpoint == "all":
 
@@ -112,19 +384,111 @@ class Workflow:
 
             if self.workflow_id is not None:
                 raise AttributeError("You can't submit a workflow that was already" "submitted")
-            dict_workflow = json.dumps(self.workflow_to_json())
+            experiment = self.experiment_object
+            if optimize or cleanup or memoize:
+                experiment = copy.deepcopy(experiment)
+            if optimize:
+                self.optimization_report = experiment.optimize()
+            if memoize:
+                self.memoization_report = experiment.memoize(self.memo, args=args)
+            if cleanup:
+                self.cleanup_report = experiment.cleanup(args=args)
+            if self.max_instances is not None or self.max_document_size is not None:
+                self.expansion_report = experiment.expand(args).report(
+                    self.max_instances, self.max_document_size
+                )
+            # the workflow is submitted in asynchronous mode whatever the
+            # exec_mode of the experiment, which is left untouched
+            document = self._to_json(experiment)
+            document["exec_mode"] = "async"
+            dict_workflow = json.dumps(document)
             str_workflow = str(dict_workflow)
-            self.pyophidia_client.wsubmit(str_workflow, *args)
+            last_jobid = self.__runtime_call(
+                "wsubmit",
+                str_workflow,
+                *args,
+                idempotency_key=idempotency_key,
+                endpoint=(server, port)
+            )[1]
+            if self.memo is not None:
+                self._exports = exported_outputs(experiment.tasks, args)
 
         else:
 
             query = "oph_resume document_type=request;execute=yes;"
-            query += "id=" + self.workflow_id + ";"
+            query += "id=" + str(self.workflow_id) + ";"
             query += "checkpoint=" + checkpoint + ";"
-            self.pyophidia_client.submit(query)
+            last_jobid = self.__runtime_call(
+                "submit", query, idempotency_key=idempotency_key, endpoint=(server, port)
+            )[1]
 
-        self.workflow_id = self.pyophidia_client.last_jobid.split("?")[1].split("#")[0]
-        self.experiment_object.exec_mode = exec_mode
+        self.server = server
+        self.port = port
+        self.workflow_id = last_jobid.split("?")[1].split("#")[0]
+        if self.history is not None:
+            self.history.record_submission(
+                self.workflow_id,
+                self._endpoint(),
+                self.experiment_object,
+                args,
+                fingerprint=hashes[1] if hashes else None,
+                experiment_hash=hashes[0] if hashes else None,
+            )
+        return self.workflow_id
+
+    def _reusable(self, submission):
+        # a submission whose end was not seen (e.g. never monitored) may have
+        # failed since: its status is asked to the runtime, and a failed or
+        # unknown one is submitted again
+        import re
+
+        try:
+            from history import final_statuses
+        except ImportError:
+            from .history import final_statuses
+
+        if not re.match(final_statuses, submission["status"]):
+            w1 = Workflow(
+                0,
+                status_cache=self.status_cache,
+                resilience=self.resilience,
+                connections=self.connections,
+                history=self.history,
+            )
+            w1.workflow_id = submission["workflow_id"]
+            w1.server, _, w1.port = submission["endpoint"].rpartition(":")
+            w1.username, w1.password, w1.project = self.username, self.password, self.project
+            try:
+                status = w1.status()
+            except Exception:
+                return False
+            if status is None:
+                return False
+            submission["status"] = status
+        return not re.match("(?i).*(ERROR|ABORTED|UNKNOWN)", submission["status"])
+
+    def _reuse(self, submission, endpoints, wait=False):
+        import re
+        import time
+
+        try:
+            from history import final_statuses
+        except ImportError:
+            from .history import final_statuses
+
+        self.server, _, self.port = submission["endpoint"].rpartition(":")
+        self.workflow_id = submission["workflow_id"]
+        self.deduplicated = True
+        if endpoints is not None:
+            self.endpoints = endpoints
+            if not re.match(final_statuses, submission["status"]):
+                for endpoint in endpoints.endpoints:
+                    if str(endpoint) == submission["endpoint"]:
+                        endpoints.assign(self.workflow_id, endpoint)
+                        break
+        if wait:
+            while re.match(self.running_statuses, str(self.status())):
+                time.sleep(self.deduplication_frequency)
         return self.workflow_id
 
     def monitor(self, frequency=10, iterative=True, visual_mode=True):
@@ -178,8 +542,11 @@ class Workflow:
         def _check_workflow_validity():
             import json
 
-            self.__runtime_connect()
-            workflow_validity = self.pyophidia_client.wisvalid(json.dumps(self.workflow_to_json()))
+            with self._client_lock:
+                self.__runtime_connect()
+                workflow_validity = self.pyophidia_client.wisvalid(
+                    json.dumps(self.workflow_to_json())
+                )
             if not workflow_validity[1] == "Workflow is valid":
                 raise AttributeError("Workflow is not valid")
 
@@ -221,21 +588,6 @@ class Workflow:
                 cluster_counter += 1
             return subgraphs_list
 
-        def _check_workflow_status(json_response):
-            for res in json_response["response"]:
-                if res["objkey"] == "workflow_status":
-                    return res["objcontent"][0]["message"]
-
-        def _extract_info(json_response):
-            task_dict = {}
-            for res in json_response["response"]:
-                if res["objkey"] == "workflow_list":
-                    task_name_index = res["objcontent"][0]["rowkeys"].index("TASK NAME")
-                    status_index = res["objcontent"][0]["rowkeys"].index("EXIT STATUS")
-                    for task in res["objcontent"][0]["rowvalues"]:
-                        task_dict[task[int(task_name_index)]] = task[int(status_index)]
-            return task_dict
-
         def _match_shapes(operator, commands):
             for command in commands:
                 if re.match("(?i).*" + command, operator):
@@ -290,10 +642,9 @@ class Workflow:
 
         def _draw(
             tasks,
-            json_response,
+            task_dict,
             status_color_dictionary=None,
         ):
-            task_dict = _extract_info(json_response)
             diamond_commands = ["if", "endif", "else"]
             hexagonal_commands = ["for", "endfor"]
             dot = graphviz.Digraph(comment=self.experiment_name)
@@ -366,36 +717,265 @@ class Workflow:
             "(?i).*ABORTED": "red",
             "(?i).*SKIPPED": "yellow",
         }
-        self.__runtime_connect()
-        self.pyophidia_client.submit("oph_resume id={0};".format(self.workflow_id))
-        status_response = json.loads(self.pyophidia_client.last_response)
-        self.pyophidia_client.submit(
-            "oph_resume document_type=request;level=3;id={0};".format(self.workflow_id)
-        )
-        json_response = json.loads(self.pyophidia_client.last_response)
+        # each poll only asks for the tasks changed since the previous one
+        page = self.task_statuses()
+        task_dict = dict(page.tasks)
+        json_response = self._resume(level=3, document_type="request")
         tasks = _modify_task(json_response)
         sorted_tasks = _sort_tasks(tasks)
-        workflow_status = _check_workflow_status(status_response)
+        workflow_status = page.workflow_status
         if iterative is True:
             while True:
                 if visual_mode is True:
-                    _draw(sorted_tasks, status_response, status_color_dictionary)
+                    _draw(sorted_tasks, task_dict, status_color_dictionary)
                 else:
                     print(workflow_status)
                 if not re.match("(?i).*RUNNING", workflow_status) and (
                     not re.match("(?i).*PENDING", workflow_status)
                 ):
-                    return workflow_status
+                    return self._track_status(workflow_status, tasks=task_dict)
+                self._record_status(workflow_status, tasks=page.tasks)
                 time.sleep(frequency)
-                self.pyophidia_client.submit("oph_resume id={0};".format(self.workflow_id))
-                status_response = json.loads(self.pyophidia_client.last_response)
-                workflow_status = _check_workflow_status(status_response)
+                page = self.task_statuses(since=page.marker)
+                task_dict.update(page.tasks)
+                workflow_status = page.workflow_status
         else:
             if visual_mode is True:
-                _draw(sorted_tasks, status_response, status_color_dictionary)
-                return workflow_status
+                _draw(sorted_tasks, task_dict, status_color_dictionary)
+                return self._track_status(workflow_status, tasks=task_dict)
+            else:
+                return self._track_status(workflow_status, tasks=task_dict)
+
+    def status(self):
+        """
+        Return the current status of the PAV experiment execution, with a
+        single status query to the runtime
+
+        Returns
+        -------
+        workflow_status : <class 'str'>
+            Returns the workflow status as a string
+
+        Raises
+        ------
+        AttributeError
+            Raises AttributeError when the workflow was not submitted
+
+        Example
+        -------
+        w1 = Workflow(10)
+        w1.status()
+        """
+        if self.workflow_id is None:
+            raise AttributeError("Status requires workflow_id")
+        response = self._resume()
+        for res in response["response"]:
+            if res["objkey"] == "workflow_status":
+                return self._track_status(res["objcontent"][0]["message"], response)
+
+    def task_statuses(self, states=None, since=None, offset=0, limit=None):
+        """
+        Return the statuses of the tasks of the PAV experiment execution,
+        optionally only those in some states, changed since a previous query
+        or one page at a time
+
+        The runtime is asked to filter the tasks by state when it supports it
+        (the status_filter argument of oph_resume), otherwise the client does.
+        oph_resume has no argument selecting the tasks changed since a
+        previous query, so since is resolved by the client: each query
+        downloads and decodes the task list of the runtime (filtered by state
+        if requested) and records the status of every task, and its cost
+        grows with the number of tasks of that list. Only the grid of the
+        tasks is decoded from the response, and only the selected tasks are
+        returned.
+
+        Parameters
+        ----------
+        states : list of str, optional
+            states of the selected tasks (e.g. ["RUNNING", "ERROR"]), all if
+            None
+        since : int, optional
+            marker of a previous query, to select the tasks whose status
+            changed since that query only
+        offset : int, optional
+            number of selected tasks skipped
+        limit : int, optional
+            maximum number of tasks returned, unlimited if None
+
+        Returns
+        -------
+        page : <class 'esdm_pav_client.status.TaskStatusPage'>
+            Returns the workflow status, the task statuses and the marker of
+            the query
+
+        Raises
+        ------
+        AttributeError
+            Raises AttributeError when the workflow was not submitted or a
+            parameter is not valid
+
+        Example
+        -------
+        page = w1.task_statuses(states=["ERROR"], limit=100)
+        page = w1.task_statuses(since=page.marker)
+        """
+        try:
+            from resilience import RuntimeCallError
+            from status import TaskStatusPage, status_filter, stream_grid, stream_message
+            from status import unsupported_filters
+        except ImportError:
+            from .resilience import RuntimeCallError
+            from .status import TaskStatusPage, status_filter, stream_grid, stream_message
+            from .status import unsupported_filters
+
+        if self.workflow_id is None:
+            raise AttributeError("Status requires workflow_id")
+        if not isinstance(offset, int) or offset < 0:
+            raise AttributeError("offset must be a non-negative int")
+        if limit is not None and (not isinstance(limit, int) or limit < 1):
+            raise AttributeError("limit must be a positive int")
+        states = [str(s).upper() for s in states] if states is not None else None
+        bitmap = status_filter(states) if states else None
+        if self._endpoint() in unsupported_filters:
+            bitmap = None
+        try:
+            text = self._resume_text(bitmap)
+        except RuntimeCallError as e:
+            if bitmap is None or e.transient:
+                raise
+            # the runtime does not know the filter
+            unsupported_filters.add(self._endpoint())
+            bitmap = None
+            text = self._resume_text()
+        # every row is recorded in the log, so that a later query since this
+        # one does not report the rows after the page as changed: they are
+        # all needed and decoded at once, which is faster than one at a time
+        rowkeys, rows = stream_grid(text, lazy=False)
+        tasks = {}
+        next_offset = None
+        with self._status_lock:
+            self._status_marker += 1
+            marker = self._status_marker
+            if rowkeys is None:
+                rows = []
             else:
-                return workflow_status
+                name_index = rowkeys.index("TASK NAME")
+                status_index = rowkeys.index("EXIT STATUS")
+            selected = 0
+            log = self._status_log
+            for row in rows:
+                name, task_status = row[name_index], row[status_index]
+                seen = log.get(name)
+                if seen is None or seen[0] != task_status:
+                    seen = log[name] = (task_status, marker)
+                if next_offset is not None or (since is not None and seen[1] <= since):
+                    continue
+                if states and not any(str(task_status).upper().endswith(s) for s in states):
+                    continue
+                selected += 1
+                if selected <= offset:
+                    continue
+                if limit is not None and len(tasks) == limit:
+                    next_offset = offset + limit
+                    continue
+                tasks[name] = task_status
+        return TaskStatusPage(stream_message(text), tasks, marker, next_offset, bitmap is not None)
+
+    def _resume_text(self, bitmap=None):
+        """
+        Query the runtime with oph_resume through the status cache and return
+        the text of the response, optionally with a status_filter
+        """
+
+        def _load():
+            query = "oph_resume "
+            if bitmap is not None:
+                query += "status_filter={0};".format(bitmap)
+            query += "id={0};".format(self.workflow_id)
+            return self.__runtime_call("submit", query)[0]
+
+        key = self.status_cache.key(
+            self._endpoint(), self.workflow_id, ("text", bitmap), self.username, self.project
+        )
+        return self.status_cache.get(key, _load)
+
+    def _track_status(self, workflow_status, response=None, tasks=None):
+        import re
+
+        if self.endpoints is not None and not re.match(self.running_statuses, str(workflow_status)):
+            self.endpoints.release(self.workflow_id, self._endpoint())
+        self._record_status(workflow_status, response, tasks)
+        return workflow_status
+
+    def _record_status(self, workflow_status, response=None, tasks=None):
+        import re
+
+        if tasks is None and response is not None:
+            tasks = self._task_statuses(response)
+        if self.history is not None:
+            self.history.record_status(self.workflow_id, self._endpoint(), workflow_status, tasks)
+        for name, task_status in (tasks or {}).items():
+            if name not in self._exports or not re.match("(?i).*COMPLETED", str(task_status)):
+                continue
+            # pop is atomic: a single thread records each export
+            export = self._exports.pop(name, None)
+            if export is not None:
+                self.memo.record(
+                    export["hash"],
+                    export["output"],
+                    export["operator"],
+                    export["arguments"],
+                    self.workflow_id,
+                    self._endpoint(),
+                )
+
+    @staticmethod
+    def _task_statuses(response):
+        """
+        Return the task name -> exit status dict of the workflow_list of an
+        oph_resume response
+        """
+        tasks = {}
+        for res in response["response"]:
+            if res["objkey"] == "workflow_list":
+                rowkeys = res["objcontent"][0]["rowkeys"]
+                name_index = rowkeys.index("TASK NAME")
+                status_index = rowkeys.index("EXIT STATUS")
+                for row in res["objcontent"][0]["rowvalues"]:
+                    tasks[row[name_index]] = row[status_index]
+        return tasks
+
+    def _resume(self, level=None, document_type=None):
+        """
+        Query the runtime with oph_resume through the status cache
+
+        Parameters
+        ----------
+        level : int, optional
+            oph_resume level, the runtime default if None
+        document_type : str, optional
+            oph_resume document type, the runtime default if None
+
+        Returns
+        -------
+        response : dict
+            Returns the parsed response, shared with the other cache users
+        """
+        import json
+
+        def _load():
+            query = "oph_resume "
+            if document_type is not None:
+                query += "document_type={0};".format(document_type)
+            if level is not None:
+                query += "level={0};".format(level)
+            query += "id={0};".format(self.workflow_id)
+            return json.loads(self.__runtime_call("submit", query)[0])
+
+        key = self.status_cache.key(
+            self._endpoint(), self.workflow_id, (document_type, level), self.username, self.project
+        )
+        return self.status_cache.get(key, _load)
 
     def __param_check(self, params=[]):
         for param in params:
@@ -420,6 +1000,10 @@ class Workflow:
             return False
 
     def workflow_to_json(self):
+        return self._to_json(self.experiment_object)
+
+    @staticmethod
+    def _to_json(experiment):
         non_workflow_fields = [
             "pyophidia_client",
             "task_name_counter",
@@ -427,38 +1011,117 @@ class Workflow:
         ]
 
         new_workflow = {
-            k: dict(self.experiment_object.__dict__)[k]
-            for k in dict(self.experiment_object.__dict__).keys()
-            if k not in non_workflow_fields
+            k: dict(experiment.__dict__)[k]
+            for k in dict(experiment.__dict__).keys()
+            if k not in non_workflow_fields and not k.startswith("_")
         }
         if "tasks" in new_workflow.keys():
-            new_workflow["tasks"] = [t.__dict__ for t in new_workflow["tasks"]]
+            new_workflow["tasks"] = [
+                {
+                    k: list(v) if k == "dependencies" else v
+                    for k, v in t.__dict__.items()
+                    if not k.startswith("_")
+                }
+                for t in new_workflow["tasks"]
+            ]
         return new_workflow
 
     def __repr__(self):
         return self.workflow_to_json()
 
-    def __runtime_connect(self):
-        from PyOphidia import client
+    def _endpoint(self):
+        return "{0}:{1}".format(self.server, self.port)
+
+    def __runtime_call(self, operation, *params, idempotency_key=None, endpoint=None):
+        """
+        Run a call of the PyOphidia client through the resilience layer
+
+        Parameters
+        ----------
+        operation : str
+            name of the client method, "submit" or "wsubmit"
+        params : list
+            arguments of the client method
+        idempotency_key : str, optional
+            key of a call that must not be repeated once it reached the
+            runtime
+        endpoint : tuple, optional
+            (server, port) of the runtime, those of the workflow if None
+
+        Returns
+        -------
+        (last_response, last_jobid) : tuple
+            Returns the response and the job id of the call
+        """
+        try:
+            from resilience import RuntimeCallError
+        except ImportError:
+            from .resilience import RuntimeCallError
+
+        server, port = endpoint if endpoint is not None else (self.server, self.port)
+        address = "{0}:{1}".format(server, port)
 
+        def _discard():
+            self.pyophidia_client = None
+
+        def _call(pyophidia_client, discard):
+            previous_jobid = pyophidia_client.last_jobid
+            try:
+                getattr(pyophidia_client, operation)(*params)
+            except Exception:
+                discard()
+                if operation == "wsubmit" and pyophidia_client.last_jobid != previous_jobid:
+                    # the runtime accepted the workflow before the failure
+                    return pyophidia_client.last_response, pyophidia_client.last_jobid
+                raise
+            if operation == "wsubmit" and pyophidia_client.last_jobid not in (None, previous_jobid):
+                return pyophidia_client.last_response, pyophidia_client.last_jobid
+            if pyophidia_client.last_return_value != 0 or not pyophidia_client.last_response:
+                discard()
+                raise RuntimeCallError(
+                    "{0} failed on the runtime {1}".format(operation, address),
+                    transient=not pyophidia_client.last_response,
+                )
+            return pyophidia_client.last_response, pyophidia_client.last_jobid
+
+        def _attempt():
+            if self.connections is not None:
+                with self.connections.connection(
+                    self.username, self.password, server, port, self.project
+                ) as lease:
+                    return _call(lease.client, lease.discard)
+            # the client owned by the workflow keeps the response of its
+            # last call only: one call at a time
+            with self._client_lock:
+                self.__runtime_connect(server, port)
+                return _call(self.pyophidia_client, _discard)
+
+        return self.resilience.call(address, operation, _attempt, idempotency_key=idempotency_key)
+
+    def __runtime_connect(self, server=None, port=None):
+        try:
+            from connections import connect
+        except ImportError:
+            from .connections import connect
+
+        server = server if server is not None else self.server
+        port = port if port is not None else self.port
         self.__param_check(
             [
                 {"name": "username", "value": self.username, "type": str},
-                {"name": "server", "value": self.server, "type": str},
-                {"name": "port", "value": self.port, "type": str},
+                {"name": "server", "value": server, "type": str},
+                {"name": "port", "value": port, "type": str},
                 {"name": "password", "value": self.password, "type": str},
             ]
         )
+        # a client connected here to another runtime is replaced, one set by
+        # the caller is used as it is
+        connected = self._client_endpoint
+        if connected is not None and connected[0] is self.pyophidia_client:
+            if connected[1:] != (server, port):
+                self.pyophidia_client = None
         if self.pyophidia_client is None:
-            self.pyophidia_client = client.Client(
-                username=self.username,
-                password=self.password,
-                server=self.server,
-                port=self.port,
-                project=self.project,
-                api_mode=False,
+            self.pyophidia_client = connect(
+                self.username, self.password, server, port, self.project
             )
-            if self.pyophidia_client.last_return_value != 0:
-                raise AttributeError("failed to connect to the runtime")
-            else:
-                self.pyophidia_client.resume_session()
+            self._client_endpoint = (self.pyophidia_client, server, port)
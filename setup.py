@@ -41,7 +41,7 @@ setup(
     ],
     entry_points  = {
         'console_scripts': [
-            'esdm-pav-client = esdm_pav_client.cli.client:run',
+            'esdm-pav-client = esdm_pav_client.cli.launcher:main',
         ],
     },
     zip_safe=False,